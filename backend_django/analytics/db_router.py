@@ -0,0 +1,107 @@
+"""
+Read-replica routing.
+
+``ReplicaRoutingMiddleware`` lets the read-only API requests (GET/HEAD under
+``REPLICA_READ_PATHS``) read from the ``replica`` alias when one is
+configured. Everything else uses ``default``: writes, non-safe requests,
+management commands and background work.
+
+Read-your-writes: every write request (and every ``publish_dashboard_change``)
+stamps ``DashboardState.last_write_at`` on the primary with the database's
+own clock, so every worker process and host sees the same pin without
+clock skew. For ``REPLICA_PIN_SECONDS`` after that, reads stay on the
+primary. This covers replication lag right after an upload, which is when
+dashboards refetch. Uploads change institution-wide aggregates, so the pin
+is global rather than per client. Checking it costs one primary-key lookup
+on the primary per replica-eligible request.
+"""
+import contextvars
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models.functions import Now
+
+REPLICA_ALIAS = "replica"
+
+_read_alias = contextvars.ContextVar("analytics_read_alias", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _state():
+    from .models import DashboardState
+    from .services.dashboard_events import STATE_ID
+
+    return DashboardState.objects.using("default"), STATE_ID
+
+
+def mark_primary_write():
+    """Record a primary write so reads stay on the primary until the replica catches up."""
+    if not replica_configured():
+        return
+    states, state_id = _state()
+    if not states.filter(pk=state_id).update(last_write_at=Now()):
+        states.get_or_create(pk=state_id, defaults={"last_write_at": Now()})
+
+
+def replica_is_fresh() -> bool:
+    states, state_id = _state()
+    return not states.filter(
+        pk=state_id, last_write_at__gt=Now() - timedelta(seconds=settings.REPLICA_PIN_SECONDS)).exists()
+
+
+@contextmanager
+def use_primary():
+    """Route reads in this block to the primary, e.g. for read-modify-write inside a GET."""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Reads go wherever the current request allows; writes and migrations always hit the primary."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaRoutingMiddleware:
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in self.SAFE_METHODS:
+            try:
+                return self.get_response(request)
+            finally:
+                mark_primary_write()
+
+        use_replica = (
+            replica_configured()
+            and request.path.startswith(tuple(settings.REPLICA_READ_PATHS))
+            and replica_is_fresh()
+        )
+        token = _read_alias.set(REPLICA_ALIAS if use_replica else None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        response["X-DB-Read"] = REPLICA_ALIAS if use_replica else "default"
+        return response
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services.risk_rules import risk_rules
+
+
+class Command(BaseCommand):
+    help = "Reload the risk rules file and rescore the students its changes affect"
+
+    def handle(self, *args, **options):
+        rescored = risk_rules.reload()
+        rules = risk_rules.current
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied risk rules v{rules.version} ({risk_rules.path}): rescored {rescored} students"
+        ))
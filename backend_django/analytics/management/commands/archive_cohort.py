@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.services.archive_service import ArchiveError, ArchiveService
+
+
+class Command(BaseCommand):
+    help = "Move a closed cohort out of the hot tables into compressed archive storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Archive name, e.g. 'CSE-2021'")
+        parser.add_argument('--course', help="Only students of this course")
+        parser.add_argument('--min-semester', type=int,
+                            help="Only students at or past this semester (e.g. the final one)")
+        parser.add_argument('--roll-prefix', help="Only roll numbers starting with this (batch code)")
+        parser.add_argument('--roll', action='append', dest='rolls', help="Specific roll number (repeatable)")
+
+    def handle(self, *args, **options):
+        criteria = {k: options[k] for k in ('course', 'min_semester', 'roll_prefix', 'rolls')
+                    if options[k] is not None}
+        if not criteria:
+            raise CommandError("Give at least one of --course, --min-semester, --roll-prefix, --roll")
+        try:
+            cohort = ArchiveService.archive(options['name'], ArchiveService.select_students(**criteria), criteria)
+        except ArchiveError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {cohort.student_count} students ({cohort.record_count} records) as '{cohort.name}'"
+        ))
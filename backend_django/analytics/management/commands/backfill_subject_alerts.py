@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from analytics.models import AcademicRecord
+from analytics.services.subject_alerts import REFRESH_BATCH_SIZE, SubjectAlertService
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored percentage and subject alert of every academic record"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=REFRESH_BATCH_SIZE,
+                            help="Rows per UPDATE (id range)")
+        parser.add_argument("--missing-only", action="store_true",
+                            help="Only fill records that have no stored alert yet")
+
+    def handle(self, *args, **options):
+        records = AcademicRecord.objects.all()
+        if options["missing_only"]:
+            records = records.filter(subject_alert__isnull=True)
+        updated = SubjectAlertService.refresh(records=records, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} academic records"))
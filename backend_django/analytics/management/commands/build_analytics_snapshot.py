@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.services.columnar_snapshot import columnar_snapshot
+
+
+class Command(BaseCommand):
+    help = "Export the dashboard's source tables to the memory-mapped columnar snapshot"
+
+    def handle(self, *args, **options):
+        if columnar_snapshot.root is None:
+            raise CommandError("ANALYTICS_SNAPSHOT_DIR is not set")
+        path = columnar_snapshot.rebuild_if_stale()
+        if path is None:
+            self.stdout.write(f"Snapshot is already at version {columnar_snapshot.live_version()}")
+            return
+        size = sum(f.stat().st_size for f in path.iterdir())
+        self.stdout.write(self.style.SUCCESS(f"Built snapshot {path.name} ({size / 1e6:.1f} MB)"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services.prediction_history import PredictionHistoryService
+
+
+class Command(BaseCommand):
+    help = "Compact old prediction history to monthly summaries and drop rows past retention"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-raw-months', type=int, default=3,
+                            help="Months of full-resolution history to keep (default 3)")
+        parser.add_argument('--retention-months', type=int, default=24,
+                            help="Months of history to keep at all (default 24)")
+
+    def handle(self, *args, **options):
+        if options['retention_months'] < options['keep_raw_months']:
+            self.stderr.write("--retention-months must be >= --keep-raw-months")
+            return
+        result = PredictionHistoryService.compact(
+            keep_raw_months=options['keep_raw_months'],
+            retention_months=options['retention_months'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted months before {result['raw_cutoff']} into {result['compacted_rows']} rows, "
+            f"deleted {result['deleted']} rows past retention"
+        ))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics.services.anomaly_service import AnomalyService
+
+
+class Command(BaseCommand):
+    help = "Run cohort anomaly detection over every AcademicRecord"
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        counts = AnomalyService.run()
+        summary = ", ".join(f"{kind}: {n}" for kind, n in sorted(counts.items())) or "none found"
+        self.stdout.write(self.style.SUCCESS(f"Anomalies ({time.monotonic() - started:.1f}s): {summary}"))
@@ -0,0 +1,32 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.services.arrow_io import EXPORTS, ROW_GROUP_SIZE, ArrowUnavailable, write_parquet
+
+
+class Command(BaseCommand):
+    help = "Write students, academic records, semester performance and predictions to Parquet files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('out_dir', help="Directory for the <dataset>.parquet files")
+        parser.add_argument('--dataset', action='append', choices=list(EXPORTS),
+                            help="Export only this dataset (repeatable; default all)")
+        parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE)
+
+    def handle(self, *args, **options):
+        out_dir = Path(options['out_dir'])
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for dataset in options['dataset'] or EXPORTS:
+            started = time.monotonic()
+            path = out_dir / f"{dataset}.parquet"
+            tmp = path.with_suffix('.parquet.tmp')
+            try:
+                rows = write_parquet(dataset, str(tmp), options['row_group_size'])
+            except ArrowUnavailable as e:
+                raise CommandError(str(e))
+            # Nightly pulls never see a half-written file
+            tmp.replace(path)
+            self.stdout.write(f"  {dataset}: {rows} rows -> {path} ({time.monotonic() - started:.1f}s)")
+        self.stdout.write(self.style.SUCCESS(f"Exported to {out_dir}"))
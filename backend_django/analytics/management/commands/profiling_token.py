@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analytics.profiling import make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Mint a signed X-Profile-Token that turns on profiling for the requests carrying it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requested-by', default="",
+                            help="Name recorded in the profiles made with this token")
+
+    def handle(self, *args, **options):
+        token = make_profile_token(options['requested_by'])
+        self.stdout.write(f"X-Profile-Token: {token}")
+        self.stdout.write(self.style.SUCCESS(f"Valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds"))
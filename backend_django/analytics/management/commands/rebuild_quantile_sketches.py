@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services.quantile_sketch import QuantileSketchService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SGPA/CGPA/attendance/marks quantile sketches from scratch"
+
+    def handle(self, *args, **options):
+        sketches = QuantileSketchService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {sketches} quantile sketches"))
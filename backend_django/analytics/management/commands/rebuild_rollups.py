@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from analytics.services.rollup_service import RollupService
+
+
+class Command(BaseCommand):
+    help = "Rebuild the course x semester x subject rollup cube from AcademicRecord"
+
+    def handle(self, *args, **options):
+        cells = RollupService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollup cube: {cells} cells"))
@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from analytics.models import AcademicRecord, RescoreShard, Student
+from analytics.services.dashboard_events import publish_dashboard_change
+from analytics.services.risk_rules import risk_rules
+from analytics.services.rollup_service import RollupService
+from analytics.services.scoring_service import ScoringService
+
+
+def _init_worker():
+    # Forked children must not reuse the parent's DB sockets; spawned ones need setup
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _rescore_shard(shard_id: int, batch_size: int) -> int:
+    shard = RescoreShard.objects.get(id=shard_id)
+    records = AcademicRecord.objects.filter(student_id__gte=shard.start_id, student_id__lt=shard.end_id)
+    students = 0
+    for df in ScoringService.iter_student_aggregates(records, batch_size=batch_size):
+        students += ScoringService.upsert_predictions(ScoringService.score(df))
+
+    shard.done = True
+    shard.students = students
+    shard.finished_at = timezone.now()
+    shard.save(update_fields=['done', 'students', 'finished_at'])
+    return students
+
+
+class Command(BaseCommand):
+    help = (
+        "Rescore every student. Student-id ranges are sharded across a process pool "
+        "and checkpointed, so rerunning after a kill resumes the unfinished shards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--shard-size', type=int, default=10000,
+                            help="Student ids per shard (default 10000)")
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Students scored and written per batch inside a shard")
+        parser.add_argument('--run-id', help="Resume/continue this run instead of the latest unfinished one")
+        parser.add_argument('--restart', action='store_true', help="Ignore unfinished runs and start over")
+
+    def _plan_run(self, options) -> str:
+        run_id = options['run_id']
+        if run_id is None and not options['restart']:
+            unfinished = RescoreShard.objects.filter(done=False).order_by('-id').first()
+            if unfinished is not None:
+                run_id = unfinished.run_id
+        if run_id is not None and RescoreShard.objects.filter(run_id=run_id).exists():
+            return run_id
+
+        run_id = run_id or timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+        bounds = Student.objects.aggregate(lo=Min('id'), hi=Max('id'))
+        if bounds['lo'] is not None:
+            size = options['shard_size']
+            RescoreShard.objects.bulk_create([
+                RescoreShard(run_id=run_id, start_id=start, end_id=start + size)
+                for start in range(bounds['lo'], bounds['hi'] + 1, size)
+            ])
+        return run_id
+
+    def handle(self, *args, **options):
+        run_id = self._plan_run(options)
+        pending = list(RescoreShard.objects.filter(run_id=run_id, done=False).values_list('id', flat=True))
+        total_shards = RescoreShard.objects.filter(run_id=run_id).count()
+        self.stdout.write(f"Run {run_id}: {len(pending)}/{total_shards} shards to score "
+                          f"with {options['workers']} workers")
+
+        # Apply any pending rules change once here, not racily in every worker
+        risk_rules.reload()
+
+        started = time.monotonic()
+        scored = 0
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_rescore_shard, shard_id, options['batch_size']) for shard_id in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                scored += future.result()
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"  shard {done}/{len(pending)}: {scored} students, "
+                                  f"{scored / elapsed if elapsed else 0:.0f} students/sec")
+
+        RollupService.rebuild()
+        publish_dashboard_change("rescore")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {run_id} complete: rescored {scored} students in {elapsed:.1f}s "
+            f"({scored / elapsed if elapsed else 0:.0f} students/sec)"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.services.archive_service import ArchiveError, ArchiveService
+
+
+class Command(BaseCommand):
+    help = "Move an archived cohort back into the hot tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help="Archive name given to archive_cohort")
+
+    def handle(self, *args, **options):
+        try:
+            restored = ArchiveService.restore(options['name'])
+        except ArchiveError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} students from '{options['name']}'"))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalyticsRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("course", models.CharField(max_length=50)),
+                ("semester", models.IntegerField()),
+                ("subject_name", models.CharField(max_length=100)),
+                ("record_count", models.IntegerField(default=0)),
+                ("student_count", models.IntegerField(default=0)),
+                ("marks_sum", models.FloatField(default=0)),
+                ("percentage_sum", models.FloatField(default=0)),
+                ("attendance_sum", models.FloatField(default=0)),
+                ("attendance_count", models.IntegerField(default=0)),
+                ("grade_point_sum", models.FloatField(default=0)),
+                ("pass_count", models.IntegerField(default=0)),
+                ("fail_count", models.IntegerField(default=0)),
+                ("risk_low", models.IntegerField(default=0)),
+                ("risk_medium", models.IntegerField(default=0)),
+                ("risk_high", models.IntegerField(default=0)),
+                ("risk_critical", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "analytics_rollup",
+                "indexes": [
+                    models.Index(
+                        fields=["semester", "subject_name"],
+                        name="analytics_r_semeste_3a488a_idx",
+                    )
+                ],
+                "unique_together": {("course", "semester", "subject_name")},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0002_analytics_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RiskRuleSet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.IntegerField(unique=True)),
+                ("config", models.JSONField()),
+                ("applied_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "risk_rule_sets",
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0003_risk_rule_sets"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PredictionHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("period", models.DateField(db_index=True)),
+                (
+                    "generated_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("risk_score", models.FloatField()),
+                ("risk_min", models.FloatField()),
+                ("risk_max", models.FloatField()),
+                ("average_marks", models.FloatField(blank=True, null=True)),
+                (
+                    "predicted_grade",
+                    models.CharField(blank=True, max_length=5, null=True),
+                ),
+                ("sample_count", models.IntegerField(default=1)),
+                ("is_compacted", models.BooleanField(default=False)),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prediction_history",
+                        to="analytics.student",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "prediction_history",
+                "indexes": [
+                    models.Index(
+                        fields=["student", "generated_at"],
+                        name="prediction__student_aa6b0b_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-19 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0005_upload_batches"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RescoreShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("run_id", models.CharField(db_index=True, max_length=40)),
+                ("start_id", models.BigIntegerField()),
+                ("end_id", models.BigIntegerField()),
+                ("done", models.BooleanField(default=False)),
+                ("students", models.IntegerField(default=0)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "rescore_shards",
+                "unique_together": {("run_id", "start_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0006_rescore_shards"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataAnomaly",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(db_index=True, max_length=30)),
+                ("metric", models.CharField(max_length=20)),
+                (
+                    "subject_name",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                ("semester", models.IntegerField(blank=True, null=True)),
+                ("value", models.FloatField()),
+                ("baseline", models.FloatField(blank=True, null=True)),
+                ("score", models.FloatField()),
+                ("detected_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "student",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="anomalies",
+                        to="analytics.student",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "data_anomalies",
+                "indexes": [
+                    models.Index(
+                        fields=["kind", "semester"], name="data_anomal_kind_6cfd46_idx"
+                    )
+                ],
+            },
+        ),
+    ]
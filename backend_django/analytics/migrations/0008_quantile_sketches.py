@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0007_data_anomalies"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuantileSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("metric", models.CharField(max_length=20)),
+                ("course", models.CharField(max_length=50)),
+                ("semester", models.IntegerField()),
+                ("subject_name", models.CharField(max_length=100)),
+                ("bins", models.JSONField(default=dict)),
+                ("count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "quantile_sketches",
+                "unique_together": {("metric", "course", "semester", "subject_name")},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Expression indexes match the SQL Django emits for iexact/istartswith/icontains
+# on PostgreSQL (UPPER("col"::text) ...); pg_trgm GIN indexes serve both LIKE
+# patterns and the % similarity operator. Other databases use the in-process
+# index in services/student_search.py instead.
+SEARCH_INDEXES = [
+    ("students_roll_upper_prefix", "(UPPER(roll_number::text) text_pattern_ops)"),
+    ("students_roll_upper_trgm", "USING gin (UPPER(roll_number::text) gin_trgm_ops)"),
+    ("students_name_upper_trgm", "USING gin (UPPER(name::text) gin_trgm_ops)"),
+    ("students_email_upper_trgm", "USING gin (UPPER(email::text) gin_trgm_ops)"),
+    ("students_name_trgm", "USING gin (name gin_trgm_ops)"),
+    ("students_roll_trgm", "USING gin (roll_number gin_trgm_ops)"),
+    ("students_course_upper", "(UPPER(course::text))"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, definition in SEARCH_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON students {definition}")
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0008_quantile_sketches"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
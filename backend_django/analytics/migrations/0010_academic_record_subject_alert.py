@@ -0,0 +1,71 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:19
+
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, CharField, F, FloatField, Max, Min, Q, Value, When
+
+DEFAULT_RULES_FILE = Path(__file__).resolve().parent.parent / "risk_rules.json"
+BATCH_SIZE = 50_000
+
+
+def subject_alert_case(config: dict) -> Case:
+    """The rules file's subject alert ladder as a SQL CASE, frozen here so later code changes can't alter it."""
+    whens = []
+    for rule in config["subject_alerts"]:
+        parts = []
+        if "marks_below" in rule:
+            parts.append(Q(marks_obtained__lt=rule["marks_below"]))
+        if "attendance_below" in rule:
+            parts.append(Q(attendance_percentage__lt=rule["attendance_below"]))
+        q = parts[0]
+        for p in parts[1:]:
+            q = (q & p) if rule.get("match", "all") == "all" else (q | p)
+        whens.append(When(q, then=Value(rule["level"])))
+    return Case(*whens, default=Value(config.get("default_subject_alert", "Normal")), output_field=CharField())
+
+
+def backfill_subject_alerts(apps, schema_editor):
+    AcademicRecord = apps.get_model("analytics", "AcademicRecord")
+    with open(getattr(settings, "RISK_RULES_FILE", DEFAULT_RULES_FILE), encoding="utf-8") as fh:
+        alert = subject_alert_case(json.load(fh))
+    percentage = Case(
+        When(total_marks__gt=0, then=F("marks_obtained") * 100.0 / F("total_marks")),
+        default=None, output_field=FloatField(),
+    )
+    bounds = AcademicRecord.objects.aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return
+    for start in range(bounds["first"], bounds["last"] + 1, BATCH_SIZE):
+        AcademicRecord.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+            percentage=percentage, subject_alert=alert,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0009_student_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="academicrecord",
+            name="percentage",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="academicrecord",
+            name="subject_alert",
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="academicrecord",
+            index=models.Index(
+                fields=["subject_alert", "semester"], name="academic_rec_alert_sem_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_subject_alerts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0010_academic_record_subject_alert"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedCohort",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("criteria", models.JSONField(default=dict)),
+                ("student_count", models.IntegerField(default=0)),
+                ("record_count", models.IntegerField(default=0)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "archived_cohorts",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("course", models.CharField(max_length=50)),
+                ("semester", models.IntegerField()),
+                ("subject_name", models.CharField(max_length=100)),
+                ("record_count", models.IntegerField(default=0)),
+                ("student_count", models.IntegerField(default=0)),
+                ("marks_sum", models.FloatField(default=0)),
+                ("percentage_sum", models.FloatField(default=0)),
+                ("attendance_sum", models.FloatField(default=0)),
+                ("attendance_count", models.IntegerField(default=0)),
+                ("grade_point_sum", models.FloatField(default=0)),
+                ("pass_count", models.IntegerField(default=0)),
+                ("fail_count", models.IntegerField(default=0)),
+                ("risk_low", models.IntegerField(default=0)),
+                ("risk_medium", models.IntegerField(default=0)),
+                ("risk_high", models.IntegerField(default=0)),
+                ("risk_critical", models.IntegerField(default=0)),
+                (
+                    "cohort",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollups",
+                        to="analytics.archivedcohort",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "archived_rollup",
+                "indexes": [
+                    models.Index(
+                        fields=["course", "semester", "subject_name"],
+                        name="archived_ro_course_ae29d8_idx",
+                    )
+                ],
+                "unique_together": {("cohort", "course", "semester", "subject_name")},
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedStudent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("student_id_val", models.BigIntegerField()),
+                ("roll_number", models.CharField(db_index=True, max_length=20)),
+                ("name", models.CharField(max_length=100)),
+                ("course", models.CharField(blank=True, max_length=50, null=True)),
+                ("semester", models.IntegerField(default=1)),
+                ("record_count", models.IntegerField(default=0)),
+                ("payload", models.BinaryField()),
+                (
+                    "cohort",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="students",
+                        to="analytics.archivedcohort",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "archived_students",
+                "unique_together": {("cohort", "roll_number")},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_dashboard_state(apps, schema_editor):
+    apps.get_model("analytics", "DashboardState").objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0011_archived_cohorts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardEvent",
+            fields=[
+                ("version", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("reason", models.CharField(max_length=50)),
+                ("payload", models.JSONField()),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "dashboard_events",
+            },
+        ),
+        migrations.CreateModel(
+            name="DashboardState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("version", models.BigIntegerField(default=0)),
+                ("snapshot", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "dashboard_state",
+            },
+        ),
+        migrations.RunPython(create_dashboard_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:42
+
+import json
+from bisect import bisect_left
+from pathlib import Path
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+DEFAULT_RULES_FILE = Path(__file__).resolve().parent.parent / "risk_rules.json"
+
+
+def backfill_contributions(apps, schema_editor):
+    """Fold the existing records into contributions, mirroring what the cube was built from."""
+    AcademicRecord = apps.get_model("analytics", "AcademicRecord")
+    Prediction = apps.get_model("analytics", "Prediction")
+    RollupContribution = apps.get_model("analytics", "RollupContribution")
+
+    with open(getattr(settings, "RISK_RULES_FILE", DEFAULT_RULES_FILE), encoding="utf-8") as fh:
+        levels = json.load(fh)["risk_levels"]
+    names = [lvl["name"] for lvl in levels]
+    bounds = [lvl["max_score"] / 100.0 for lvl in levels[:-1]]
+    latest = dict(Prediction.objects.order_by("student_id", "generated_at", "id").values_list("student_id", "risk_score"))
+    bands = {sid: names[bisect_left(bounds, score)] for sid, score in latest.items() if score is not None}
+
+    rows = AcademicRecord.objects.annotate(cube_course=Coalesce("student__course", Value(""))).values(
+        "student_id", "cube_course", "semester", "subject_name",
+    ).annotate(
+        n=Count("id"),
+        marks=Sum("marks_obtained"),
+        percentage=Sum(F("marks_obtained") * 100.0 / F("total_marks"), output_field=FloatField()),
+        attendance=Sum("attendance_percentage"),
+        attendance_n=Count("attendance_percentage"),
+        grade_points=Sum("grade_point"),
+        passed=Count("id", filter=Q(grade_point__gt=0)),
+        failed=Count("id", filter=Q(grade_point=0)),
+    ).order_by()
+    batch = []
+    for r in rows.iterator(chunk_size=5000):
+        batch.append(RollupContribution(
+            student_id=r["student_id"], course=r["cube_course"], semester=r["semester"],
+            subject_name=r["subject_name"], record_count=r["n"], marks_sum=r["marks"] or 0,
+            percentage_sum=r["percentage"] or 0, attendance_sum=r["attendance"] or 0,
+            attendance_count=r["attendance_n"], grade_point_sum=r["grade_points"] or 0,
+            pass_count=r["passed"], fail_count=r["failed"], risk_band=bands.get(r["student_id"]),
+        ))
+        if len(batch) >= 5000:
+            RollupContribution.objects.bulk_create(batch, batch_size=500)
+            batch = []
+    RollupContribution.objects.bulk_create(batch, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0012_dashboard_events"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupContribution",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("course", models.CharField(max_length=50)),
+                ("semester", models.IntegerField()),
+                ("subject_name", models.CharField(max_length=100)),
+                ("record_count", models.IntegerField(default=0)),
+                ("marks_sum", models.FloatField(default=0)),
+                ("percentage_sum", models.FloatField(default=0)),
+                ("attendance_sum", models.FloatField(default=0)),
+                ("attendance_count", models.IntegerField(default=0)),
+                ("grade_point_sum", models.FloatField(default=0)),
+                ("pass_count", models.IntegerField(default=0)),
+                ("fail_count", models.IntegerField(default=0)),
+                ("risk_band", models.CharField(blank=True, max_length=20, null=True)),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rollup_contributions",
+                        to="analytics.student",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "analytics_rollup_contributions",
+                "unique_together": {("student", "course", "semester", "subject_name")},
+            },
+        ),
+        migrations.RunPython(backfill_contributions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:49
+
+from django.db import migrations, models
+
+
+def fail_duplicate_live_batches(apps, schema_editor):
+    """Keep only the newest processing batch per file so the constraint can be added."""
+    UploadBatch = apps.get_model("analytics", "UploadBatch")
+    seen = set()
+    for batch in UploadBatch.objects.filter(status="processing").order_by("-created_at", "-id"):
+        if (batch.content_hash, batch.scope) in seen:
+            batch.status = "failed"
+            batch.save(update_fields=["status"])
+        seen.add((batch.content_hash, batch.scope))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0013_rollup_contributions"),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_live_batches, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="uploadbatch",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("status", "processing")),
+                fields=("content_hash", "scope"),
+                name="upload_batch_one_live_per_file",
+            ),
+        ),
+    ]
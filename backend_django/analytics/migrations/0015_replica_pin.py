@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-19 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0014_upload_batch_live_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dashboardstate",
+            name="last_write_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
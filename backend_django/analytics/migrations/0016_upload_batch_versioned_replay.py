@@ -0,0 +1,40 @@
+# Generated by Django 5.2.9 on 2026-10-19 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0015_replica_pin"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="uploadbatch",
+            name="data_version",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="uploadbatch",
+            name="endpoint",
+            field=models.CharField(default="upload_master", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="uploadbatch",
+            name="requester",
+            field=models.CharField(blank=True, default="", max_length=150),
+        ),
+        migrations.AlterField(
+            model_name="uploadbatch",
+            name="idempotency_key",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="uploadbatch",
+            constraint=models.UniqueConstraint(
+                fields=("idempotency_key", "endpoint", "requester"),
+                name="upload_batch_key_per_requester",
+            ),
+        ),
+    ]
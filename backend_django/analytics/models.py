@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class Student(models.Model):
     roll_number = models.CharField(max_length=20, unique=True, db_index=True)
@@ -20,10 +21,16 @@ class AcademicRecord(models.Model):
     attendance_percentage = models.FloatField(null=True, blank=True)
     semester = models.IntegerField()
     subject_credits = models.IntegerField(default=4)
+    # Written at ingest by SubjectAlertService; refreshed in SQL when the subject rules change
+    percentage = models.FloatField(null=True, blank=True)
+    subject_alert = models.CharField(max_length=20, null=True, blank=True)
 
     class Meta:
         db_table = "academic_records"
         unique_together = ('student', 'subject_name', 'semester')
+        indexes = [
+            models.Index(fields=['subject_alert', 'semester'], name='academic_rec_alert_sem_idx'),
+        ]
 
 class SemesterPerformance(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="semester_performances")
@@ -47,6 +54,33 @@ class Prediction(models.Model):
     class Meta:
         db_table = "predictions"
 
+class PredictionHistory(models.Model):
+    """
+    Append-only risk trajectory. ``Prediction`` stays the latest-score pointer
+    for the hot dashboard path; every scoring run also lands here.
+    Rows are partitioned by ``period`` (first day of the month); months past
+    the raw window are compacted to one row per student per month
+    (``sample_count`` > 1) by the compact_prediction_history command.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="prediction_history")
+    period = models.DateField(db_index=True)
+    generated_at = models.DateTimeField(default=timezone.now)
+    risk_score = models.FloatField()
+    risk_min = models.FloatField()
+    risk_max = models.FloatField()
+    average_marks = models.FloatField(null=True, blank=True)
+    predicted_grade = models.CharField(max_length=5, null=True, blank=True)
+    sample_count = models.IntegerField(default=1)
+    is_compacted = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = "prediction_history"
+        indexes = [models.Index(fields=['student', 'generated_at'])]
+
+    @staticmethod
+    def period_for(dt):
+        return dt.date().replace(day=1)
+
 class FeedbackLog(models.Model):
     student_id_val = models.IntegerField(null=True, blank=True) # Loose coupling or FK? SQLAlchemy had student_id. Let's stick to simple field if specific FK missing
     content = models.TextField()
@@ -54,3 +88,251 @@ class FeedbackLog(models.Model):
 
     class Meta:
         db_table = "feedback_logs"
+
+class AnalyticsRollup(models.Model):
+    """
+    Precomputed course x semester x subject cube with grouping-set subtotals.
+    A dimension equal to ALL (or semester 0) means "every value", so
+    ('CSE', 5, '*') is the CSE semester 5 subtotal and ('*', 0, '*') the grand total.
+    """
+    ALL = "*"
+    ALL_SEMESTERS = 0
+
+    course = models.CharField(max_length=50)
+    semester = models.IntegerField()
+    subject_name = models.CharField(max_length=100)
+
+    record_count = models.IntegerField(default=0)
+    student_count = models.IntegerField(default=0)
+    marks_sum = models.FloatField(default=0)
+    percentage_sum = models.FloatField(default=0)
+    attendance_sum = models.FloatField(default=0)
+    attendance_count = models.IntegerField(default=0)
+    grade_point_sum = models.FloatField(default=0)
+    pass_count = models.IntegerField(default=0)
+    fail_count = models.IntegerField(default=0)
+    risk_low = models.IntegerField(default=0)
+    risk_medium = models.IntegerField(default=0)
+    risk_high = models.IntegerField(default=0)
+    risk_critical = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "analytics_rollup"
+        unique_together = ('course', 'semester', 'subject_name')
+        indexes = [models.Index(fields=['semester', 'subject_name'])]
+
+class RollupContribution(models.Model):
+    """
+    One student's records in one base cube cell, as last folded into
+    AnalyticsRollup. RollupService diffs a student's fresh rows against
+    these and applies the difference to every affected cell, including the
+    cells a student leaves when their course changes.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="rollup_contributions")
+    course = models.CharField(max_length=50)
+    semester = models.IntegerField()
+    subject_name = models.CharField(max_length=100)
+
+    record_count = models.IntegerField(default=0)
+    marks_sum = models.FloatField(default=0)
+    percentage_sum = models.FloatField(default=0)
+    attendance_sum = models.FloatField(default=0)
+    attendance_count = models.IntegerField(default=0)
+    grade_point_sum = models.FloatField(default=0)
+    pass_count = models.IntegerField(default=0)
+    fail_count = models.IntegerField(default=0)
+    risk_band = models.CharField(max_length=20, null=True, blank=True)  # from the latest prediction
+
+    class Meta:
+        db_table = "analytics_rollup_contributions"
+        unique_together = ('student', 'course', 'semester', 'subject_name')
+
+class RiskRuleSet(models.Model):
+    """Risk rule configs that have been applied to the stored predictions."""
+    version = models.IntegerField(unique=True)
+    config = models.JSONField()
+    applied_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "risk_rule_sets"
+
+class UploadBatch(models.Model):
+    """
+    One master upload, keyed by the SHA-256 of the file and an optional
+    client Idempotency-Key so retries and double submits replay ``result``.
+    Keys are scoped to the endpoint and the requesting user; ``data_version``
+    is the dashboard version the upload produced, so an identical re-send
+    only replays while no other change has touched the data since.
+    """
+    PROCESSING = "processing"
+    COMPLETE = "complete"
+    FAILED = "failed"
+
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+    endpoint = models.CharField(max_length=100, default="upload_master")
+    requester = models.CharField(max_length=150, default="", blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    file_name = models.CharField(max_length=255)
+    file_size = models.BigIntegerField(default=0)
+    scope = models.CharField(max_length=20, default="current")
+    status = models.CharField(max_length=20, default=PROCESSING)
+    result = models.JSONField(null=True, blank=True)
+    data_version = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "upload_batches"
+        constraints = [
+            models.UniqueConstraint(fields=['idempotency_key', 'endpoint', 'requester'],
+                                    name="upload_batch_key_per_requester"),
+            # At most one live run per file, so concurrent identical uploads without a key can't both ingest
+            models.UniqueConstraint(fields=['content_hash', 'scope'], condition=models.Q(status="processing"),
+                                    name="upload_batch_one_live_per_file"),
+        ]
+
+class RescoreShard(models.Model):
+    """Checkpoint for one student-id range of a rescore_cohort run."""
+    run_id = models.CharField(max_length=40, db_index=True)
+    start_id = models.BigIntegerField()
+    end_id = models.BigIntegerField()
+    done = models.BooleanField(default=False)
+    students = models.IntegerField(default=0)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "rescore_shards"
+        unique_together = ('run_id', 'start_id')
+
+class DataAnomaly(models.Model):
+    """
+    Output of the cohort anomaly stage; fully replaced on every run.
+    ``score`` is a robust z-score for outliers, or the drop in points for
+    the semester-over-semester kinds.
+    """
+    RECORD_OUTLIER = "record_outlier"
+    INVALID_VALUE = "invalid_value"
+    STUDENT_DROP = "student_drop"
+    SECTION_DROP = "section_drop"
+
+    kind = models.CharField(max_length=30, db_index=True)
+    metric = models.CharField(max_length=20)
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, null=True, blank=True, related_name="anomalies")
+    subject_name = models.CharField(max_length=100, null=True, blank=True)
+    semester = models.IntegerField(null=True, blank=True)
+    value = models.FloatField()
+    baseline = models.FloatField(null=True, blank=True)
+    score = models.FloatField()
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "data_anomalies"
+        indexes = [models.Index(fields=['kind', 'semester'])]
+
+class QuantileSketch(models.Model):
+    """
+    Mergeable fixed-bin histogram of one metric for a course/semester/subject
+    slice (same ALL conventions as AnalyticsRollup). ``bins`` is sparse:
+    {bin_index: count}. Unlike t-digest/KLL it supports removals, which
+    re-uploads (overwritten marks/SGPA) need.
+    """
+    metric = models.CharField(max_length=20)
+    course = models.CharField(max_length=50)
+    semester = models.IntegerField()
+    subject_name = models.CharField(max_length=100)
+    bins = models.JSONField(default=dict)
+    count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "quantile_sketches"
+        unique_together = ('metric', 'course', 'semester', 'subject_name')
+
+class ArchivedCohort(models.Model):
+    """
+    A closed cohort moved out of the hot tables by the archive_cohort
+    command. ``criteria`` records how its students were selected.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    criteria = models.JSONField(default=dict)
+    student_count = models.IntegerField(default=0)
+    record_count = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "archived_cohorts"
+
+class ArchivedStudent(models.Model):
+    """
+    One archived student. ``payload`` is the zlib-compressed JSON of the
+    student's rows from every hot table; the columns beside it are kept
+    uncompressed for lookups.
+    """
+    cohort = models.ForeignKey(ArchivedCohort, on_delete=models.CASCADE, related_name="students")
+    student_id_val = models.BigIntegerField()
+    roll_number = models.CharField(max_length=20, db_index=True)
+    name = models.CharField(max_length=100)
+    course = models.CharField(max_length=50, null=True, blank=True)
+    semester = models.IntegerField(default=1)
+    record_count = models.IntegerField(default=0)
+    payload = models.BinaryField()
+
+    class Meta:
+        db_table = "archived_students"
+        unique_together = ('cohort', 'roll_number')
+
+class ArchivedRollup(models.Model):
+    """
+    An archived cohort's contribution to one AnalyticsRollup cell, frozen at
+    archive time. RollupService adds these to the cells it computes from
+    the hot tables, so the cube still covers archived students.
+    """
+    cohort = models.ForeignKey(ArchivedCohort, on_delete=models.CASCADE, related_name="rollups")
+    course = models.CharField(max_length=50)
+    semester = models.IntegerField()
+    subject_name = models.CharField(max_length=100)
+
+    record_count = models.IntegerField(default=0)
+    student_count = models.IntegerField(default=0)
+    marks_sum = models.FloatField(default=0)
+    percentage_sum = models.FloatField(default=0)
+    attendance_sum = models.FloatField(default=0)
+    attendance_count = models.IntegerField(default=0)
+    grade_point_sum = models.FloatField(default=0)
+    pass_count = models.IntegerField(default=0)
+    fail_count = models.IntegerField(default=0)
+    risk_low = models.IntegerField(default=0)
+    risk_medium = models.IntegerField(default=0)
+    risk_high = models.IntegerField(default=0)
+    risk_critical = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "archived_rollup"
+        unique_together = ('cohort', 'course', 'semester', 'subject_name')
+        indexes = [models.Index(fields=['course', 'semester', 'subject_name'])]
+
+class DashboardState(models.Model):
+    """
+    Singleton (pk=1) holding the shared data-change version and the last
+    published dashboard, which the next publish diffs against. Every worker
+    reads the version from here; publishers serialize on its row lock.
+    """
+    version = models.BigIntegerField(default=0)
+    snapshot = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Database clock time of the last primary write; reads stay off the replica shortly after it
+    last_write_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "dashboard_state"
+
+class DashboardEvent(models.Model):
+    """One published dashboard delta, replayable by SSE clients until it expires."""
+    version = models.BigIntegerField(primary_key=True)
+    reason = models.CharField(max_length=50)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "dashboard_events"
@@ -0,0 +1,364 @@
+"""
+Opt-in request profiling.
+
+``RequestProfilingMiddleware`` profiles a request when one of these applies:
+
+* it carries an ``X-Profile-Token`` header signed by ``make_profile_token``.
+  Staff mint tokens through ``POST admin/profiles/token`` or the
+  profiling_token command. A token is valid for ``PROFILING_TOKEN_MAX_AGE``
+  seconds.
+* a logged-in staff user adds ``_profile=1`` to the query string
+* it is picked at random at ``PROFILING_SAMPLE_RATE``
+
+A profiled request runs with a sampler thread. The thread records the
+request thread's Python stack every ``PROFILING_INTERVAL_MS``, weighting
+each sample by the wall time since the previous one. An execute_wrapper
+(see query_budget.record_queries) logs every SQL statement with its start
+offset and duration. Two files per request go to ``PROFILING_DIR``:
+
+* ``<id>.speedscope.json``: the sampled profile plus the SQL timeline as an
+  evented profile. Open it in https://www.speedscope.app.
+* ``<id>.summary.json``: the request, the inclusive time spent in the ORM,
+  pandas, numpy, MLService and serialization, the top self-time functions
+  and every query.
+
+The id comes back in the ``X-Profile-Id`` response header. The admin
+endpoints list profiles and serve both files, plus collapsed stacks for
+flamegraph.pl.
+
+An unprofiled request pays one header lookup and one substring test; a
+random draw is added only when sampling is on. With ``PROFILING_DIR``
+empty the middleware removes itself from the stack.
+"""
+import json
+import logging
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+from .query_budget import QueryRecorder, record_queries, sql_shape
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = "HTTP_X_PROFILE_TOKEN"
+QUERY_FLAG = "_profile"
+TOKEN_SALT = "analytics.profiling"
+
+DEFAULT_INTERVAL_MS = 2.0
+DEFAULT_MAX_FILES = 200
+DEFAULT_TOKEN_MAX_AGE = 3600
+MAX_SQL_LENGTH = 2000
+
+# Inclusive-time buckets: a sample counts toward every bucket with a frame on its stack
+CATEGORIES = {
+    "orm": ("/django/db/",),
+    "pandas": ("/pandas/",),
+    "numpy": ("/numpy/",),
+    "ml_service": ("/analytics/services/ml_service.py",),
+    "serialization": ("/rest_framework/renderers.py", "/rest_framework/serializers.py",
+                      "/rest_framework/fields.py", "/json/"),
+}
+
+
+def make_profile_token(requested_by: str = "") -> str:
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(requested_by or "staff")
+
+
+def read_profile_token(token: str):
+    """The name a valid token was minted for, or None if it is forged or expired."""
+    max_age = getattr(settings, "PROFILING_TOKEN_MAX_AGE", DEFAULT_TOKEN_MAX_AGE)
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return None
+
+
+def _short_path(path: str) -> str:
+    for marker in ("site-packages/", "backend_django/"):
+        if marker in path:
+            return path.split(marker, 1)[1]
+    return path
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack, below ``root``, every ``interval`` seconds."""
+
+    def __init__(self, thread_id: int, root, start: float, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.start_time = start
+        self.interval = interval
+        self.frames = {}    # (function, file, first line) -> frame index
+        self.samples = []   # stacks of frame indexes, outermost first
+        self.times = []     # seconds since start when each sample was taken
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame is not self.root:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                index = self.frames.get(key)
+                if index is None:
+                    index = self.frames[key] = len(self.frames)
+                stack.append(index)
+                frame = frame.f_back
+            frame = None
+            if stack:
+                stack.reverse()
+                self.samples.append(stack)
+                self.times.append(time.perf_counter() - self.start_time)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def weights_ms(self) -> list:
+        """Wall time each sample stands for: the gap since the previous sample."""
+        previous, weights = 0.0, []
+        for t in self.times:
+            weights.append((t - previous) * 1000.0)
+            previous = t
+        return weights
+
+
+class SqlTimeline(QueryRecorder):
+    """QueryRecorder that also keeps when each query started and how long it took."""
+
+    def __init__(self, start: float):
+        super().__init__()
+        self.start_time = start
+        self.events = []
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return super().__call__(execute, sql, params, many, context)
+        finally:
+            self.events.append({
+                "at_ms": round((began - self.start_time) * 1000.0, 3),
+                "ms": round((time.perf_counter() - began) * 1000.0, 3),
+                "alias": context["connection"].alias,
+                "sql": sql[:MAX_SQL_LENGTH],
+            })
+
+
+def build_speedscope(name: str, sampler: StackSampler, timeline: SqlTimeline, duration_ms: float) -> dict:
+    frames = [
+        {"name": function, "file": _short_path(path), "line": line}
+        for (function, path, line) in sampler.frames
+    ]
+    # SQL statements become frames of their own, one per query shape
+    sql_frames = {}
+    events = []
+    for query in timeline.events:
+        shape = sql_shape(query["sql"])[0][:200]
+        index = sql_frames.get(shape)
+        if index is None:
+            index = sql_frames[shape] = len(frames)
+            frames.append({"name": shape, "file": query["alias"]})
+        events.append({"type": "O", "frame": index, "at": query["at_ms"]})
+        events.append({"type": "C", "frame": index, "at": query["at_ms"] + query["ms"]})
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "analytics.profiling",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled", "name": f"{name} (wall clock)", "unit": "milliseconds",
+                "startValue": 0, "endValue": duration_ms,
+                "samples": sampler.samples, "weights": sampler.weights_ms(),
+            },
+            {
+                "type": "evented", "name": f"{name} (SQL)", "unit": "milliseconds",
+                "startValue": 0, "endValue": duration_ms, "events": events,
+            },
+        ],
+    }
+
+
+def summarize(sampler: StackSampler, timeline: SqlTimeline, top: int = 15) -> dict:
+    paths = [path for (_, path, _) in sampler.frames]
+    frame_categories = [
+        {category for category, markers in CATEGORIES.items() if any(m in path for m in markers)}
+        for path in paths
+    ]
+    inclusive = Counter({category: 0.0 for category in CATEGORIES})
+    self_time = Counter()
+    names = [f"{function} ({_short_path(path)}:{line})" for (function, path, line) in sampler.frames]
+    for stack, weight in zip(sampler.samples, sampler.weights_ms()):
+        for category in set().union(*(frame_categories[i] for i in stack)):
+            inclusive[category] += weight
+        self_time[names[stack[-1]]] += weight
+    return {
+        "sample_count": len(sampler.samples),
+        "inclusive_ms": {k: round(v, 2) for k, v in inclusive.items()},
+        "top_self_ms": [{"function": f, "ms": round(ms, 2)} for f, ms in self_time.most_common(top)],
+        "sql": {
+            "count": len(timeline.events),
+            "total_ms": round(sum(q["ms"] for q in timeline.events), 3),
+            "queries": timeline.events,
+        },
+    }
+
+
+def folded_stacks(speedscope: dict) -> str:
+    """Collapsed stacks ("a;b;c <microseconds>" per line) for flamegraph.pl and friends."""
+    frames = speedscope["shared"]["frames"]
+    profile = speedscope["profiles"][0]
+    totals = Counter()
+    for stack, weight in zip(profile["samples"], profile["weights"]):
+        totals[";".join(f"{frames[i]['name']} ({frames[i]['file']})" for i in stack)] += weight
+    return "".join(f"{stack} {round(ms * 1000)}\n" for stack, ms in totals.items())
+
+
+class ProfileStore:
+    """Profile files in one directory, newest first by id (ids start with a UTC timestamp)."""
+
+    SPEEDSCOPE_SUFFIX = ".speedscope.json"
+    SUMMARY_SUFFIX = ".summary.json"
+
+    def __init__(self, directory, max_files: int = DEFAULT_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    @classmethod
+    def from_settings(cls):
+        directory = getattr(settings, "PROFILING_DIR", None)
+        if not directory:
+            return None
+        return cls(directory, getattr(settings, "PROFILING_MAX_FILES", DEFAULT_MAX_FILES))
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{timezone.now():%Y%m%dT%H%M%S%f}-{secrets.token_hex(3)}"
+
+    def speedscope_path(self, profile_id: str) -> Path:
+        return self.directory / f"{profile_id}{self.SPEEDSCOPE_SUFFIX}"
+
+    def summary_path(self, profile_id: str) -> Path:
+        return self.directory / f"{profile_id}{self.SUMMARY_SUFFIX}"
+
+    def save(self, profile_id: str, speedscope: dict, summary: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.speedscope_path(profile_id).write_text(json.dumps(speedscope, separators=(",", ":")))
+        # The summary is written last: list() only shows complete profiles
+        self.summary_path(profile_id).write_text(json.dumps(summary, default=str))
+        self.prune()
+
+    def ids(self) -> list:
+        if not self.directory.is_dir():
+            return []
+        return sorted((p.name[:-len(self.SUMMARY_SUFFIX)] for p in self.directory.glob(f"*{self.SUMMARY_SUFFIX}")),
+                      reverse=True)
+
+    def prune(self):
+        for profile_id in self.ids()[self.max_files:]:
+            self.summary_path(profile_id).unlink(missing_ok=True)
+            self.speedscope_path(profile_id).unlink(missing_ok=True)
+
+    def summary(self, profile_id: str):
+        try:
+            return json.loads(self.summary_path(profile_id).read_text())
+        except FileNotFoundError:
+            return None
+
+    def speedscope(self, profile_id: str):
+        try:
+            return json.loads(self.speedscope_path(profile_id).read_text())
+        except FileNotFoundError:
+            return None
+
+    def list(self, path_prefix: str = None, limit: int = 50) -> list:
+        results = []
+        for profile_id in self.ids():
+            summary = self.summary(profile_id)
+            if summary is None or (path_prefix and not summary["path"].startswith(path_prefix)):
+                continue
+            summary["sql"] = {k: v for k, v in summary["sql"].items() if k != "queries"}
+            summary.pop("top_self_ms", None)
+            results.append(summary)
+            if len(results) >= limit:
+                break
+        return results
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.store = ProfileStore.from_settings()
+        if self.store is None:
+            raise MiddlewareNotUsed
+        self.sample_rate = float(getattr(settings, "PROFILING_SAMPLE_RATE", 0))
+        self.interval = float(getattr(settings, "PROFILING_INTERVAL_MS", DEFAULT_INTERVAL_MS)) / 1000.0
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        return self.profile(request, *trigger)
+
+    def trigger(self, request):
+        """(trigger, requested_by) when this request should be profiled, else None."""
+        token = request.META.get(TOKEN_HEADER)
+        if token is not None:
+            requested_by = read_profile_token(token)
+            if requested_by is not None:
+                return "token", requested_by
+        if QUERY_FLAG in request.META.get("QUERY_STRING", "") and request.GET.get(QUERY_FLAG) == "1":
+            user = getattr(request, "user", None)
+            if user is not None and user.is_staff:
+                return "staff", user.get_username()
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled", None
+        return None
+
+    def profile(self, request, trigger, requested_by):
+        started_at = timezone.now()
+        start = time.perf_counter()
+        sampler = StackSampler(threading.get_ident(), sys._getframe(), start, self.interval)
+        timeline = SqlTimeline(start)
+        sampler.start()
+        try:
+            with record_queries(timeline):
+                response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration_ms = round((time.perf_counter() - start) * 1000.0, 3)
+
+        profile_id = self.store.new_id()
+        name = f"{request.method} {request.path}"
+        summary = {
+            "id": profile_id,
+            "method": request.method,
+            "path": request.path,
+            "query_string": request.META.get("QUERY_STRING", ""),
+            "status": response.status_code,
+            "trigger": trigger,
+            "requested_by": requested_by,
+            "started_at": started_at.isoformat(),
+            "duration_ms": duration_ms,
+            "interval_ms": self.interval * 1000.0,
+            **summarize(sampler, timeline),
+        }
+        try:
+            self.store.save(profile_id, build_speedscope(name, sampler, timeline, duration_ms), summary)
+        except OSError:
+            logger.warning("Could not write request profile %s", profile_id, exc_info=True)
+            return response
+        response["X-Profile-Id"] = profile_id
+        return response
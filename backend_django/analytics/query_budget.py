@@ -0,0 +1,115 @@
+"""
+Per-view query budgets and N+1 detection.
+
+Decorate a view method with ``@query_budget(max_queries)`` to declare how
+many SQL queries one request may run. While the view runs, every query on
+every connection is recorded. Afterwards the total is checked against the
+budget, and any single-row query shape that ran more than ``max_repeats``
+times is flagged. That repeated-shape pattern is the N+1 signature: a
+lookup inside a Python loop.
+
+Batched statements (multi-value ``IN`` lists, multi-row ``VALUES``) and
+transaction control are counted toward the budget but never flagged as
+repeats. Chunking a bulk operation is intentional.
+
+``settings.QUERY_BUDGET_MODE`` picks what happens on a violation:
+``"raise"`` (tests), ``"log"`` (development) or ``"off"``. When it is off
+the decorator returns straight away, so production pays one settings lookup.
+"""
+import functools
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_REPEATS = 10
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)")
+_MULTI_ROW_VALUES = re.compile(r"\)\s*,\s*\(")
+# Transaction control (atomic blocks) repeats legitimately
+_TRANSACTION_CONTROL = re.compile(r"^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def sql_shape(sql: str) -> tuple:
+    """(normalized SQL with literals and placeholder lists collapsed, whether it is batched)."""
+    batched = bool(_PLACEHOLDER_LIST.search(sql) or _MULTI_ROW_VALUES.search(sql)
+                   or _TRANSACTION_CONTROL.match(sql))
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _PLACEHOLDER_LIST.sub("(...)", shape)
+    return " ".join(shape.split()), batched
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps the SQL of every query it sees."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def repeated(self, max_repeats: int) -> list:
+        """Unbatched query shapes seen more than ``max_repeats`` times, most frequent first."""
+        shapes = Counter(shape for shape, batched in map(sql_shape, self.queries) if not batched)
+        return [(shape, n) for shape, n in shapes.most_common() if n > max_repeats]
+
+
+@contextmanager
+def record_queries(recorder: QueryRecorder = None):
+    recorder = recorder or QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def check_budget(recorder: QueryRecorder, label: str, max_queries: int, max_repeats: int) -> list:
+    problems = []
+    if recorder.count > max_queries:
+        problems.append(f"{label} ran {recorder.count} queries (budget {max_queries})")
+    for shape, n in recorder.repeated(max_repeats):
+        problems.append(f"{label} repeated a query {n} times (possible N+1): {shape[:200]}")
+    return problems
+
+
+def query_budget(max_queries: int, max_repeats: int = None):
+    """Declare a view method's query budget (see module docstring)."""
+    def decorator(view):
+        label = view.__qualname__
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = getattr(settings, "QUERY_BUDGET_MODE", "off")
+            if mode == "off":
+                return view(*args, **kwargs)
+            with record_queries() as recorder:
+                response = view(*args, **kwargs)
+            repeats = max_repeats if max_repeats is not None else getattr(
+                settings, "QUERY_BUDGET_MAX_REPEATS", DEFAULT_MAX_REPEATS)
+            problems = check_budget(recorder, label, max_queries, repeats)
+            if problems and mode == "raise":
+                raise QueryBudgetExceeded("\n".join(problems))
+            for problem in problems:
+                logger.warning(problem)
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
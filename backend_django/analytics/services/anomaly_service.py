@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from ..models import AcademicRecord, DataAnomaly
+
+# Iglewicz-Hoaglin modified z-score: 0.6745 * (x - median) / MAD, flag |z| > 3.5
+MAD_SCALE = 0.6745
+Z_THRESHOLD = 3.5
+# Semester-over-semester drops (percentage points)
+STUDENT_DROP = {"marks": 25.0, "attendance": 25.0}
+SECTION_DROP = {"marks": 30.0, "attendance": 30.0}
+MIN_SECTION_SIZE = 5
+
+RECORD_COLUMNS = ['id', 'student_id', 'subject_name', 'semester', 'marks_obtained', 'total_marks', 'attendance_percentage']
+FETCH_CHUNK = 50000
+ANOMALY_COLUMNS = ['kind', 'metric', 'student_id', 'subject_name', 'semester', 'value', 'baseline', 'score']
+
+
+def robust_z(values: pd.Series, keys: list) -> tuple:
+    """Per-group median and modified z-score; groups with MAD 0 score NaN."""
+    median = values.groupby(keys, observed=True).transform('median')
+    mad = (values - median).abs().groupby(keys, observed=True).transform('median')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = MAD_SCALE * (values - median) / mad.replace(0, np.nan)
+    return z, median
+
+
+def _columns(data: dict) -> dict:
+    """Broadcast scalar entries to the length of the Series ones, as object arrays."""
+    n = max(len(v) for v in data.values() if isinstance(v, pd.Series))
+    return {
+        col: (v.to_numpy(dtype=object) if isinstance(v, pd.Series) else np.full(n, v, dtype=object))
+        for col, v in data.items()
+    }
+
+
+class AnomalyService:
+    """
+    Whole-table anomaly detection over AcademicRecord in vectorized pandas:
+    per subject+semester robust z-scores, impossible values, per-student
+    semester-over-semester drops and whole-section collapses.
+    """
+
+    @staticmethod
+    def load_records(records=None) -> pd.DataFrame:
+        records = records if records is not None else AcademicRecord.objects.all()
+        rows = records.values_list(*RECORD_COLUMNS).iterator(chunk_size=FETCH_CHUNK)
+        df = pd.DataFrame.from_records(rows, columns=RECORD_COLUMNS)
+        df['semester'] = df['semester'].astype('int16')
+        df['subject_name'] = df['subject_name'].astype('category')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df['marks'] = (df['marks_obtained'] / df['total_marks'] * 100).astype('float32')
+        df['attendance'] = df['attendance_percentage'].astype('float32')
+        return df
+
+    @staticmethod
+    def detect(df: pd.DataFrame) -> pd.DataFrame:
+        """Returns one row per anomaly with DataAnomaly's columns."""
+        found = []
+        section = [df['subject_name'], df['semester']]
+
+        for metric in ('marks', 'attendance'):
+            values = df[metric]
+
+            invalid = values.notna() & ((values < 0) | (values > 100) | np.isinf(values))
+            found.append(_columns({
+                'kind': DataAnomaly.INVALID_VALUE, 'metric': metric,
+                'student_id': df['student_id'][invalid], 'subject_name': df['subject_name'][invalid],
+                'semester': df['semester'][invalid], 'value': values[invalid],
+                'baseline': np.nan, 'score': values[invalid],
+            }))
+
+            z, median = robust_z(values.where(~invalid), section)
+            out = z.abs() > Z_THRESHOLD
+            found.append(_columns({
+                'kind': DataAnomaly.RECORD_OUTLIER, 'metric': metric,
+                'student_id': df['student_id'][out], 'subject_name': df['subject_name'][out],
+                'semester': df['semester'][out], 'value': values[out],
+                'baseline': median[out], 'score': z[out],
+            }))
+
+        # Semester-over-semester: each student's semester mean vs their previous semester
+        per = (df.groupby(['student_id', 'semester'], sort=True, observed=True)[['marks', 'attendance']]
+               .mean().reset_index())
+        prev = per.groupby('student_id')[['marks', 'attendance']].shift(1)
+        for metric in ('marks', 'attendance'):
+            delta = per[metric] - prev[metric]
+            drop = delta <= -STUDENT_DROP[metric]
+            found.append(_columns({
+                'kind': DataAnomaly.STUDENT_DROP, 'metric': metric,
+                'student_id': per['student_id'][drop], 'subject_name': None,
+                'semester': per['semester'][drop], 'value': per[metric][drop],
+                'baseline': prev[metric][drop], 'score': delta[drop],
+            }))
+
+        # Section collapse: median change of a subject+semester's students vs their previous semester
+        per_prev = per[['student_id', 'semester']].assign(
+            prev_marks=prev['marks'].to_numpy(), prev_attendance=prev['attendance'].to_numpy())
+        joined = df[['student_id', 'subject_name', 'semester', 'marks', 'attendance']].merge(
+            per_prev, on=['student_id', 'semester'], how='left')
+        for metric in ('marks', 'attendance'):
+            joined[f'delta_{metric}'] = joined[metric] - joined[f'prev_{metric}']
+        sections = joined.groupby(['subject_name', 'semester'], observed=True).agg(
+            size=('delta_marks', 'count'),
+            marks=('marks', 'median'), attendance=('attendance', 'median'),
+            prev_marks=('prev_marks', 'median'), prev_attendance=('prev_attendance', 'median'),
+            delta_marks=('delta_marks', 'median'), delta_attendance=('delta_attendance', 'median'),
+        ).reset_index()
+        sections = sections[sections['size'] >= MIN_SECTION_SIZE]
+        for metric in ('marks', 'attendance'):
+            drop = sections[f'delta_{metric}'] <= -SECTION_DROP[metric]
+            found.append(_columns({
+                'kind': DataAnomaly.SECTION_DROP, 'metric': metric,
+                'student_id': None, 'subject_name': sections['subject_name'][drop],
+                'semester': sections['semester'][drop], 'value': sections[metric][drop],
+                'baseline': sections[f'prev_{metric}'][drop], 'score': sections[f'delta_{metric}'][drop],
+            }))
+
+        return pd.DataFrame({
+            col: np.concatenate([f[col] for f in found]) if found else np.array([], dtype=object)
+            for col in ANOMALY_COLUMNS
+        })
+
+    @classmethod
+    def run(cls) -> dict:
+        """Recompute every anomaly and replace the stored set."""
+        anomalies = cls.detect(cls.load_records())
+
+        def clean(v, cast):
+            return None if pd.isna(v) else cast(v)
+
+        objs = [
+            DataAnomaly(
+                kind=a.kind, metric=a.metric,
+                student_id=clean(a.student_id, int),
+                subject_name=clean(a.subject_name, str),
+                semester=int(a.semester),
+                value=float(a.value), baseline=clean(a.baseline, float), score=float(a.score),
+            )
+            for a in anomalies.astype(object).itertuples(index=False)
+        ]
+        with transaction.atomic():
+            DataAnomaly.objects.all().delete()
+            DataAnomaly.objects.bulk_create(objs, batch_size=5000)
+        return anomalies['kind'].value_counts().to_dict()
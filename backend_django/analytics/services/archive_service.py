@@ -0,0 +1,198 @@
+"""
+Cold storage for closed cohorts.
+
+``archive`` moves a cohort's students out of the hot tables (students,
+academic_records, semester_performance, predictions, prediction_history)
+into ArchivedStudent rows: one zlib-compressed JSON payload per student
+plus a few plain columns for lookups. The cohort's contribution to the
+rollup cube is frozen into ArchivedRollup first, so course/semester/subject
+totals are unchanged while dashboards, anomaly detection, quantile sketches
+and every hot-table scan see only active students.
+
+Archival is per student rather than per semester: risk scores, trends and
+anomalies read a student's whole record history, so splitting one student
+across hot and cold storage would silently change their numbers.
+``restore`` moves a cohort back.
+"""
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+
+from ..models import (
+    AcademicRecord, ArchivedCohort, ArchivedRollup, ArchivedStudent, Prediction,
+    PredictionHistory, SemesterPerformance, Student,
+)
+from .rollup_service import RollupService
+from .scoring_service import ScoringService
+from .subject_alerts import SubjectAlertService
+
+CHUNK_SIZE = 500
+# Payload section -> model; rows are stored as .values() dicts and restored as-is
+SECTIONS = {
+    'academic_records': AcademicRecord,
+    'semester_performance': SemesterPerformance,
+    'predictions': Prediction,
+    'prediction_history': PredictionHistory,
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def pack(data: dict) -> bytes:
+    return zlib.compress(json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':')).encode(), 9)
+
+
+def unpack(payload) -> dict:
+    return json.loads(zlib.decompress(bytes(payload)))
+
+
+class ArchiveService:
+    @staticmethod
+    def select_students(course=None, min_semester=None, roll_prefix=None, rolls=None):
+        """Students matching every given criterion (e.g. graduated: ``min_semester`` = final semester)."""
+        students = Student.objects.all()
+        if course:
+            students = students.filter(course=course)
+        if min_semester is not None:
+            students = students.filter(semester__gte=min_semester)
+        if roll_prefix:
+            students = students.filter(roll_number__startswith=roll_prefix)
+        if rolls:
+            students = students.filter(roll_number__in=rolls)
+        return students
+
+    @staticmethod
+    def _payloads(student_ids) -> list:
+        """ArchivedStudent objects (without cohort) for one chunk of students."""
+        rows = {sid: {section: [] for section in SECTIONS} for sid in student_ids}
+        for section, model in SECTIONS.items():
+            for row in model.objects.filter(student_id__in=student_ids).order_by('id').values():
+                rows[row['student_id']][section].append(row)
+
+        archived = []
+        for student in Student.objects.filter(id__in=student_ids).order_by('id').values():
+            data = {'student': student, **rows[student['id']]}
+            archived.append(ArchivedStudent(
+                student_id_val=student['id'],
+                roll_number=student['roll_number'],
+                name=student['name'],
+                course=student['course'],
+                semester=student['semester'],
+                record_count=len(data['academic_records']),
+                payload=pack(data),
+            ))
+        return archived
+
+    @classmethod
+    def archive(cls, name: str, students, criteria=None) -> ArchivedCohort:
+        """Move ``students`` (a Student queryset) into a new archived cohort called ``name``."""
+        from .anomaly_service import AnomalyService
+        from .dashboard_events import publish_dashboard_change
+        from .quantile_sketch import QuantileSketchService
+
+        with transaction.atomic():
+            if ArchivedCohort.objects.filter(name=name).exists():
+                raise ArchiveError(f"Cohort '{name}' is already archived")
+            ids = list(students.order_by('id').values_list('id', flat=True))
+            if not ids:
+                raise ArchiveError("No students match the cohort criteria")
+            rolls = list(students.values_list('roll_number', flat=True))
+
+            summary = RollupService.summarize(students)
+            sketch_before = QuantileSketchService.capture(rolls)
+
+            cohort = ArchivedCohort.objects.create(name=name, criteria=criteria or {})
+            record_count = 0
+            for i in range(0, len(ids), CHUNK_SIZE):
+                chunk = ids[i:i + CHUNK_SIZE]
+                archived = cls._payloads(chunk)
+                for a in archived:
+                    a.cohort = cohort
+                    record_count += a.record_count
+                ArchivedStudent.objects.bulk_create(archived)
+                Student.objects.filter(id__in=chunk).delete()  # cascades to every hot table
+            ArchivedRollup.objects.bulk_create([
+                ArchivedRollup(cohort=cohort, course=c, semester=s, subject_name=j, **metrics)
+                for (c, s, j), metrics in summary.items()
+            ], batch_size=CHUNK_SIZE)
+            cohort.student_count = len(ids)
+            cohort.record_count = record_count
+            cohort.save(update_fields=['student_count', 'record_count'])
+
+            # The cube keeps its totals: the students' contributions went with them
+            # (cascade) and the frozen summaries above take their place
+            QuantileSketchService.apply(sketch_before, {k: df.iloc[:0] for k, df in sketch_before.items()})
+            AnomalyService.run()
+        publish_dashboard_change("archive")
+        return cohort
+
+    @classmethod
+    def restore(cls, name: str) -> int:
+        """Move an archived cohort back into the hot tables; returns the number of students."""
+        from .anomaly_service import AnomalyService
+        from .dashboard_events import publish_dashboard_change
+        from .quantile_sketch import QuantileSketchService
+
+        with transaction.atomic():
+            try:
+                cohort = ArchivedCohort.objects.select_for_update().get(name=name)
+            except ArchivedCohort.DoesNotExist:
+                raise ArchiveError(f"No archived cohort named '{name}'")
+            rolls = list(cohort.students.values_list('roll_number', flat=True))
+            clashes = []
+            for i in range(0, len(rolls), CHUNK_SIZE):
+                clashes += Student.objects.filter(roll_number__in=rolls[i:i + CHUNK_SIZE]).values_list(
+                    'roll_number', flat=True)
+            if clashes:
+                raise ArchiveError(f"{len(clashes)} archived roll numbers are active again, e.g. {clashes[0]}")
+
+            ids = []
+            archived = cohort.students.order_by('id').values_list('payload', flat=True)
+            for i in range(0, len(rolls), CHUNK_SIZE):
+                data = [unpack(p) for p in archived[i:i + CHUNK_SIZE]]
+                Student.objects.bulk_create([Student(**d['student']) for d in data])
+                ids += [d['student']['id'] for d in data]
+                for section, model in SECTIONS.items():
+                    model.objects.bulk_create([model(**row) for d in data for row in d[section]])
+                # The rules may have changed while the cohort was archived
+                SubjectAlertService.refresh(records=AcademicRecord.objects.filter(student_id__in=ids[-len(data):]))
+
+            RollupService.remove_archived(cohort)
+            cohort.delete()  # and its frozen rollup summaries
+            ScoringService.rescore_students(ids)
+            RollupService.refresh_for_students(ids)
+            QuantileSketchService.apply(None, QuantileSketchService.capture(rolls))
+            AnomalyService.run()
+        publish_dashboard_change("restore")
+        return len(ids)
+
+    @staticmethod
+    def find(q: str = '', cohort: str = None, limit: int = 50) -> list:
+        """Archived students by roll number prefix or name, without unpacking payloads."""
+        students = ArchivedStudent.objects.select_related('cohort').order_by('roll_number', 'id')
+        if q:
+            students = students.filter(Q(roll_number__istartswith=q) | Q(name__icontains=q))
+        if cohort:
+            students = students.filter(cohort__name=cohort)
+        return [
+            {
+                "roll_number": s.roll_number, "name": s.name, "course": s.course,
+                "semester": s.semester, "records": s.record_count,
+                "cohort": s.cohort.name, "archived_at": s.cohort.archived_at,
+            }
+            for s in students.defer('payload')[:limit]
+        ]
+
+    @staticmethod
+    def load(roll_number: str) -> list:
+        """Every archived copy of a student, newest cohort first, with the full payload."""
+        return [
+            {"cohort": s.cohort.name, "archived_at": s.cohort.archived_at, **unpack(s.payload)}
+            for s in ArchivedStudent.objects.filter(roll_number=roll_number)
+            .select_related('cohort').order_by('-cohort__archived_at')
+        ]
@@ -0,0 +1,196 @@
+"""
+Parquet / Arrow IPC import and export.
+
+pyarrow is in requirements.txt but imported optionally: CSV uploads work
+without it, while Parquet and Arrow uploads and all exports raise
+``ArrowUnavailable`` until it is installed.
+
+Imports read only the columns the master ingest uses, straight from the
+uploaded bytes (no text decoding or number parsing). Exports stream each
+table from a server-side cursor and write one Parquet row group per batch,
+so memory stays bounded by the row-group size however large the table is.
+Under ASGI, ``aiter_chunks`` wraps the export generator so Django streams it
+instead of collecting every chunk before the first byte goes out.
+"""
+import io
+
+import pandas as pd
+from asgiref.sync import sync_to_async
+
+from ..models import AcademicRecord, Prediction, SemesterPerformance, Student
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = ipc = pq = None
+
+# Columns UploadMasterView.ingest reads; anything else in the file is skipped
+MASTER_COLUMNS = [
+    'roll_number', 'name', 'email', 'course', 'semester', 'subject_name',
+    'subject_credits', 'credits', 'marks_obtained', 'total_marks',
+    'attendance_percentage', 'cgpa',
+]
+CSV_EXTENSIONS = ('.csv',)
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+UPLOAD_EXTENSIONS = CSV_EXTENSIONS + PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+
+ROW_GROUP_SIZE = 100_000
+
+
+class ArrowUnavailable(Exception):
+    pass
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ArrowUnavailable("Parquet/Arrow support needs the optional 'pyarrow' package")
+
+
+def read_master_file(content: io.BytesIO, file_name: str) -> pd.DataFrame:
+    """The uploaded master file as a DataFrame, limited to MASTER_COLUMNS."""
+    name = file_name.lower()
+    if name.endswith(CSV_EXTENSIONS):
+        return pd.read_csv(content, encoding='utf-8', usecols=lambda c: c in MASTER_COLUMNS)
+
+    _require_pyarrow()
+    # Wraps the upload's buffer without copying it
+    source = pa.BufferReader(pa.py_buffer(content.getbuffer()))
+    if name.endswith(PARQUET_EXTENSIONS):
+        schema = pq.read_schema(source)
+        source.seek(0)
+        table = pq.read_table(source, columns=[c for c in MASTER_COLUMNS if c in schema.names])
+    else:
+        try:
+            reader = ipc.open_file(source)
+        except pa.ArrowInvalid:
+            # Streaming format (no footer)
+            source.seek(0)
+            reader = ipc.open_stream(source)
+        table = reader.read_all()
+        table = table.select([c for c in MASTER_COLUMNS if c in table.column_names])
+    return table.to_pandas()
+
+
+# dataset -> (queryset factory, [(column, arrow type)])
+EXPORTS = {
+    'students': (
+        lambda: Student.objects.order_by('id'),
+        [('id', 'int64'), ('roll_number', 'string'), ('name', 'string'),
+         ('email', 'string'), ('course', 'string'), ('semester', 'int16')],
+    ),
+    'academic_records': (
+        lambda: AcademicRecord.objects.order_by('id'),
+        [('id', 'int64'), ('student_id', 'int64'), ('subject_name', 'string'),
+         ('semester', 'int16'), ('marks_obtained', 'float64'),
+         ('total_marks', 'float64'), ('grade', 'string'), ('grade_point', 'int16'),
+         ('attendance_percentage', 'float64'), ('subject_credits', 'int16'),
+         ('percentage', 'float64'), ('subject_alert', 'string')],
+    ),
+    'semester_performance': (
+        lambda: SemesterPerformance.objects.order_by('id'),
+        [('id', 'int64'), ('student_id', 'int64'), ('semester', 'int16'),
+         ('sgpa', 'float64'), ('cgpa', 'float64'),
+         ('attendance_percentage', 'float64')],
+    ),
+    'predictions': (
+        lambda: Prediction.objects.order_by('id'),
+        [('id', 'int64'), ('student_id', 'int64'), ('risk_score', 'float64'),
+         ('predicted_grade', 'string'), ('average_marks', 'float64'),
+         ('sentiment_score', 'float64'), ('generated_at', 'timestamp')],
+    ),
+}
+
+
+def export_schema(dataset: str):
+    _require_pyarrow()
+    _, columns = EXPORTS[dataset]
+    return pa.schema([
+        (name, pa.timestamp('us', tz='UTC') if type_ == 'timestamp' else getattr(pa, type_)())
+        for name, type_ in columns
+    ])
+
+
+def iter_record_batches(dataset: str, batch_size: int = ROW_GROUP_SIZE):
+    """The table as typed Arrow record batches of up to ``batch_size`` rows."""
+    schema = export_schema(dataset)
+    queryset, _ = EXPORTS[dataset]
+    rows = queryset().values_list(*schema.names).iterator(chunk_size=min(batch_size, 10_000))
+
+    def to_batch(chunk):
+        columns = list(zip(*chunk))
+        return pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema)
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch_size:
+            yield to_batch(chunk)
+            chunk = []
+    if chunk:
+        yield to_batch(chunk)
+
+
+def write_parquet(dataset: str, sink, batch_size: int = ROW_GROUP_SIZE) -> int:
+    """Write ``dataset`` to ``sink`` (path or file), one row group per batch; returns rows written."""
+    schema = export_schema(dataset)
+    rows = 0
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for batch in iter_record_batches(dataset, batch_size):
+            writer.write_batch(batch, row_group_size=batch_size)
+            rows += batch.num_rows
+    return rows
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to a generator as they arrive."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def stream_parquet(dataset: str, batch_size: int = ROW_GROUP_SIZE):
+    """Generator of Parquet file bytes, flushed after every row group (for streaming responses)."""
+    schema = export_schema(dataset)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema, compression='zstd')
+    try:
+        for batch in iter_record_batches(dataset, batch_size):
+            writer.write_batch(batch, row_group_size=batch_size)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+async def aiter_chunks(chunks):
+    """
+    Async iterator over a sync byte generator such as ``stream_parquet``.
+    Each chunk is produced on Django's sync thread (where the server-side
+    cursor lives) and sent before the next one is built.
+    """
+    get_next = sync_to_async(next)
+    try:
+        while (chunk := await get_next(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,408 @@
+"""
+Memory-mapped columnar snapshot of the dashboard's source tables.
+
+``AcademicRecord``, ``SemesterPerformance`` and ``Prediction`` (plus the
+student columns the alerts show) are exported as typed NumPy ``.npy``
+columns. Subjects and courses are dictionary-encoded, marks and GPAs are
+float32, and semesters are int8. Strings are stored Arrow-style as one UTF-8
+byte buffer plus offsets.
+
+Every worker opens the files with ``mmap_mode='r'``, so the pages live once
+in the OS page cache and are shared by all processes. Dashboard stats, trend,
+GPA distribution and alerts are computed from those arrays without touching
+the database.
+
+Layout under ``settings.ANALYTICS_SNAPSHOT_DIR``::
+
+    CURRENT              name of the live build directory
+    v<version>-<ts>/     one complete build: *.npy columns + meta.json
+
+A rebuild writes a hidden directory, renames it into place and then swaps
+``CURRENT`` with ``os.replace``. Readers therefore see either the old build
+or the new one, never a partial build. Builds are tagged with the shared
+data-change version (``dashboard_events.current_version``, stored in the
+database) read before the export, so a build never claims to be newer than
+its data. Once ``publish_dashboard_change`` bumps the version, the live build
+is stale in every worker and callers fall back to the database.
+
+Rebuilds happen off the request path. ``schedule_rebuild`` runs after each
+publish commits: it debounces bursts of changes (``ANALYTICS_SNAPSHOT_DEBOUNCE``
+seconds) and rebuilds in a background thread. An exclusive lock file keeps
+concurrent processes from building the same version twice. The
+build_analytics_snapshot command does the same from cron or a deploy hook.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connections
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; builds are then only serialized per process
+    fcntl = None
+
+from ..models import AcademicRecord, Prediction, SemesterPerformance, Student
+from .risk_rules import risk_rules
+
+logger = logging.getLogger(__name__)
+
+POINTER = "CURRENT"
+LOCK_FILE = ".build.lock"
+DEFAULT_DEBOUNCE = 2.0
+FETCH_CHUNK = 50000
+KEEP_BUILDS = 2  # the live build and its predecessor (still mapped by slow readers)
+
+
+def _code_dtype(n: int):
+    return np.int16 if n < np.iinfo(np.int16).max else np.int32
+
+
+def _encode_strings(values) -> tuple:
+    """(offsets int64[n+1], utf-8 bytes uint8[]) for a sequence of str/None."""
+    encoded = [v.encode() if v else b"" for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _load(path: Path) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Zero-length arrays can't be memory-mapped
+        return np.load(path)
+
+
+def _py(value, digits=4):
+    """float32 -> float without the binary noise (7.9 rather than 7.900000095)."""
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def _group_mean(keys: np.ndarray, values: np.ndarray, size: int) -> tuple:
+    """Per-key mean of the non-NaN values (like SQL AVG), plus per-key counts."""
+    valid = ~np.isnan(values)
+    sums = np.bincount(keys[valid], weights=values[valid], minlength=size)
+    counts = np.bincount(keys[valid], minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts, counts
+
+
+class ColumnarSnapshot:
+    """One mapped build. Arrays are read-only views over the files."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.meta = json.loads((path / "meta.json").read_text())
+        self.data_version = self.meta["data_version"]
+        self.cols = {f.stem: _load(f) for f in path.glob("*.npy")}
+
+    def _string(self, name: str, i: int) -> str:
+        offsets, data = self.cols[f"{name}_offsets"], self.cols[f"{name}_bytes"]
+        return bytes(data[offsets[i]:offsets[i + 1]]).decode()
+
+    @property
+    def student_count(self) -> int:
+        return len(self.cols["student_id"])
+
+    def compute_stats(self) -> dict:
+        c = self.cols
+        total_students = self.student_count
+        if total_students == 0:
+            return {"total_students": 0}
+
+        rules = risk_rules.current
+        risk = c["prediction_risk"]
+        alerts_count = int((risk > rules.alert_risk).sum())
+        critical_count = int((risk > rules.critical_risk).sum())
+
+        # Grade distribution: CGPA * 9.5 binned to tens, null/0 CGPA counted as 0
+        cgpa = c["perf_cgpa"].astype(np.float64)
+        val = np.where(np.isnan(cgpa) | (cgpa == 0), 0.0, cgpa * 9.5)
+        bins, counts = np.unique((val // 10).astype(np.int64) * 10, return_counts=True)
+
+        # Declining: latest semester's SGPA below the one before it
+        order = np.lexsort((c["perf_semester"], c["perf_student"]))
+        student = c["perf_student"][order]
+        sgpa = c["perf_sgpa"][order]
+        last = np.r_[student[1:] != student[:-1], True] if len(student) else np.zeros(0, bool)
+        has_prev = np.r_[False, student[1:] == student[:-1]] if len(student) else np.zeros(0, bool)
+        idx = np.flatnonzero(last & has_prev)
+        declining = int((sgpa[idx] < sgpa[idx - 1]).sum())
+
+        att = c["perf_attendance"]
+        marks = c["record_marks"]
+        return {
+            "total_students": total_students,
+            "average_attendance": round(float(np.nanmean(att)), 1) if (~np.isnan(att)).any() else 0,
+            "average_marks": round(float(marks.mean(dtype=np.float64)), 1) if len(marks) else 0,
+            "total_records": len(marks),
+            "grade_distribution": {str(b): int(n) for b, n in zip(bins, counts)},
+            "students_with_alerts": alerts_count,
+            "declining_students": declining,
+            "risk_distribution": {"High": critical_count, "Medium": alerts_count - critical_count,
+                                  "Low": total_students - alerts_count},
+        }
+
+    def compute_alerts(self, min_risk: float = None) -> list:
+        from .dashboard_service import DashboardService
+
+        c = self.cols
+        rules = risk_rules.current
+        if min_risk is None:
+            min_risk = rules.alert_risk
+        flagged = np.flatnonzero(c["prediction_risk"] > min_risk)
+        n = self.student_count
+        avg_att, _ = _group_mean(c["record_student"], c["record_attendance"], n)
+        avg_marks, _ = _group_mean(c["record_student"], c["record_marks"], n)
+
+        alerts = []
+        for i in flagged:
+            s = c["prediction_student"][i]
+            att = 0 if np.isnan(avg_att[s]) else round(float(avg_att[s]), 1)
+            mk = 0 if np.isnan(avg_marks[s]) else round(float(avg_marks[s]), 1)
+            alerts.append(DashboardService.format_alert(
+                rules, self._string("student_roll", s), self._string("student_name", s),
+                float(c["prediction_risk"][i]), att, mk,
+            ))
+        return alerts
+
+    def compute_trend(self) -> list:
+        c = self.cols
+        semesters = c["perf_semester"].astype(np.int64)
+        if not len(semesters):
+            return []
+        avg_sgpa, _ = _group_mean(semesters, c["perf_sgpa"].astype(np.float64), semesters.max() + 1)
+        return [
+            {"name": f"Sem {sem}", "value": round(0 if np.isnan(avg_sgpa[sem]) else float(avg_sgpa[sem]) * 9.5, 1)}
+            for sem in np.unique(semesters)
+        ]
+
+    def compute_gpa_analytics(self) -> dict:
+        c = self.cols
+        sgpa = np.nan_to_num(c["perf_sgpa"].astype(np.float64), nan=0.0)
+        edges = [(9, "9-10"), (8, "8-9"), (7, "7-8"), (6, "6-7"), (5, "5-6"), (4, "4-5")]
+        dist, remaining = {}, np.ones(len(sgpa), dtype=bool)
+        for floor, label in edges:
+            hit = remaining & (sgpa >= floor)
+            dist[label] = int(hit.sum())
+            remaining &= ~hit
+        dist["<4"] = int(remaining.sum())
+
+        has_att = ~np.isnan(c["perf_attendance"])
+
+        # Top performers: distinct students by their best CGPA
+        cgpa = c["perf_cgpa"]
+        ranked = np.flatnonzero(~np.isnan(cgpa))
+        ranked = ranked[np.argsort(-cgpa[ranked], kind="stable")]
+        top_list, seen = [], set()
+        for i in ranked:
+            s = int(c["perf_student"][i])
+            if s not in seen:
+                seen.add(s)
+                top_list.append({"name": self._string("student_name", s),
+                                 "roll": self._string("student_roll", s), "cgpa": _py(cgpa[i])})
+            if len(top_list) >= 5:
+                break
+
+        return {
+            "distribution": dist,
+            "top_performers": top_list,
+            "correlation": {
+                "sgpa": np.round(sgpa[has_att], 4).tolist(),
+                "attendance": np.round(c["perf_attendance"][has_att].astype(np.float64), 4).tolist(),
+            },
+        }
+
+
+class ColumnarSnapshotStore:
+    """Builds snapshots and hands each process its mapped copy of the live one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._pointer_stat = None
+        self._rebuild_due = None
+        self._worker = None
+
+    @property
+    def root(self):
+        path = getattr(settings, "ANALYTICS_SNAPSHOT_DIR", None)
+        return Path(path) if path else None
+
+    def current(self):
+        """The live snapshot if it is up to date with the data, else None (use the DB)."""
+        from .dashboard_events import current_version
+
+        root = self.root
+        if root is None:
+            return None
+        try:
+            st = os.stat(root / POINTER)
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns)
+        if key != self._pointer_stat:
+            with self._lock:
+                if key != self._pointer_stat:
+                    try:
+                        build = (root / POINTER).read_text().strip()
+                        self._snapshot = ColumnarSnapshot(root / build)
+                    except (OSError, ValueError):
+                        self._snapshot = None
+                    self._pointer_stat = key
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.data_version < current_version():
+            return None
+        return snapshot
+
+    @staticmethod
+    def _export() -> dict:
+        def frame(qs, columns):
+            rows = qs.values_list(*columns).iterator(chunk_size=FETCH_CHUNK)
+            return pd.DataFrame.from_records(rows, columns=columns)
+
+        students = frame(Student.objects.order_by("id"), ["id", "roll_number", "name", "course"])
+        records = frame(AcademicRecord.objects.order_by("id"),
+                        ["student_id", "subject_name", "semester", "marks_obtained", "attendance_percentage"])
+        perfs = frame(SemesterPerformance.objects.order_by("id"),
+                      ["student_id", "semester", "sgpa", "cgpa", "attendance_percentage"])
+        preds = frame(Prediction.objects.order_by("id"), ["student_id", "risk_score"])
+
+        ids = students["id"].to_numpy(dtype=np.int64)
+
+        def position(student_ids):
+            return np.searchsorted(ids, student_ids.to_numpy(dtype=np.int64)).astype(np.int32)
+
+        def floats(series, dtype=np.float32):
+            return pd.to_numeric(series, errors="coerce").to_numpy(dtype=dtype, na_value=np.nan)
+
+        courses_codes, courses = pd.factorize(students["course"].fillna(""))
+        subject_codes, subjects = pd.factorize(records["subject_name"])
+        roll_offsets, roll_bytes = _encode_strings(students["roll_number"])
+        name_offsets, name_bytes = _encode_strings(students["name"])
+
+        columns = {
+            "student_id": ids,
+            "student_course": courses_codes.astype(_code_dtype(len(courses))),
+            "student_roll_offsets": roll_offsets, "student_roll_bytes": roll_bytes,
+            "student_name_offsets": name_offsets, "student_name_bytes": name_bytes,
+            "record_student": position(records["student_id"]),
+            "record_subject": subject_codes.astype(_code_dtype(len(subjects))),
+            "record_semester": records["semester"].to_numpy(dtype=np.int8),
+            "record_marks": floats(records["marks_obtained"]),
+            "record_attendance": floats(records["attendance_percentage"]),
+            "perf_student": position(perfs["student_id"]),
+            "perf_semester": perfs["semester"].to_numpy(dtype=np.int8),
+            "perf_sgpa": floats(perfs["sgpa"]),
+            "perf_cgpa": floats(perfs["cgpa"]),
+            "perf_attendance": floats(perfs["attendance_percentage"]),
+            "prediction_student": position(preds["student_id"]),
+            # float64 so threshold comparisons agree exactly with the database
+            "prediction_risk": floats(preds["risk_score"], np.float64),
+        }
+        dictionaries = {"courses": list(courses), "subjects": list(subjects)}
+        return columns, dictionaries
+
+    def live_version(self):
+        """data_version of the build CURRENT points at, or None."""
+        try:
+            build = (self.root / POINTER).read_text().strip()
+            return json.loads((self.root / build / "meta.json").read_text())["data_version"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def rebuild_if_stale(self):
+        """Build for the current data version unless the live build already has it."""
+        from .dashboard_events import current_version
+
+        root = self.root
+        if root is None:
+            return None
+        root.mkdir(parents=True, exist_ok=True)
+        with open(root / LOCK_FILE, "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            version = current_version()
+            live = self.live_version()
+            if live is not None and live >= version:
+                return None
+            return self.rebuild(data_version=version)
+
+    def schedule_rebuild(self, delay: float = None):
+        """Rebuild in a background thread once no change has come in for ``delay`` seconds."""
+        if self.root is None:
+            return
+        if delay is None:
+            delay = float(getattr(settings, "ANALYTICS_SNAPSHOT_DEBOUNCE", DEFAULT_DEBOUNCE))
+        with self._lock:
+            self._rebuild_due = time.monotonic() + delay
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._rebuild_when_due, name="snapshot-rebuild", daemon=True)
+                self._worker.start()
+
+    def _rebuild_when_due(self):
+        try:
+            while True:
+                with self._lock:
+                    if self._rebuild_due is None:
+                        self._worker = None
+                        return
+                    wait = self._rebuild_due - time.monotonic()
+                    if wait <= 0:
+                        self._rebuild_due = None
+                if wait > 0:
+                    time.sleep(wait)
+                    continue
+                try:
+                    self.rebuild_if_stale()
+                except Exception:
+                    # The build stays stale and readers keep using the database
+                    logger.exception("Columnar snapshot rebuild failed")
+        finally:
+            connections.close_all()
+
+    def rebuild(self, data_version: int) -> Path:
+        """Export the tables and atomically make the new build the live one."""
+        root = self.root
+        if root is None:
+            return None
+        root.mkdir(parents=True, exist_ok=True)
+        columns, dictionaries = self._export()
+
+        tmp = Path(tempfile.mkdtemp(dir=root, prefix=".build-"))
+        try:
+            for name, array in columns.items():
+                np.save(tmp / f"{name}.npy", np.ascontiguousarray(array))
+            (tmp / "meta.json").write_text(json.dumps({
+                "data_version": data_version,
+                "built_at": time.time(),
+                "rows": {name: len(array) for name, array in columns.items()},
+                **dictionaries,
+            }))
+            build = f"v{data_version}-{time.time_ns()}"
+            os.rename(tmp, root / build)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        pointer_tmp = root / f".{POINTER}.{os.getpid()}"
+        pointer_tmp.write_text(build)
+        os.replace(pointer_tmp, root / POINTER)
+
+        builds = sorted((p for p in root.glob("v*") if p.is_dir()), key=lambda p: p.stat().st_mtime)
+        for old in builds[:-KEEP_BUILDS]:
+            # Mapped files stay readable for processes still holding them
+            shutil.rmtree(old, ignore_errors=True)
+        return root / build
+
+
+columnar_snapshot = ColumnarSnapshotStore()
@@ -0,0 +1,170 @@
+"""
+Live dashboard updates over Server-Sent Events.
+
+Data-changing endpoints (master upload, reset, student reprocessing) call
+``publish_dashboard_change`` once their writes are done. It recomputes the
+dashboard a single time, diffs it against the previous snapshot and stores a
+versioned delta event. Streaming clients only read those stored events, so
+any number of open dashboards costs one computation per data change instead
+of one per client per poll.
+
+The version counter, the last snapshot and the deltas live in the database
+(DashboardState / DashboardEvent), so every worker process sees the same
+version and streams the same events. Publishers serialize on the state row.
+
+``aevent_stream`` is the ASGI stream (async, ``asyncio.sleep`` between polls,
+cancelled when the client disconnects). ``event_stream`` is the WSGI one; it
+ends after ``STREAM_MAX_SECONDS`` so a worker thread is never held for good,
+and EventSource reconnects with Last-Event-ID without losing events.
+"""
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from ..db_router import mark_primary_write, use_primary
+from ..models import DashboardEvent, DashboardState
+from .columnar_snapshot import columnar_snapshot
+from .dashboard_service import DashboardService
+
+STATE_ID = 1
+EVENT_TTL = 60 * 60          # seconds a delta stays replayable
+POLL_INTERVAL = 1.0          # seconds between version checks per stream
+HEARTBEAT_INTERVAL = 15.0    # keeps proxies from closing idle streams
+STREAM_MAX_SECONDS = 300     # WSGI streams end here; the client reconnects
+RETRY_MS = 1000              # EventSource reconnect delay
+
+
+def _build_snapshot() -> dict:
+    return {
+        "kpis": DashboardService.compute_stats(),
+        "trend": DashboardService.compute_trend(),
+        "alerts": {a["roll"]: a for a in DashboardService.compute_alerts()},
+    }
+
+
+def diff_snapshots(previous: dict, current: dict) -> dict:
+    """Changed KPI values plus new/updated and cleared alerts."""
+    old_kpis, new_kpis = previous.get("kpis", {}), current["kpis"]
+    kpis = {k: v for k, v in new_kpis.items() if old_kpis.get(k) != v}
+    # KPIs that disappeared (e.g. after a reset) are reported as null
+    kpis.update({k: None for k in old_kpis if k not in new_kpis})
+
+    old_alerts, new_alerts = previous.get("alerts", {}), current["alerts"]
+    changed = [a for roll, a in new_alerts.items() if old_alerts.get(roll) != a]
+    cleared = [roll for roll in old_alerts if roll not in new_alerts]
+
+    delta = {"kpis": kpis, "alerts": {"new": changed, "cleared": cleared}}
+    if previous.get("trend") != current["trend"]:
+        delta["trend"] = current["trend"]
+    return delta
+
+
+def current_version() -> int:
+    """The shared data-change version (always read from the primary)."""
+    version = (DashboardState.objects.using("default").filter(pk=STATE_ID)
+               .values_list("version", flat=True).first())
+    return version or 0
+
+
+def publish_dashboard_change(reason: str) -> dict:
+    """Recompute the dashboard once and store the delta as the next event."""
+    # Clients refetch on this event; keep their reads off a lagging replica
+    mark_primary_write()
+    with use_primary(), transaction.atomic():
+        state, _ = DashboardState.objects.select_for_update().get_or_create(pk=STATE_ID)
+        # Bump first: the columnar snapshot then counts as stale, so the
+        # recompute below reads the changed data from the database
+        state.version += 1
+        state.save(update_fields=["version", "updated_at"])
+        version, snapshot = state.version, _build_snapshot()
+
+        event = {"version": version, "reason": reason, **diff_snapshots(state.snapshot or {}, snapshot)}
+        state.snapshot = snapshot
+        state.save(update_fields=["snapshot", "updated_at"])
+        DashboardEvent.objects.create(version=version, reason=reason, payload=event)
+        DashboardEvent.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=EVENT_TTL)).delete()
+        # The bump makes the columnar snapshot stale everywhere; rebuild it off the request path
+        transaction.on_commit(columnar_snapshot.schedule_rebuild)
+        return event
+
+
+def _format_sse(event_type: str, data: dict, event_id=None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class _StreamCursor:
+    """Where one client is in the event sequence; ``poll`` returns the frames it still needs."""
+
+    def __init__(self, last_event_id=None):
+        self.last_event_id = last_event_id
+        self.seen = None
+        self.last_beat = time.monotonic()
+
+    def hello(self) -> str:
+        latest = current_version()
+        self.seen = latest if self.last_event_id is None else self.last_event_id
+        return f"retry: {RETRY_MS}\n" + _format_sse("hello", {"version": latest}, self.seen)
+
+    def poll(self) -> list:
+        frames = []
+        latest = current_version()
+        if latest < self.seen:
+            # State was reset; the client's view can't be patched any more
+            self.seen = latest
+            frames.append(_format_sse("resync", {"version": latest}, latest))
+        if self.seen < latest:
+            events = dict(DashboardEvent.objects.using("default")
+                          .filter(version__gt=self.seen, version__lte=latest)
+                          .values_list("version", "payload"))
+            for version in range(self.seen + 1, latest + 1):
+                if version not in events:
+                    # Expired (or never stored): tell the client to refetch
+                    frames.append(_format_sse("resync", {"version": latest}, latest))
+                    break
+                frames.append(_format_sse("delta", events[version], version))
+            self.seen = latest
+            self.last_beat = time.monotonic()
+
+        if time.monotonic() - self.last_beat >= HEARTBEAT_INTERVAL:
+            self.last_beat = time.monotonic()
+            frames.append(": heartbeat\n\n")
+        return frames
+
+
+def event_stream(last_event_id=None, max_seconds=STREAM_MAX_SECONDS, poll_interval=POLL_INTERVAL):
+    """
+    WSGI generator of SSE frames. Replays events after ``last_event_id`` (sent
+    by EventSource on reconnect) and tells the client to refetch if any of
+    them already expired. Ends after ``max_seconds``.
+    """
+    cursor = _StreamCursor(last_event_id)
+    yield cursor.hello()
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        yield from cursor.poll()
+        time.sleep(poll_interval)
+
+
+async def aevent_stream(last_event_id=None, max_seconds=STREAM_MAX_SECONDS, poll_interval=POLL_INTERVAL):
+    """
+    ASGI version of ``event_stream``. Waiting doesn't hold a thread, and
+    Django cancels the generator (CancelledError at the await) as soon as
+    the client disconnects.
+    """
+    cursor = _StreamCursor(last_event_id)
+    yield await sync_to_async(cursor.hello)()
+    deadline = time.monotonic() + max_seconds
+    while time.monotonic() < deadline:
+        for frame in await sync_to_async(cursor.poll)():
+            yield frame
+        await asyncio.sleep(poll_interval)
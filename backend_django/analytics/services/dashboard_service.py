@@ -0,0 +1,190 @@
+from django.db.models import Avg
+from ..models import Student, AcademicRecord, SemesterPerformance, Prediction
+from .columnar_snapshot import columnar_snapshot
+from .risk_rules import risk_rules
+
+
+class DashboardService:
+    """
+    Institution-wide dashboard aggregates.
+    Shared by the REST views and the SSE event publisher so both always
+    compute KPIs and alerts the same way. Served from the memory-mapped
+    columnar snapshot when it is current, from the database otherwise.
+    """
+
+    @staticmethod
+    def compute_stats() -> dict:
+        snapshot = columnar_snapshot.current()
+        if snapshot is not None:
+            return snapshot.compute_stats()
+
+        total_students = Student.objects.count()
+        if total_students == 0:
+            return {"total_students": 0}
+
+        sp_agg = SemesterPerformance.objects.aggregate(
+            avg_att=Avg('attendance_percentage'),
+            avg_cgpa=Avg('cgpa')
+        )
+
+        # KPI 2: Avg Marks
+        avg_marks_agg = AcademicRecord.objects.aggregate(avg=Avg('marks_obtained'))
+        avg_marks = round(avg_marks_agg['avg'] or 0, 1)
+
+        # KPI 4: Alerts Count (cut-offs follow the rules' alert ladder)
+        rules = risk_rules.current
+        alerts_count = Prediction.objects.filter(risk_score__gt=rules.alert_risk).count()
+        critical_count = Prediction.objects.filter(risk_score__gt=rules.critical_risk).count()
+
+        # Grade Distribution: latest SemesterPerformance CGPA mapped to buckets.
+        # Frontend parses the keys as floats, e.g. "90": 10 (count of students 90-100)
+        grade_dist = {}
+        perfs = SemesterPerformance.objects.all()
+        for p in perfs:
+            # map sgpa/cgpa to rough percentage for the bucket
+            val = (p.cgpa * 9.5) if p.cgpa else 0
+            # bin it to nearest 10 for cleaner JSON
+            bin_key = str(int(val // 10) * 10) # "90", "80"
+            grade_dist[bin_key] = grade_dist.get(bin_key, 0) + 1
+
+        # KPI 5: Declining Students (Current SGPA < Previous SGPA), from one ordered scan
+        latest_two = {}
+        rows = SemesterPerformance.objects.order_by('student_id', '-semester').values_list('student_id', 'sgpa')
+        for student_id, sgpa in rows:
+            sgpas = latest_two.setdefault(student_id, [])
+            if len(sgpas) < 2:
+                sgpas.append(sgpa)
+        declining_count = sum(
+            1 for sgpas in latest_two.values()
+            if len(sgpas) == 2 and None not in sgpas and sgpas[0] < sgpas[1]
+        )
+
+        return {
+            "total_students": total_students,
+            "average_attendance": round(sp_agg['avg_att'] or 0, 1),
+            "average_marks": avg_marks,
+            "total_records": AcademicRecord.objects.count(),
+            "grade_distribution": grade_dist,
+            "students_with_alerts": alerts_count,
+            "declining_students": declining_count,
+            "risk_distribution": {"High": critical_count, "Medium": alerts_count - critical_count, "Low": total_students - alerts_count}
+        }
+
+    @staticmethod
+    def compute_alerts(min_risk: float = None) -> list:
+        snapshot = columnar_snapshot.current()
+        if snapshot is not None:
+            return snapshot.compute_alerts(min_risk)
+
+        rules = risk_rules.current
+        if min_risk is None:
+            min_risk = rules.alert_risk
+        predictions = Prediction.objects.filter(risk_score__gt=min_risk).select_related('student')
+
+        # Take global average from AcademicRecords as "Current Attendance" proxy
+        student_ids = [p.student.id for p in predictions]
+        records = AcademicRecord.objects.filter(student_id__in=student_ids).values('student_id').annotate(
+            avg_att=Avg('attendance_percentage'),
+            avg_marks=Avg('marks_obtained')
+        )
+        att_map = {r['student_id']: r['avg_att'] for r in records}
+        marks_map = {r['student_id']: r['avg_marks'] for r in records}
+
+        return [
+            DashboardService.format_alert(
+                rules, p.student.roll_number, p.student.name, p.risk_score,
+                round(att_map.get(p.student.id, 0), 1), round(marks_map.get(p.student.id, 0), 1),
+            )
+            for p in predictions
+        ]
+
+    @staticmethod
+    def format_alert(rules, roll, name, risk, att, mk) -> dict:
+        # Status/actions from the risk ladder, main cause from the cause ladder
+        status_label, actions = rules.alert_status(risk)
+        main_cause, cause_action, action_first = rules.alert_cause(att, mk)
+        if cause_action:
+            if action_first:
+                actions.insert(0, cause_action)
+            else:
+                actions.append(cause_action)
+
+        return {
+            "roll": roll,
+            "name": name,
+            "risk": risk,
+            "attendance": att,
+            "marks": mk,
+            "status": status_label,
+            "main_cause": main_cause,
+            "actions": sorted(set(actions)), # De-dupe (sorted so snapshots diff stably)
+            "message": f"{status_label}: {main_cause}"
+        }
+
+    @staticmethod
+    def compute_trend() -> list:
+        snapshot = columnar_snapshot.current()
+        if snapshot is not None:
+            return snapshot.compute_trend()
+
+        # Frontend expects: [{name: 'Sem 1', value: 75}, {name: 'Sem 2', value: 80}]
+        data = SemesterPerformance.objects.values('semester').annotate(
+            avg_sgpa=Avg('sgpa'),
+            avg_att=Avg('attendance_percentage')
+        ).order_by('semester')
+
+        formatted = []
+        for d in data:
+            formatted.append({
+                "name": f"Sem {d['semester']}",
+                # DashboardView.jsx: YAxis domain=[0, 100], so send a percentage.
+                # SGPA * 9.5 is the standard conversion.
+                "value": round((d['avg_sgpa'] or 0) * 9.5, 1)
+            })
+        return formatted
+
+    @staticmethod
+    def compute_gpa_analytics() -> dict:
+        snapshot = columnar_snapshot.current()
+        if snapshot is not None:
+            return snapshot.compute_gpa_analytics()
+
+        perfs = SemesterPerformance.objects.all()
+        dist = {"9-10": 0, "8-9": 0, "7-8": 0, "6-7": 0, "5-6": 0, "4-5": 0, "<4": 0}
+        sgpa_vals = []
+        att_vals = []
+        
+        for p in perfs:
+            val = p.sgpa or 0.0
+            if val >= 9: dist["9-10"] += 1
+            elif val >= 8: dist["8-9"] += 1
+            elif val >= 7: dist["7-8"] += 1
+            elif val >= 6: dist["6-7"] += 1
+            elif val >= 5: dist["5-6"] += 1
+            elif val >= 4: dist["4-5"] += 1
+            else: dist["<4"] += 1
+            
+            if p.attendance_percentage is not None:
+                sgpa_vals.append(val)
+                att_vals.append(p.attendance_percentage)
+                
+        # Top Performers
+        # Get distinct students with max cgpa
+        top_performers = SemesterPerformance.objects.select_related('student').order_by('-cgpa')
+        top_list = []
+        seen = set()
+        for p in top_performers:
+            if p.student.roll_number not in seen:
+                top_list.append({
+                    "name": p.student.name,
+                    "roll": p.student.roll_number,
+                    "cgpa": p.cgpa
+                })
+                seen.add(p.student.roll_number)
+            if len(top_list) >= 5: break
+            
+        return {
+            "distribution": dist,
+            "top_performers": top_list,
+            "correlation": {"sgpa": sgpa_vals, "attendance": att_vals}
+        }
@@ -5,6 +5,7 @@ from sklearn.linear_model import LogisticRegression, LinearRegression
 import nltk
 from nltk.sentiment import SentimentIntensityAnalyzer
 import os
+from .risk_rules import risk_rules
 
 # Ensure NLTK data is available
 try:
@@ -14,16 +15,9 @@ except LookupError:
 
 class MLService:
     # ---------------------------------------------------------
-    # Risk Configuration (Thresholds)
+    # Risk Configuration: thresholds, weights and bands come from the
+    # versioned rules file (see services/risk_rules.py)
     # ---------------------------------------------------------
-    RISK_CONFIG = {
-        "attendance_threshold": 70.0,
-        "marks_threshold": 50.0,
-        "subject_critical_marks": 40.0,
-        "subject_critical_attendance": 60.0,
-        "subject_warning_marks": 50.0,
-        "subject_warning_attendance": 65.0
-    }
 
     def __init__(self):
         # Placeholders for future Phase-2 (ML)
@@ -36,42 +30,30 @@ class MLService:
     # Phase-1: Heuristic Rule-Based Risk Engine (Two-Layer Model)
     # ---------------------------------------------------------
 
+    @property
+    def rules(self):
+        return risk_rules.current
+
     def attendance_risk(self, avg_attendance: float) -> float:
-        """Risk from low attendance (Global). Stricter tuning."""
-        threshold = 75.0 # Warning starts at 75%
-        if avg_attendance >= threshold:
-            return 0.0
-        return min(100.0, ((threshold - avg_attendance) / threshold) * 250)
+        """Risk from low attendance (Global)."""
+        return float(self.rules.attendance_risk(avg_attendance))
 
     def performance_risk(self, avg_marks: float) -> float:
         """Risk from low marks (Global)."""
-        threshold = 60.0 # Warning starts at 60%
-        if avg_marks >= threshold:
-            return 0.0
-        return min(100.0, ((threshold - avg_marks) / threshold) * 200)
+        return float(self.rules.performance_risk(avg_marks))
 
     def trend_risk(self, marks_list: list) -> float:
         """Risk from declining trend"""
         if len(marks_list) < 2:
             return 0
         previous_avg = sum(marks_list[:-1]) / (len(marks_list) - 1)
-        if marks_list[-1] < previous_avg:
-             diff = previous_avg - marks_list[-1]
-             return min(100, diff * 5)
-        return 0
+        return float(self.rules.trend_risk(marks_list[-1], previous_avg, len(marks_list)))
 
     def overall_risk(self, att_risk, perf_risk, trend_risk) -> float:
-        w_avg = (0.4 * att_risk + 0.5 * perf_risk + 0.1 * trend_risk)
-        max_factor = max(att_risk, perf_risk)
-        if max_factor > 70:
-            return max(w_avg, max_factor * 0.9)
-        return w_avg
+        return float(self.rules.overall_risk(att_risk, perf_risk, trend_risk))
 
     def risk_level(self, score: float) -> str:
-        if score <= 20: return "Low"
-        elif score <= 40: return "Medium"
-        elif score <= 70: return "High"
-        else: return "Critical"
+        return self.rules.risk_level(score)
 
     def evaluate_student_risk(self, avg_attendance: float, avg_marks: float, marks_list: list) -> dict:
         ar = self.attendance_risk(avg_attendance)
@@ -92,9 +74,7 @@ class MLService:
         }
 
     def evaluate_subject_risk(self, marks: float, attendance: float) -> str:
-        if marks < 40 and attendance < 60: return "Critical"
-        elif marks < 40 or attendance < 75: return "Warning"
-        else: return "Normal"
+        return self.rules.subject_alert(marks, attendance)
 
     def predict_performance(self, attendance: float, internal_marks: float) -> float:
         return (attendance * 0.3) + (internal_marks * 0.7)
@@ -0,0 +1,135 @@
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Max, Min, Sum, When
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from ..models import PredictionHistory
+
+BUCKETS = ('day', 'week', 'month')
+CHUNK_SIZE = 500
+
+
+def _months_ago(today: date, months: int) -> date:
+    """First day of the month ``months`` before ``today``'s month."""
+    index = today.year * 12 + (today.month - 1) - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class PredictionHistoryService:
+    """Append-only prediction history, downsampled trajectories and compaction."""
+
+    @staticmethod
+    def append(rows, generated_at=None) -> int:
+        """
+        ``rows`` are dicts with student_id, risk_score and optionally
+        average_marks / predicted_grade.
+        """
+        generated_at = generated_at or timezone.now()
+        period = PredictionHistory.period_for(generated_at)
+        PredictionHistory.objects.bulk_create(
+            [
+                PredictionHistory(
+                    student_id=r['student_id'],
+                    period=period,
+                    generated_at=generated_at,
+                    risk_score=r['risk_score'],
+                    risk_min=r['risk_score'],
+                    risk_max=r['risk_score'],
+                    average_marks=r.get('average_marks'),
+                    predicted_grade=r.get('predicted_grade'),
+                )
+                for r in rows
+            ],
+            batch_size=CHUNK_SIZE,
+        )
+        return len(rows)
+
+    @staticmethod
+    def trajectory(history=None, bucket='month', group_by_student=False) -> list:
+        """
+        Downsample ``history`` (a PredictionHistory queryset) into one point
+        per bucket, weighting compacted rows by their sample count.
+        """
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        history = history if history is not None else PredictionHistory.objects.all()
+
+        keys = ['student_id', 'bucket'] if group_by_student else ['bucket']
+        rows = history.annotate(
+            bucket=Trunc('generated_at', bucket)
+        ).values(*keys).annotate(
+            weighted=Sum(F('risk_score') * F('sample_count'), output_field=FloatField()),
+            samples=Sum('sample_count'),
+            students=Count('student', distinct=True),
+            risk_min=Min('risk_min'),
+            risk_max=Max('risk_max'),
+        ).order_by(*keys)
+
+        points = []
+        for r in rows:
+            point = {
+                "period": r['bucket'].date().isoformat(),
+                "avg_risk": round(r['weighted'] / r['samples'], 4),
+                "min_risk": r['risk_min'],
+                "max_risk": r['risk_max'],
+                "samples": r['samples'],
+                "students": r['students'],
+            }
+            if group_by_student:
+                point["student_id"] = r['student_id']
+            points.append(point)
+        return points
+
+    @staticmethod
+    def compact(keep_raw_months: int = 3, retention_months: int = 24, today: date = None) -> dict:
+        """
+        Collapse raw rows older than ``keep_raw_months`` into one row per
+        student per month, and drop months older than ``retention_months``.
+        Table size is then bounded by students x retention_months plus the
+        raw window.
+        """
+        today = today or timezone.now().date()
+        raw_cutoff = _months_ago(today, keep_raw_months)
+        retention_cutoff = _months_ago(today, retention_months)
+
+        deleted, _ = PredictionHistory.objects.filter(period__lt=retention_cutoff).delete()
+
+        periods = (
+            PredictionHistory.objects.filter(period__lt=raw_cutoff, is_compacted=False)
+            .values_list('period', flat=True).distinct().order_by('period')
+        )
+        compacted = 0
+        for period in list(periods):
+            with transaction.atomic():
+                month = PredictionHistory.objects.filter(period=period)
+                groups = month.values('student_id').annotate(
+                    weighted=Sum(F('risk_score') * F('sample_count'), output_field=FloatField()),
+                    marks_weighted=Sum(F('average_marks') * F('sample_count'), output_field=FloatField()),
+                    # Rows without average_marks don't count towards its mean
+                    marks_samples=Sum(Case(When(average_marks__isnull=False, then=F('sample_count')), default=0)),
+                    samples=Sum('sample_count'),
+                    risk_min=Min('risk_min'),
+                    risk_max=Max('risk_max'),
+                    last_at=Max('generated_at'),
+                ).order_by()
+                summaries = [
+                    PredictionHistory(
+                        student_id=g['student_id'],
+                        period=period,
+                        generated_at=g['last_at'],
+                        risk_score=round(g['weighted'] / g['samples'], 4),
+                        risk_min=g['risk_min'],
+                        risk_max=g['risk_max'],
+                        average_marks=g['marks_weighted'] / g['marks_samples'] if g['marks_samples'] else None,
+                        sample_count=g['samples'],
+                        is_compacted=True,
+                    )
+                    for g in groups
+                ]
+                month.delete()
+                PredictionHistory.objects.bulk_create(summaries, batch_size=CHUNK_SIZE)
+                compacted += len(summaries)
+
+        return {"deleted": deleted, "compacted_rows": compacted, "raw_cutoff": raw_cutoff.isoformat()}
@@ -0,0 +1,198 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+from django.utils import timezone
+
+from ..models import AcademicRecord, AnalyticsRollup, QuantileSketch, SemesterPerformance
+
+BINS = 1000
+# Metric -> (domain low, domain high, dimensions it is sketched over)
+METRICS = {
+    'sgpa': (0.0, 10.0, ('course', 'semester')),
+    'cgpa': (0.0, 10.0, ('course', 'semester')),
+    'attendance': (0.0, 100.0, ('course', 'semester')),
+    'marks': (0.0, 100.0, ('course', 'semester', 'subject_name')),
+}
+ALL_VALUES = {'course': AnalyticsRollup.ALL, 'semester': AnalyticsRollup.ALL_SEMESTERS,
+              'subject_name': AnalyticsRollup.ALL}
+
+PERCENTAGE = ExpressionWrapper(F('marks_obtained') * 100.0 / F('total_marks'), output_field=FloatField())
+CHUNK_SIZE = 500
+
+
+class HistogramSketch:
+    """
+    Fixed-resolution histogram over a bounded domain: add/remove/merge are bin-wise sums.
+
+    Error: ``value_at(p)`` is within one bin width ((hi - lo) / BINS, i.e.
+    0.01 SGPA/CGPA and 0.1 marks/attendance points) of the nearest-rank
+    value, so it lies between ``np.percentile(..., method='lower')`` and
+    ``method='higher'`` give or take one bin width.
+    """
+
+    def __init__(self, metric: str, counts=None):
+        self.metric = metric
+        self.lo, self.hi, _ = METRICS[metric]
+        self.width = (self.hi - self.lo) / BINS
+        self.counts = np.zeros(BINS, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def from_model(cls, sketch: QuantileSketch) -> "HistogramSketch":
+        counts = np.zeros(BINS, dtype=np.int64)
+        for idx, n in sketch.bins.items():
+            counts[int(idx)] = n
+        return cls(sketch.metric, counts)
+
+    def to_bins(self) -> dict:
+        nz = np.flatnonzero(self.counts)
+        return {str(i): int(self.counts[i]) for i in nz}
+
+    def bin_index(self, values):
+        idx = np.floor((np.asarray(values, dtype=float) - self.lo) / self.width)
+        return np.clip(idx, 0, BINS - 1).astype(np.int64)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def percentile_of(self, value: float):
+        """Share (0-100) of the distribution below ``value``, interpolated inside its bin."""
+        total = self.total
+        if total == 0:
+            return None
+        x = (min(max(value, self.lo), self.hi) - self.lo) / self.width
+        i = min(int(x), BINS - 1)
+        below = self.counts[:i].sum() + (x - i) * self.counts[i]
+        return round(100.0 * below / total, 2)
+
+    def value_at(self, percentile: float):
+        total = self.total
+        if total == 0:
+            return None
+        target = min(max(percentile, 0.0), 100.0) / 100.0 * total
+        cum = np.cumsum(self.counts)
+        i = min(int(np.searchsorted(cum, target, side='left')), BINS - 1)
+        prev = cum[i - 1] if i > 0 else 0
+        frac = (target - prev) / self.counts[i] if self.counts[i] else 0.0
+        return round(self.lo + (i + frac) * self.width, 3)
+
+
+class QuantileSketchService:
+    """
+    Keeps the QuantileSketch table in step with SemesterPerformance and
+    AcademicRecord. Uploads ``capture`` the affected students' values before
+    and after ingest; ``apply`` removes the old values from, and adds the new
+    ones to, every slice they fall in.
+    """
+
+    @staticmethod
+    def capture(rolls=None) -> dict:
+        perf_rows, marks_rows = [], []
+        chunks = [None] if rolls is None else [rolls[i:i + CHUNK_SIZE] for i in range(0, len(rolls), CHUNK_SIZE)]
+        for chunk in chunks:
+            perf = SemesterPerformance.objects.all()
+            records = AcademicRecord.objects.all()
+            if chunk is not None:
+                perf = perf.filter(student__roll_number__in=chunk)
+                records = records.filter(student__roll_number__in=chunk)
+            perf_rows += perf.values_list('student__course', 'semester', 'sgpa', 'cgpa', 'attendance_percentage')
+            marks_rows += records.annotate(pct=PERCENTAGE).values_list(
+                'student__course', 'semester', 'subject_name', 'pct')
+
+        perf_df = pd.DataFrame.from_records(perf_rows, columns=['course', 'semester', 'sgpa', 'cgpa', 'attendance'])
+        marks_df = pd.DataFrame.from_records(marks_rows, columns=['course', 'semester', 'subject_name', 'marks'])
+        for df in (perf_df, marks_df):
+            df['course'] = df['course'].fillna('')
+        return {'sgpa': perf_df, 'cgpa': perf_df, 'attendance': perf_df, 'marks': marks_df}
+
+    @staticmethod
+    def _accumulate(deltas: dict, metric: str, frame: pd.DataFrame, sign: int):
+        frame = frame[frame[metric].notna()]
+        if frame.empty:
+            return
+        dims = METRICS[metric][2]
+        idx = HistogramSketch(metric).bin_index(frame[metric].to_numpy())
+        for n in range(len(dims) + 1):
+            for gs in combinations(dims, n):
+                groups = frame.groupby(list(gs)).indices if gs else {(): np.arange(len(frame))}
+                for key, positions in groups.items():
+                    key = key if isinstance(key, tuple) else (key,)
+                    cell = dict(ALL_VALUES)
+                    cell.update(zip(gs, key))
+                    full_key = (metric, cell['course'], int(cell['semester']), cell['subject_name'])
+                    counts = np.bincount(idx[positions], minlength=BINS) * sign
+                    deltas[full_key] = deltas[full_key] + counts if full_key in deltas else counts
+
+    @classmethod
+    def apply(cls, before: dict, after: dict) -> int:
+        deltas = {}
+        for metric in METRICS:
+            if before is not None:
+                cls._accumulate(deltas, metric, before[metric], -1)
+            cls._accumulate(deltas, metric, after[metric], +1)
+        deltas = {k: v for k, v in deltas.items() if v.any()}
+        if not deltas:
+            return 0
+
+        keys = list(deltas)
+        with transaction.atomic():
+            # Make sure every row exists, then lock them all: concurrent uploads
+            # touching the same slice serialize instead of overwriting each other
+            QuantileSketch.objects.bulk_create(
+                [QuantileSketch(metric=m, course=c, semester=s, subject_name=j) for m, c, s, j in keys],
+                ignore_conflicts=True, batch_size=CHUNK_SIZE,
+            )
+            existing = {}
+            for i in range(0, len(keys), CHUNK_SIZE):
+                q = Q()
+                for metric, course, sem, subject in keys[i:i + CHUNK_SIZE]:
+                    q |= Q(metric=metric, course=course, semester=sem, subject_name=subject)
+                existing.update({
+                    (s.metric, s.course, s.semester, s.subject_name): s
+                    for s in QuantileSketch.objects.select_for_update().filter(q).order_by('id')
+                })
+
+            rows, now = [], timezone.now()
+            for key, delta in deltas.items():
+                row = existing[key]
+                sketch = HistogramSketch.from_model(row)
+                sketch.counts = np.maximum(sketch.counts + delta, 0)
+                row.bins, row.count, row.updated_at = sketch.to_bins(), sketch.total, now
+                rows.append(row)
+            QuantileSketch.objects.bulk_update(rows, ['bins', 'count', 'updated_at'], batch_size=CHUNK_SIZE)
+        return len(rows)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        QuantileSketch.objects.all().delete()
+        return cls.apply(None, cls.capture())
+
+    @staticmethod
+    def _slice_key(metric: str, course=None, semester=None, subject=None) -> tuple:
+        return (
+            metric,
+            course if course is not None else AnalyticsRollup.ALL,
+            semester if semester is not None else AnalyticsRollup.ALL_SEMESTERS,
+            subject if subject is not None else AnalyticsRollup.ALL,
+        )
+
+    @classmethod
+    def get(cls, metric: str, course=None, semester=None, subject=None):
+        """The sketch for one slice (omitted dimensions are rolled up), or None."""
+        return cls.get_many([(metric, course, semester, subject)])[(metric, course, semester, subject)]
+
+    @classmethod
+    def get_many(cls, slices) -> dict:
+        """Sketches for several (metric, course, semester, subject) slices in one query."""
+        keys = {s: cls._slice_key(*s) for s in slices}
+        q = Q()
+        for metric, course, sem, subject in set(keys.values()):
+            q |= Q(metric=metric, course=course, semester=sem, subject_name=subject)
+        found = {
+            (s.metric, s.course, s.semester, s.subject_name): HistogramSketch.from_model(s)
+            for s in QuantileSketch.objects.filter(q)
+        } if keys else {}
+        return {s: found.get(key) for s, key in keys.items()}
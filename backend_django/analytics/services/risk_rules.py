@@ -0,0 +1,298 @@
+"""
+Declarative risk rules.
+
+Thresholds, weights, risk bands and the alert/action ladders live in a
+versioned JSON file (``settings.RISK_RULES_FILE``, default
+``analytics/risk_rules.json``). ``RiskRules`` compiles a config once into:
+
+* NumPy expressions for batch scoring/classification (scalars work too),
+* Django ``Q``/``Case`` expressions for classifying rows inside the DB.
+
+``risk_rules.current`` hot-reloads the file when it changes on disk, so
+new thresholds take effect for live classification in every worker. An
+edit that does not parse is logged and the last good rules stay in force.
+Stored predictions, rollups and subject alerts are brought in line
+separately, off the request path: the ``apply_risk_rules`` command (or
+``rescore_cohort``) hands the rules to ``ScoringService.apply_rule_change``,
+which rescores only the students whose risk can actually move.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Case, CharField, Q, Value, When
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_FILE = Path(__file__).resolve().parent.parent / "risk_rules.json"
+RELOAD_CHECK_INTERVAL = 5.0  # seconds between mtime checks
+
+
+class RiskRules:
+    def __init__(self, config: dict):
+        self.config = config
+        self.version = config.get("version", 0)
+
+        scoring = config["scoring"]
+        self.att_threshold = float(scoring["attendance"]["threshold"])
+        self.att_scale = float(scoring["attendance"]["scale"])
+        self.perf_threshold = float(scoring["performance"]["threshold"])
+        self.perf_scale = float(scoring["performance"]["scale"])
+        self.trend_scale = float(scoring["trend"]["scale"])
+        weights = scoring["weights"]
+        self.w_att = float(weights["attendance"])
+        self.w_perf = float(weights["performance"])
+        self.w_trend = float(weights["trend"])
+        self.override_above = float(scoring["override"]["factor_above"])
+        self.override_multiplier = float(scoring["override"]["multiplier"])
+
+        # Risk bands on the 0-100 score scale, open-ended last band
+        levels = config["risk_levels"]
+        self.level_names = [lvl["name"] for lvl in levels]
+        self.level_bounds = np.array([lvl["max_score"] for lvl in levels[:-1]], dtype=float)
+
+        self.subject_rules = config["subject_alerts"]
+        self.default_subject_alert = config.get("default_subject_alert", "Normal")
+
+        self.alert_statuses = sorted(config["alert_statuses"], key=lambda s: -s["risk_above"])
+        self.default_alert_status = config.get("default_alert_status", "Monitor")
+        self.alert_causes = config["alert_causes"]
+        self.default_alert_cause = config.get("default_alert_cause", "General Academic Risk")
+
+        # Dashboard KPI cut-offs follow the alert ladder (0-1 risk_score scale)
+        self.alert_risk = min(s["risk_above"] for s in self.alert_statuses)
+        self.critical_risk = max(s["risk_above"] for s in self.alert_statuses)
+
+    @classmethod
+    def from_file(cls, path) -> "RiskRules":
+        with open(path, encoding="utf-8") as fh:
+            return cls(json.load(fh))
+
+    # ---------------------------------------------------------
+    # Vectorized scoring (0-100 scale)
+    # ---------------------------------------------------------
+
+    def attendance_risk(self, avg_attendance):
+        att = np.asarray(avg_attendance, dtype=float)
+        t = self.att_threshold
+        return np.where(att >= t, 0.0, np.minimum(100.0, (t - att) / t * self.att_scale))
+
+    def performance_risk(self, avg_marks):
+        marks = np.asarray(avg_marks, dtype=float)
+        t = self.perf_threshold
+        return np.where(marks >= t, 0.0, np.minimum(100.0, (t - marks) / t * self.perf_scale))
+
+    def trend_risk(self, last_marks, previous_avg, counts):
+        """Decline of the latest mark below the mean of the previous ones."""
+        last = np.asarray(last_marks, dtype=float)
+        prev = np.asarray(previous_avg, dtype=float)
+        declining = (np.asarray(counts) >= 2) & (last < prev)
+        with np.errstate(invalid="ignore"):
+            return np.where(declining, np.minimum(100.0, (prev - last) * self.trend_scale), 0.0)
+
+    def overall_risk(self, att_risk, perf_risk, trend_risk):
+        w_avg = self.w_att * att_risk + self.w_perf * perf_risk + self.w_trend * trend_risk
+        max_factor = np.maximum(att_risk, perf_risk)
+        return np.where(
+            max_factor > self.override_above,
+            np.maximum(w_avg, max_factor * self.override_multiplier),
+            w_avg,
+        )
+
+    def risk_levels(self, scores):
+        """Band names for 0-100 scores (upper bounds are inclusive)."""
+        idx = np.searchsorted(self.level_bounds, np.asarray(scores, dtype=float), side="left")
+        return np.asarray(self.level_names, dtype=object)[idx]
+
+    def subject_alerts(self, marks, attendance):
+        marks = np.asarray(marks, dtype=float)
+        att = np.asarray(attendance, dtype=float)
+        conditions = []
+        for rule in self.subject_rules:
+            parts = []
+            if "marks_below" in rule:
+                parts.append(marks < rule["marks_below"])
+            if "attendance_below" in rule:
+                parts.append(att < rule["attendance_below"])
+            reduce = np.logical_and if rule.get("match", "all") == "all" else np.logical_or
+            conditions.append(reduce.reduce(parts))
+        return np.select(conditions, [r["level"] for r in self.subject_rules], self.default_subject_alert)
+
+    # ---------------------------------------------------------
+    # Scalar helpers
+    # ---------------------------------------------------------
+
+    def risk_level(self, score: float) -> str:
+        return str(self.risk_levels(score))
+
+    def subject_alert(self, marks: float, attendance: float) -> str:
+        for rule in self.subject_rules:
+            checks = []
+            if "marks_below" in rule:
+                checks.append(marks < rule["marks_below"])
+            if "attendance_below" in rule:
+                checks.append(attendance < rule["attendance_below"])
+            if (all if rule.get("match", "all") == "all" else any)(checks):
+                return rule["level"]
+        return self.default_subject_alert
+
+    def alert_status(self, risk_score: float):
+        """(status, actions) for a 0-1 risk score."""
+        for s in self.alert_statuses:
+            if risk_score > s["risk_above"]:
+                return s["status"], list(s.get("actions", []))
+        return self.default_alert_status, []
+
+    def alert_cause(self, attendance: float, marks: float):
+        """(cause, action, action_first) from the first matching cause rule."""
+        for c in self.alert_causes:
+            if "attendance_below" in c and attendance < c["attendance_below"]:
+                return c["cause"], c.get("action"), c.get("action_first", False)
+            if "marks_below" in c and marks < c["marks_below"]:
+                return c["cause"], c.get("action"), c.get("action_first", False)
+        return self.default_alert_cause, None, False
+
+    # ---------------------------------------------------------
+    # SQL expressions
+    # ---------------------------------------------------------
+
+    def _band_limits(self):
+        """(name, lower, upper) per band on the 0-1 risk_score scale."""
+        lowers = [None] + [b / 100.0 for b in self.level_bounds]
+        uppers = [b / 100.0 for b in self.level_bounds] + [None]
+        return list(zip(self.level_names, lowers, uppers))
+
+    def risk_bands(self, risk_scores):
+        """Band names for 0-1 stored risk scores, the same bands ``risk_band_q`` selects (None stays None)."""
+        scores = np.asarray(risk_scores, dtype=float)
+        idx = np.searchsorted(self.level_bounds / 100.0, scores, side="left")
+        bands = np.asarray(self.level_names, dtype=object)[idx]
+        return np.where(np.isnan(scores), None, bands)
+
+    def risk_band_q(self, name: str, field: str = "risk_score") -> Q:
+        for level, lower, upper in self._band_limits():
+            if level == name:
+                q = Q()
+                if lower is not None:
+                    q &= Q(**{f"{field}__gt": lower})
+                if upper is not None:
+                    q &= Q(**{f"{field}__lte": upper})
+                return q
+        raise KeyError(name)
+
+    def risk_level_case(self, field: str = "risk_score") -> Case:
+        whens = [
+            When(**{f"{field}__lte": upper}, then=Value(level))
+            for level, _, upper in self._band_limits() if upper is not None
+        ]
+        return Case(*whens, default=Value(self.level_names[-1]), output_field=CharField())
+
+    def subject_alert_case(self, marks_field: str = "marks_obtained",
+                           attendance_field: str = "attendance_percentage") -> Case:
+        whens = []
+        for rule in self.subject_rules:
+            parts = []
+            if "marks_below" in rule:
+                parts.append(Q(**{f"{marks_field}__lt": rule["marks_below"]}))
+            if "attendance_below" in rule:
+                parts.append(Q(**{f"{attendance_field}__lt": rule["attendance_below"]}))
+            q = parts[0]
+            for p in parts[1:]:
+                q = (q & p) if rule.get("match", "all") == "all" else (q | p)
+            whens.append(When(q, then=Value(rule["level"])))
+        return Case(*whens, default=Value(self.default_subject_alert), output_field=CharField())
+
+    # ---------------------------------------------------------
+    # Change detection
+    # ---------------------------------------------------------
+
+    def affected_students(self, old: "RiskRules"):
+        """
+        Which stored scores a switch from ``old`` can change: (False, None)
+        for none, (True, None) for everyone, or (True, Q) with a HAVING
+        filter on the ``avg_att``/``avg_pct`` student aggregates.
+        """
+        if (self.trend_scale, self.w_att, self.w_perf, self.w_trend,
+                self.override_above, self.override_multiplier) != (
+                old.trend_scale, old.w_att, old.w_perf, old.w_trend,
+                old.override_above, old.override_multiplier):
+            return True, None
+
+        having = Q()
+        if (self.att_threshold, self.att_scale) != (old.att_threshold, old.att_scale):
+            having |= Q(avg_att__lt=max(self.att_threshold, old.att_threshold))
+        if (self.perf_threshold, self.perf_scale) != (old.perf_threshold, old.perf_scale):
+            having |= Q(avg_pct__lt=max(self.perf_threshold, old.perf_threshold))
+        if not having:
+            return False, None
+        return True, having
+
+    def bands_changed(self, old: "RiskRules") -> bool:
+        return (self.level_names != old.level_names
+                or not np.array_equal(self.level_bounds, old.level_bounds))
+
+    def subject_alerts_changed(self, old: "RiskRules") -> bool:
+        return (self.subject_rules, self.default_subject_alert) != (
+            old.subject_rules, old.default_subject_alert)
+
+
+class RiskRuleEngine:
+    """Process-wide holder that hot-reloads the rules file."""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._rules = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        return Path(self._path or getattr(settings, "RISK_RULES_FILE", DEFAULT_RULES_FILE))
+
+    @property
+    def current(self) -> RiskRules:
+        """The live rules, re-read when the file changes. Never rescores anything."""
+        if self._rules is not None and time.monotonic() - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return self._rules
+        with self._lock:
+            if self._rules is None or time.monotonic() - self._checked_at >= RELOAD_CHECK_INTERVAL:
+                self._checked_at = time.monotonic()
+                try:
+                    self._load(force=False)
+                except (OSError, ValueError, KeyError, TypeError) as exc:
+                    if self._rules is None:
+                        raise
+                    logger.error("Ignoring invalid risk rules file %s, keeping v%s: %s",
+                                 self.path, self._rules.version, exc)
+        return self._rules
+
+    def _load(self, force: bool) -> RiskRules:
+        """Parse the file if it changed (or ``force``); call with the lock held."""
+        mtime = os.stat(self.path).st_mtime
+        if force or mtime != self._mtime:
+            # Remember the mtime first so a broken file is reported once, not on every check
+            self._mtime = mtime
+            self._rules = RiskRules.from_file(self.path)
+        return self._rules
+
+    def reload(self, apply: bool = True) -> int:
+        """
+        Load the file (errors propagate) and, with ``apply``, rescore what
+        the change affects. Meant for commands, not request handlers.
+        """
+        with self._lock:
+            rules = self._load(force=True)
+            self._checked_at = time.monotonic()
+        if not apply:
+            return 0
+        from .scoring_service import ScoringService
+        return ScoringService.apply_rule_change(rules)
+
+
+risk_rules = RiskRuleEngine()
@@ -0,0 +1,315 @@
+from collections import defaultdict
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from ..models import AcademicRecord, AnalyticsRollup, ArchivedRollup, Prediction, RollupContribution
+from .risk_rules import risk_rules
+
+# Cube dimension -> AcademicRecord lookup
+DIMENSIONS = {
+    'course': 'cube_course',
+    'semester': 'semester',
+    'subject_name': 'subject_name',
+}
+ALL_VALUES = {
+    'course': AnalyticsRollup.ALL,
+    'semester': AnalyticsRollup.ALL_SEMESTERS,
+    'subject_name': AnalyticsRollup.ALL,
+}
+# Every subset of the dimensions, i.e. GROUPING SETS ((c,s,j), (c,s), ..., ())
+GROUPING_SETS = [gs for n in range(len(DIMENSIONS), -1, -1) for gs in combinations(DIMENSIONS, n)]
+
+# Cube column -> risk band name in the rules config
+RISK_BANDS = {
+    'risk_low': 'Low',
+    'risk_medium': 'Medium',
+    'risk_high': 'High',
+    'risk_critical': 'Critical',
+}
+BAND_COLUMNS = {band: column for column, band in RISK_BANDS.items()}
+
+# Metrics that add up across students; student_count and the risk bands count distinct students
+ADDITIVE_FIELDS = [
+    'record_count', 'marks_sum', 'percentage_sum', 'attendance_sum',
+    'attendance_count', 'grade_point_sum', 'pass_count', 'fail_count',
+]
+METRIC_FIELDS = [
+    'record_count', 'student_count', 'marks_sum', 'percentage_sum', 'attendance_sum',
+    'attendance_count', 'grade_point_sum', 'pass_count', 'fail_count', *RISK_BANDS,
+]
+
+CHUNK_SIZE = 500
+# Students re-folded per transaction by refresh_for_students
+STUDENT_CHUNK = 2000
+
+
+def cube_cells(course, semester, subject_name) -> list:
+    """The cube cells a base (course, semester, subject) cell rolls up into, itself included."""
+    base = {'course': course, 'semester': semester, 'subject_name': subject_name}
+    cells = []
+    for gs in GROUPING_SETS:
+        dims = dict(ALL_VALUES)
+        dims.update((d, base[d]) for d in gs)
+        cells.append((dims['course'], dims['semester'], dims['subject_name']))
+    return cells
+
+
+class RollupService:
+    """
+    Maintains the AnalyticsRollup cube.
+
+    Every student's records are first folded into RollupContribution rows,
+    one per base cell with additive sums and the student's risk band.
+    ``rebuild`` aggregates those rows into every grouping set.
+    ``refresh_for_students`` (uploads, rescoring) recomputes only the given
+    students' contributions and applies the old-to-new difference to the
+    cells they touch, so the cost is independent of the table size.
+    Archived cohorts are no longer in the hot tables; their frozen
+    ArchivedRollup summaries are added to the cube.
+    """
+
+    @staticmethod
+    def _contributions(student_ids=None):
+        """Fresh RollupContribution objects (unsaved) for these students, or for everyone."""
+        records = AcademicRecord.objects.all()
+        predictions = Prediction.objects.all()
+        if student_ids is not None:
+            records = records.filter(student_id__in=student_ids)
+            predictions = predictions.filter(student_id__in=student_ids)
+
+        # Latest prediction per student: later rows overwrite earlier ones
+        latest = dict(predictions.order_by('student_id', 'generated_at', 'id').values_list('student_id', 'risk_score'))
+        bands = dict(zip(latest, risk_rules.current.risk_bands([
+            score if score is not None else float('nan') for score in latest.values()
+        ]).tolist()))
+
+        rows = records.annotate(cube_course=Coalesce('student__course', Value(''))).values(
+            'student_id', 'cube_course', 'semester', 'subject_name',
+        ).annotate(
+            record_count=Count('id'),
+            marks_sum=Sum('marks_obtained'),
+            percentage_sum=Sum(F('marks_obtained') * 100.0 / F('total_marks'), output_field=FloatField()),
+            attendance_sum=Sum('attendance_percentage'),
+            attendance_count=Count('attendance_percentage'),
+            grade_point_sum=Sum('grade_point'),
+            pass_count=Count('id', filter=Q(grade_point__gt=0)),
+            fail_count=Count('id', filter=Q(grade_point=0)),
+        ).order_by()
+        for row in rows.iterator(chunk_size=5000):
+            yield RollupContribution(
+                student_id=row['student_id'], course=row['cube_course'],
+                semester=row['semester'], subject_name=row['subject_name'],
+                risk_band=bands.get(row['student_id']),
+                **{f: row[f] or 0 for f in ADDITIVE_FIELDS},
+            )
+
+    @staticmethod
+    def _compute_cells(grouping_set, students=None) -> dict:
+        """
+        Aggregate the stored contributions over one grouping set;
+        ``students`` (a Student queryset) restricts it to their records.
+        """
+        qs = RollupContribution.objects.all()
+        if students is not None:
+            qs = qs.filter(student__in=students.values('id'))
+        # Aliased: an annotation may not reuse a model field's name
+        aggs = {f"{f}_total": Sum(f) for f in ADDITIVE_FIELDS}
+        aggs['student_count_total'] = Count('student', distinct=True)
+        for column, band in RISK_BANDS.items():
+            aggs[f"{column}_total"] = Count('student', distinct=True, filter=Q(risk_band=band))
+
+        lookups = list(grouping_set)
+        if lookups:
+            rows = qs.values(*lookups).annotate(**aggs).order_by()
+        else:
+            rows = [qs.aggregate(**aggs)]
+
+        cells = {}
+        for row in rows:
+            if not row['record_count_total']:
+                continue
+            dims = dict(ALL_VALUES)
+            dims.update((d, row[d]) for d in lookups)
+            cells[(dims['course'], dims['semester'], dims['subject_name'])] = {
+                f: row[f"{f}_total"] or 0 for f in METRIC_FIELDS
+            }
+        return cells
+
+    @staticmethod
+    def _delta(old, new) -> dict:
+        """Per-cell metric changes from replacing contributions ``old`` with ``new``."""
+        delta = defaultdict(lambda: dict.fromkeys(METRIC_FIELDS, 0))
+        for sign, contributions in ((-1, old), (1, new)):
+            students = defaultdict(set)
+            bands = {}
+            for c in contributions:
+                for key in cube_cells(c.course, c.semester, c.subject_name):
+                    cell = delta[key]
+                    for f in ADDITIVE_FIELDS:
+                        cell[f] += sign * getattr(c, f)
+                    students[c.student_id].add(key)
+                bands[c.student_id] = c.risk_band
+            # A student counts once per cell however many base cells they have under it
+            for student_id, keys in students.items():
+                column = BAND_COLUMNS.get(bands[student_id])
+                for key in keys:
+                    delta[key]['student_count'] += sign
+                    if column:
+                        delta[key][column] += sign
+        return {key: d for key, d in delta.items() if any(d.values())}
+
+    @staticmethod
+    def _cells_matching(qs, keys: set):
+        """Rows of ``qs`` (cube-shaped) whose (course, semester, subject_name) is in ``keys``."""
+        for i, dim in enumerate(ALL_VALUES):
+            qs = qs.filter(**{f"{dim}__in": {k[i] for k in keys}})
+        return [row for row in qs if (row.course, row.semester, row.subject_name) in keys]
+
+    @classmethod
+    def _apply(cls, delta: dict, sign: int = 1) -> int:
+        """Add ``sign`` x ``delta`` to the stored cells; cells left without records are dropped."""
+        if not delta:
+            return 0
+        keys = set(delta)
+        cells = {
+            (row.course, row.semester, row.subject_name): {f: getattr(row, f) for f in METRIC_FIELDS}
+            for row in cls._cells_matching(AnalyticsRollup.objects.select_for_update(), keys)
+        }
+        for key, change in delta.items():
+            cell = cells.setdefault(key, dict.fromkeys(METRIC_FIELDS, 0))
+            for f in METRIC_FIELDS:
+                cell[f] += sign * change[f]
+        stale = {key for key, cell in cells.items() if cell['record_count'] <= 0}
+        cls._write({key: cell for key, cell in cells.items() if key not in stale}, stale)
+        return len(keys)
+
+    @staticmethod
+    def _add_archived(cells: dict):
+        """Add every archived summary into ``cells``."""
+        rows = ArchivedRollup.objects.values('course', 'semester', 'subject_name').annotate(
+            **{f: Sum(f) for f in METRIC_FIELDS}).order_by()
+        for row in rows:
+            key = (row['course'], row['semester'], row['subject_name'])
+            cell = cells.setdefault(key, {f: 0 for f in METRIC_FIELDS})
+            for f in METRIC_FIELDS:
+                cell[f] += row[f] or 0
+
+    @staticmethod
+    def _write(cells: dict, stale: set):
+        if stale:
+            q = Q()
+            for course, sem, subject in stale:
+                q |= Q(course=course, semester=sem, subject_name=subject)
+            AnalyticsRollup.objects.filter(q).delete()
+        if cells:
+            AnalyticsRollup.objects.bulk_create(
+                [
+                    AnalyticsRollup(course=c, semester=s, subject_name=j, **metrics)
+                    for (c, s, j), metrics in cells.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['course', 'semester', 'subject_name'],
+                update_fields=METRIC_FIELDS + ['updated_at'],
+                batch_size=CHUNK_SIZE,
+            )
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """Recompute every contribution, then every grouping set."""
+        with transaction.atomic():
+            RollupContribution.objects.all().delete()
+            batch = []
+            for contribution in cls._contributions():
+                batch.append(contribution)
+                if len(batch) >= 5000:
+                    RollupContribution.objects.bulk_create(batch, batch_size=5000)
+                    batch = []
+            RollupContribution.objects.bulk_create(batch, batch_size=5000)
+
+            cells = {}
+            for gs in GROUPING_SETS:
+                cells.update(cls._compute_cells(gs))
+            cls._add_archived(cells)
+            AnalyticsRollup.objects.all().delete()
+            cls._write(cells, set())
+        return len(cells)
+
+    @classmethod
+    def summarize(cls, students) -> dict:
+        """Every cube cell of just these students' records (a Student queryset), e.g. to archive them."""
+        cells = {}
+        for gs in GROUPING_SETS:
+            cells.update(cls._compute_cells(gs, students=students))
+        return cells
+
+    @classmethod
+    def refresh_for_students(cls, student_ids) -> int:
+        """
+        Re-fold these students' records and apply the difference to the cube.
+        Returns the number of cells changed.
+        """
+        student_ids = sorted(set(student_ids))
+        changed = 0
+        for i in range(0, len(student_ids), STUDENT_CHUNK):
+            chunk = student_ids[i:i + STUDENT_CHUNK]
+            with transaction.atomic():
+                old = list(RollupContribution.objects.select_for_update().filter(student_id__in=chunk))
+                new = list(cls._contributions(chunk))
+                RollupContribution.objects.filter(student_id__in=chunk).delete()
+                RollupContribution.objects.bulk_create(new, batch_size=5000)
+                changed += cls._apply(cls._delta(old, new))
+        return changed
+
+    @classmethod
+    def remove_archived(cls, cohort) -> int:
+        """Take an archived cohort's frozen summaries back out of the cube (before restoring it)."""
+        delta = {
+            (r['course'], r['semester'], r['subject_name']): r
+            for r in cohort.rollups.values('course', 'semester', 'subject_name', *METRIC_FIELDS)
+        }
+        return cls._apply(delta, sign=-1)
+
+    @staticmethod
+    def query(course=None, semester=None, subject=None, group_by=()) -> list:
+        """
+        Slice the cube. Fixed dimensions select a value, dimensions in
+        ``group_by`` fan out over every value, the rest are rolled up.
+        Each slice is a single indexed lookup on the cube.
+        """
+        fixed = {'course': course, 'semester': semester, 'subject_name': subject}
+        qs = AnalyticsRollup.objects.all()
+        for dim, all_value in ALL_VALUES.items():
+            if dim in group_by:
+                qs = qs.exclude(**{dim: all_value})
+                if fixed[dim] is not None:
+                    qs = qs.filter(**{dim: fixed[dim]})
+            else:
+                qs = qs.filter(**{dim: fixed[dim] if fixed[dim] is not None else all_value})
+
+        results = []
+        for cell in qs.order_by('course', 'semester', 'subject_name'):
+            n = cell.record_count or 1
+            results.append({
+                "course": cell.course,
+                "semester": cell.semester,
+                "subject": cell.subject_name,
+                "records": cell.record_count,
+                "students": cell.student_count,
+                "avg_marks": round(cell.marks_sum / n, 2),
+                "avg_percentage": round(cell.percentage_sum / n, 2),
+                "avg_attendance": round(cell.attendance_sum / cell.attendance_count, 2) if cell.attendance_count else None,
+                "avg_grade_point": round(cell.grade_point_sum / n, 2),
+                "pass_count": cell.pass_count,
+                "fail_count": cell.fail_count,
+                "pass_rate": round(cell.pass_count / n, 4),
+                "risk_distribution": {
+                    "Low": cell.risk_low,
+                    "Medium": cell.risk_medium,
+                    "High": cell.risk_high,
+                    "Critical": cell.risk_critical,
+                },
+            })
+        return results
@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Max, Sum
+from django.utils import timezone
+
+from ..models import AcademicRecord, Prediction, RiskRuleSet
+from .ml_service import ml_engine
+from .prediction_history import PredictionHistoryService
+from .risk_rules import RiskRules, risk_rules
+
+# Normalized percentage of a record, as used by the ML heuristics
+PERCENTAGE = ExpressionWrapper(F('marks_obtained') * 100.0 / F('total_marks'), output_field=FloatField())
+
+AGGREGATE_COLUMNS = ['student_id', 'avg_att', 'avg_pct', 'sum_pct', 'n', 'last_id']
+
+CHUNK_SIZE = 500
+
+
+class ScoringService:
+    """
+    Batch risk scoring: per-student aggregates come from one grouped query,
+    are scored with the compiled rules in a single vectorized pass and
+    written back to Prediction in bulk.
+    """
+
+    @staticmethod
+    def _aggregate_queryset(records=None, having=None):
+        records = records if records is not None else AcademicRecord.objects.all()
+        qs = records.values('student_id').annotate(
+            avg_att=Avg('attendance_percentage'),
+            avg_pct=Avg(PERCENTAGE),
+            sum_pct=Sum(PERCENTAGE),
+            n=Count('id'),
+            last_id=Max('id'),
+        ).order_by()
+        if having is not None:
+            qs = qs.filter(having)
+        return qs
+
+    @classmethod
+    def student_aggregates(cls, records=None, having=None) -> pd.DataFrame:
+        df = pd.DataFrame.from_records(list(cls._aggregate_queryset(records, having)), columns=AGGREGATE_COLUMNS)
+        return cls._attach_last_pct(df)
+
+    @classmethod
+    def iter_student_aggregates(cls, records=None, batch_size=CHUNK_SIZE):
+        """Stream the aggregates with a server-side cursor, one DataFrame per batch."""
+        batch = []
+        for row in cls._aggregate_queryset(records).iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield cls._attach_last_pct(pd.DataFrame.from_records(batch, columns=AGGREGATE_COLUMNS))
+                batch = []
+        if batch:
+            yield cls._attach_last_pct(pd.DataFrame.from_records(batch, columns=AGGREGATE_COLUMNS))
+
+    @staticmethod
+    def _attach_last_pct(df: pd.DataFrame) -> pd.DataFrame:
+        # The trend rule compares the latest record (highest id) with the rest
+        last_ids = df['last_id'].tolist()
+        last_pct = {}
+        for i in range(0, len(last_ids), CHUNK_SIZE):
+            last_pct.update(
+                AcademicRecord.objects.filter(id__in=last_ids[i:i + CHUNK_SIZE])
+                .annotate(pct=PERCENTAGE).values_list('id', 'pct')
+            )
+        df['last_pct'] = df['last_id'].map(last_pct)
+        return df
+
+    @staticmethod
+    def score(df: pd.DataFrame, rules: RiskRules = None) -> pd.DataFrame:
+        rules = rules or risk_rules.current
+        att = df['avg_att'].fillna(0).to_numpy(dtype=float)
+        pct = df['avg_pct'].fillna(0).to_numpy(dtype=float)
+        n = df['n'].to_numpy()
+        last = df['last_pct'].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prev_avg = np.where(n > 1, (df['sum_pct'].to_numpy(dtype=float) - last) / (n - 1), np.nan)
+
+        ar = rules.attendance_risk(att)
+        pr = rules.performance_risk(pct)
+        tr = rules.trend_risk(last, prev_avg, n)
+        score = rules.overall_risk(ar, pr, tr)
+
+        scored = df.copy()
+        scored['avg_att'] = att
+        scored['avg_pct'] = pct
+        scored['attendance_risk'] = ar
+        scored['performance_risk'] = pr
+        scored['trend_risk'] = tr
+        scored['risk_score'] = np.round(score / 100.0, 2)
+        scored['risk_level'] = rules.risk_levels(score)
+        scored['predicted'] = ml_engine.predict_performance(att, pct)
+        return scored
+
+    @staticmethod
+    def format_predicted_grade(value: float) -> str:
+        # predicted_grade is max_length=5, so the 100% ceiling drops the decimal
+        return f"{value:.1f}%" if value < 100 else "100%"
+
+    @staticmethod
+    def _changed(pred: Prediction, fields: dict) -> bool:
+        return (pred.risk_score != fields['risk_score'] or pred.predicted_grade != fields['predicted_grade']
+                or pred.average_marks is None or abs(pred.average_marks - fields['average_marks']) > 1e-9)
+
+    @classmethod
+    def upsert_predictions(cls, scored: pd.DataFrame) -> int:
+        """
+        Store the latest prediction per student. A history row is written
+        only when the prediction actually changed, so rerunning a scoring
+        pass (or resuming a killed one) doesn't duplicate the trajectory.
+        """
+        rows = scored[['student_id', 'risk_score', 'predicted', 'avg_pct']].itertuples(index=False)
+        rows = list(rows)
+        now = timezone.now()
+        for i in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[i:i + CHUNK_SIZE]
+            with transaction.atomic():
+                existing = {
+                    p.student_id: p
+                    for p in Prediction.objects.filter(student_id__in=[r.student_id for r in chunk])
+                }
+                to_update, to_create, history = [], [], []
+                for r in chunk:
+                    fields = {
+                        'risk_score': float(r.risk_score),
+                        'predicted_grade': cls.format_predicted_grade(r.predicted),
+                        'average_marks': float(r.avg_pct),
+                    }
+                    pred = existing.get(r.student_id)
+                    if pred is None or cls._changed(pred, fields):
+                        history.append({'student_id': r.student_id, **fields})
+                    if pred is None:
+                        to_create.append(Prediction(student_id=r.student_id, **fields))
+                    else:
+                        for k, v in fields.items():
+                            setattr(pred, k, v)
+                        pred.generated_at = now
+                        to_update.append(pred)
+                Prediction.objects.bulk_update(to_update, ['risk_score', 'predicted_grade', 'average_marks', 'generated_at'])
+                Prediction.objects.bulk_create(to_create)
+                PredictionHistoryService.append(history, generated_at=now)
+        return len(rows)
+
+    @classmethod
+    def rescore(cls, records) -> pd.DataFrame:
+        """Score and store every student with rows in ``records``; returns the scored frame."""
+        df = cls.student_aggregates(records)
+        if df.empty:
+            return df
+        scored = cls.score(df)
+        cls.upsert_predictions(scored)
+        return scored
+
+    @classmethod
+    def rescore_students(cls, student_ids) -> int:
+        """Rescore the given students (chunked to stay under SQL parameter limits)."""
+        student_ids = list(student_ids)
+        total = 0
+        for i in range(0, len(student_ids), CHUNK_SIZE):
+            records = AcademicRecord.objects.filter(student_id__in=student_ids[i:i + CHUNK_SIZE])
+            total += len(cls.rescore(records))
+        return total
+
+    @classmethod
+    def rescore_where(cls, having=None) -> list:
+        """Rescore every student whose aggregates match ``having``; returns their ids."""
+        df = cls.student_aggregates(having=having)
+        if df.empty:
+            return []
+        cls.upsert_predictions(cls.score(df))
+        return df['student_id'].tolist()
+
+    @classmethod
+    def apply_rule_change(cls, rules: RiskRules) -> int:
+        """
+        Bring stored predictions in line with ``rules`` if they differ from
+        the last applied rule set. Only students whose score can move are
+        rescored; rollups and stored subject alerts are refreshed to match.
+        """
+        from ..db_router import use_primary
+
+        # Lock the applied rule sets so concurrent callers (one per host) apply a change once
+        with use_primary(), transaction.atomic():
+            list(RiskRuleSet.objects.select_for_update())
+            return cls._apply_rule_change(rules)
+
+    @classmethod
+    def _apply_rule_change(cls, rules: RiskRules) -> int:
+        from .dashboard_events import publish_dashboard_change
+        from .rollup_service import RollupService
+        from .subject_alerts import SubjectAlertService
+
+        applied = RiskRuleSet.objects.order_by('-applied_at').first()
+        if applied is not None and applied.config == rules.config:
+            return 0
+
+        rescored = []
+        if applied is not None:
+            old = RiskRules(applied.config)
+            needed, having = rules.affected_students(old)
+            if needed:
+                rescored = cls.rescore_where(having)
+            if rules.bands_changed(old):
+                RollupService.rebuild()
+            elif rescored:
+                RollupService.refresh_for_students(rescored)
+            if rules.subject_alerts_changed(old):
+                SubjectAlertService.refresh(rules)
+            publish_dashboard_change("rules")
+
+        RiskRuleSet.objects.update_or_create(version=rules.version, defaults={'config': rules.config})
+        return len(rescored)
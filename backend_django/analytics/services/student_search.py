@@ -0,0 +1,242 @@
+"""
+Student search / autocomplete over roll number, name, email and course.
+
+Matches are found in tiers, best first. Each tier is one bounded lookup, and
+the search stops as soon as ``limit`` students are found:
+
+1. exact roll number
+2. roll number prefix
+3. name prefix (any word), email prefix
+4. fuzzy: trigram similarity on name and roll number (queries of 3+ characters)
+5. course
+
+On PostgreSQL each tier is an indexed query (see migration
+0009_student_search_indexes: pg_trgm GIN indexes on the upper-cased columns
+serve both LIKE prefixes and ``%`` similarity). Other databases use
+``StudentIndex``, an in-process index of sorted prefix keys plus trigram
+posting lists. When the dashboard event version moves (every upload and
+reset) the index is rebuilt in a background thread; until it is current
+again, searches run the tiers as plain queries, without the fuzzy tier.
+"""
+import bisect
+import logging
+import threading
+from itertools import islice
+
+import numpy as np
+from django.db import connection, connections
+from django.db.models import Q
+
+from ..models import Student
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default for %
+FIELDS = ('id', 'roll_number', 'name', 'email', 'course', 'semester')
+
+logger = logging.getLogger(__name__)
+
+
+def trigrams(text: str) -> set:
+    """pg_trgm-style trigrams: lower-cased words padded with two leading and one trailing space."""
+    grams = set()
+    for word in ''.join(c if c.isalnum() else ' ' for c in text.lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _word_suffixes(text: str) -> list:
+    """'Asha Rao Kumar' -> ['asha rao kumar', 'rao kumar', 'kumar'] so any word can be a prefix."""
+    words = text.lower().split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+class StudentIndex:
+    """In-process search index for databases without trigram indexes."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.by_roll = {row[1].lower(): i for i, row in enumerate(rows)}
+        self.roll_keys = self._sorted_keys((row[1].lower(), i) for i, row in enumerate(rows))
+        self.text_keys = self._sorted_keys(
+            (key, i)
+            for i, row in enumerate(rows)
+            for key in _word_suffixes(row[2] or '') + ([row[3].lower()] if row[3] else [])
+        )
+        self.by_course = {}
+        for i, row in enumerate(rows):
+            self.by_course.setdefault((row[4] or '').lower(), []).append(i)
+        self.course_sets = {course: set(ids) for course, ids in self.by_course.items()}
+
+        # Trigram posting lists per fuzzy-matched field (name, roll number)
+        self.trigram_fields = [self._trigram_field(row[2] or '' for row in rows),
+                               self._trigram_field(row[1] for row in rows)]
+
+    @staticmethod
+    def _trigram_field(values) -> tuple:
+        counts, postings = [], {}
+        for i, value in enumerate(values):
+            grams = trigrams(value)
+            counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        return {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}, np.array(counts, dtype=np.int32)
+
+    @staticmethod
+    def _sorted_keys(pairs):
+        pairs = sorted(pairs)
+        return [k for k, _ in pairs], [i for _, i in pairs]
+
+    @staticmethod
+    def _prefix(keys, q, limit, seen):
+        words, ids = keys
+        found = []
+        start = bisect.bisect_left(words, q)
+        for pos in range(start, len(words)):
+            if not words[pos].startswith(q) or len(found) >= limit:
+                break
+            if ids[pos] not in seen:
+                seen.add(ids[pos])
+                found.append(ids[pos])
+        return found
+
+    def _fuzzy(self, q, limit, seen):
+        grams = trigrams(q)
+        score = np.zeros(len(self.rows))
+        for postings, counts in self.trigram_fields:
+            lists = [postings[g] for g in grams if g in postings]
+            if lists:
+                shared = np.bincount(np.concatenate(lists), minlength=len(self.rows))
+                # Jaccard similarity over trigram sets, as pg_trgm's similarity()
+                np.maximum(score, shared / (len(grams) + counts - shared), out=score)
+        candidates = np.flatnonzero(score >= SIMILARITY_THRESHOLD)
+        found = []
+        for i in candidates[np.argsort(-score[candidates], kind='stable')]:
+            if len(found) >= limit:
+                break
+            if int(i) not in seen:
+                seen.add(int(i))
+                found.append(int(i))
+        return found
+
+    def search(self, q: str, limit: int, course: str = None) -> list:
+        q = q.strip().lower()
+        seen, tiers = set(), []
+        allowed = None
+        if course:
+            allowed = self.course_sets.get(course.lower(), set())
+
+        def add(match, ids):
+            ids = [i for i in ids if allowed is None or i in allowed]
+            tiers.extend((match, i) for i in ids[:limit - len(tiers)])
+
+        exact = self.by_roll.get(q)
+        if exact is not None:
+            seen.add(exact)
+            add('roll', [exact])
+        # Over-fetch while a course filter may drop candidates
+        fetch = limit if allowed is None else limit * 20
+        if len(tiers) < limit:
+            add('roll', self._prefix(self.roll_keys, q, fetch, seen))
+        if len(tiers) < limit:
+            add('name', self._prefix(self.text_keys, q, fetch, seen))
+        if len(tiers) < limit and len(q) >= 3:
+            add('fuzzy', self._fuzzy(q, fetch, seen))
+        if len(tiers) < limit and allowed is None:
+            add('course', list(islice((i for i in self.by_course.get(q, []) if i not in seen), limit)))
+        return [dict(zip(FIELDS, self.rows[i]), match=match) for match, i in tiers]
+
+
+class StudentSearchService:
+    _lock = threading.Lock()
+    _index = None
+    _index_version = None
+    _builder = None
+
+    @classmethod
+    def search(cls, q: str, limit: int = DEFAULT_LIMIT, course: str = None) -> list:
+        limit = max(1, min(limit, MAX_LIMIT))
+        if connection.vendor == 'postgresql':
+            return cls._search_queries(q.strip(), limit, course)
+        index = cls._local_index()
+        if index is None:
+            return cls._search_queries(q.strip(), limit, course, fuzzy=False)
+        return index.search(q, limit, course)
+
+    @classmethod
+    def _local_index(cls):
+        """The in-process index if it is current, else None after making sure a rebuild is running."""
+        from .dashboard_events import current_version
+
+        version = current_version()
+        with cls._lock:
+            if cls._index is not None and cls._index_version == version:
+                return cls._index
+            if cls._builder is None:
+                cls._builder = cls._schedule_build()
+        return None
+
+    @classmethod
+    def _schedule_build(cls) -> threading.Thread:
+        builder = threading.Thread(target=cls._build_in_background, name="student-index", daemon=True)
+        builder.start()
+        return builder
+
+    @classmethod
+    def _build_in_background(cls):
+        try:
+            cls.build_index()
+        except Exception:
+            # Searches keep using the database; the next one retries
+            logger.exception("Student search index build failed")
+        finally:
+            with cls._lock:
+                cls._builder = None
+            connections.close_all()
+
+    @classmethod
+    def build_index(cls) -> StudentIndex:
+        from .dashboard_events import current_version
+
+        # Read the version first: a change during the build leaves the index stale, never wrongly current
+        version = current_version()
+        index = StudentIndex(list(Student.objects.order_by('roll_number').values_list(*FIELDS)))
+        with cls._lock:
+            cls._index, cls._index_version = index, version
+        return index
+
+    @staticmethod
+    def _search_queries(q: str, limit: int, course: str = None, fuzzy: bool = True) -> list:
+        """The tiers as database queries; the fuzzy tier needs PostgreSQL's pg_trgm."""
+        students = Student.objects.all()
+        if course:
+            students = students.filter(course__iexact=course)
+
+        tiers = [
+            ('roll', students.filter(roll_number__iexact=q)),
+            # Prefix tiers stay unordered so LIMIT can stop the index scan early
+            ('roll', students.filter(roll_number__istartswith=q)),
+            ('name', students.filter(
+                Q(name__istartswith=q) | Q(name__icontains=f' {q}') | Q(email__istartswith=q)
+            )),
+        ]
+        if fuzzy and len(q) >= 3:
+            from django.contrib.postgres.search import TrigramSimilarity
+            from django.db.models.functions import Greatest
+
+            tiers.append(('fuzzy', students.filter(Q(name__trigram_similar=q) | Q(roll_number__trigram_similar=q))
+                          .annotate(similarity=Greatest(TrigramSimilarity('name', q),
+                                                        TrigramSimilarity('roll_number', q)))
+                          .order_by('-similarity')))
+        if not course:
+            tiers.append(('course', students.filter(course__iexact=q)))
+
+        results, seen = [], set()
+        for match, qs in tiers:
+            if len(results) >= limit:
+                break
+            for row in qs.exclude(id__in=seen).values_list(*FIELDS)[:limit - len(results)]:
+                seen.add(row[0])
+                results.append(dict(zip(FIELDS, row), match=match))
+        return results
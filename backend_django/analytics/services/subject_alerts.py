@@ -0,0 +1,61 @@
+"""
+Stored per-record subject alerts.
+
+Every AcademicRecord carries its normalized ``percentage`` and its
+Normal/Warning/Critical ``subject_alert`` so record listings and
+"all Critical subjects in semester N" queries read an indexed column
+instead of re-running the rules per row. Ingest fills both with one
+vectorized pass over the batch (``annotate``); existing rows and rule
+changes go through set-based UPDATEs (``refresh``).
+"""
+import numpy as np
+from django.db.models import Case, F, FloatField, Max, Min, When
+
+from ..models import AcademicRecord
+from .risk_rules import RiskRules, risk_rules
+
+# Same normalization as scoring_service.PERCENTAGE, NULL instead of a division by zero
+STORED_PERCENTAGE = Case(
+    When(total_marks__gt=0, then=F('marks_obtained') * 100.0 / F('total_marks')),
+    default=None, output_field=FloatField(),
+)
+
+REFRESH_BATCH_SIZE = 50_000
+
+
+class SubjectAlertService:
+    @staticmethod
+    def annotate(records, rules: RiskRules = None) -> None:
+        """Set ``percentage`` and ``subject_alert`` on unsaved AcademicRecord objects."""
+        rules = rules or risk_rules.current
+        if not records:
+            return
+        marks = np.array([r.marks_obtained for r in records], dtype=float)
+        total = np.array([r.total_marks for r in records], dtype=float)
+        att = np.array([np.nan if r.attendance_percentage is None else r.attendance_percentage
+                        for r in records], dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pct = np.where(total > 0, marks * 100.0 / total, np.nan)
+        alerts = rules.subject_alerts(marks, att)
+        for record, p, alert in zip(records, pct.tolist(), alerts.tolist()):
+            record.percentage = None if np.isnan(p) else p
+            record.subject_alert = alert
+
+    @staticmethod
+    def refresh(rules: RiskRules = None, records=None, batch_size: int = REFRESH_BATCH_SIZE) -> int:
+        """
+        Recompute the stored columns in SQL for ``records`` (default: all),
+        in id ranges so no single UPDATE locks the whole table. Returns rows updated.
+        """
+        rules = rules or risk_rules.current
+        records = records if records is not None else AcademicRecord.objects.all()
+        bounds = records.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            return 0
+        updated = 0
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            updated += records.filter(id__gte=start, id__lt=start + batch_size).update(
+                percentage=STORED_PERCENTAGE,
+                subject_alert=rules.subject_alert_case(),
+            )
+        return updated
@@ -0,0 +1,121 @@
+import hashlib
+import io
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ..models import UploadBatch
+
+# A batch still "processing" after this long is assumed to have crashed
+STALE_AFTER = timedelta(hours=1)
+
+
+class DuplicateUploadInProgress(Exception):
+    pass
+
+
+class UploadBatchService:
+    """Content-hash and Idempotency-Key bookkeeping for master uploads."""
+
+    @staticmethod
+    def read_with_hash(uploaded_file):
+        """Read the upload chunk by chunk, hashing as it streams in."""
+        digest = hashlib.sha256()
+        buffer = io.BytesIO()
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            buffer.write(chunk)
+        buffer.seek(0)
+        return buffer, digest.hexdigest()
+
+    @staticmethod
+    def _is_live(batch: UploadBatch) -> bool:
+        return batch.status == UploadBatch.PROCESSING and timezone.now() - batch.created_at < STALE_AFTER
+
+    @classmethod
+    def replay(cls, batch: UploadBatch):
+        """The stored result of a finished batch, or None if it has to run (again)."""
+        if batch.status == UploadBatch.COMPLETE:
+            return batch.result
+        if cls._is_live(batch):
+            raise DuplicateUploadInProgress()
+        return None
+
+    @staticmethod
+    def key_scope(request) -> dict:
+        """Idempotency-Keys are the client's own: match them per endpoint and user only."""
+        user = request.user
+        return {
+            'endpoint': request.resolver_match.view_name,
+            'requester': str(user.pk) if user.is_authenticated else "",
+        }
+
+    @staticmethod
+    def find_by_key(key, endpoint: str, requester: str = ""):
+        if not key:
+            return None
+        return UploadBatch.objects.filter(idempotency_key=key, endpoint=endpoint, requester=requester).first()
+
+    @staticmethod
+    def latest_duplicate(content_hash: str, scope: str):
+        """
+        The most recent upload if it carried the same file and nothing has
+        changed the data since (archive, restore, reprocessing, rule changes
+        all move the dashboard version). Older identical uploads never count.
+        """
+        from .dashboard_events import current_version
+
+        latest = UploadBatch.objects.exclude(status=UploadBatch.FAILED).order_by('-created_at').first()
+        if latest is None or latest.content_hash != content_hash or latest.scope != scope:
+            return None
+        if latest.status == UploadBatch.COMPLETE and latest.data_version != current_version():
+            return None
+        return latest
+
+    @classmethod
+    def start(cls, key, content_hash, uploaded_file, scope, existing=None, endpoint="upload_master",
+              requester="") -> UploadBatch:
+        """
+        Claim the run. The unique constraint on live (content_hash, scope)
+        turns a concurrent identical upload into DuplicateUploadInProgress.
+        """
+        # Runs that crashed mid-ingest must not block the file forever
+        UploadBatch.objects.filter(
+            content_hash=content_hash, scope=scope, status=UploadBatch.PROCESSING,
+            created_at__lt=timezone.now() - STALE_AFTER,
+        ).update(status=UploadBatch.FAILED, completed_at=timezone.now())
+        try:
+            with transaction.atomic():
+                if existing is not None:
+                    # Retry of a failed/stale run under the same key
+                    existing.status = UploadBatch.PROCESSING
+                    existing.created_at = timezone.now()
+                    existing.save(update_fields=['status', 'created_at'])
+                    return existing
+                return UploadBatch.objects.create(
+                    idempotency_key=key or None,
+                    endpoint=endpoint,
+                    requester=requester,
+                    content_hash=content_hash,
+                    file_name=uploaded_file.name,
+                    file_size=uploaded_file.size,
+                    scope=scope,
+                )
+        except IntegrityError:
+            # Same key or same file raced in from a concurrent request
+            raise DuplicateUploadInProgress()
+
+    @staticmethod
+    def finish(batch: UploadBatch, result: dict, data_version: int = None):
+        batch.status = UploadBatch.COMPLETE
+        batch.result = result
+        batch.data_version = data_version
+        batch.completed_at = timezone.now()
+        batch.save(update_fields=['status', 'result', 'data_version', 'completed_at'])
+
+    @staticmethod
+    def fail(batch: UploadBatch):
+        batch.status = UploadBatch.FAILED
+        batch.completed_at = timezone.now()
+        batch.save(update_fields=['status', 'completed_at'])
@@ -1,3 +1,1011 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models import Count, F
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+
+from .models import (
+    AcademicRecord, AnalyticsRollup, ArchivedCohort, ArchivedStudent, DashboardState, Prediction, PredictionHistory,
+    RescoreShard, SemesterPerformance, Student, UploadBatch,
+)
+from .db_router import REPLICA_ALIAS
+from .profiling import make_profile_token
+from .query_budget import QueryBudgetExceeded, query_budget, record_queries, sql_shape
+from .services.anomaly_service import MAD_SCALE, AnomalyService
+from .services.archive_service import ArchiveError, ArchiveService
+from .services.arrow_io import stream_parquet
+from .services.columnar_snapshot import columnar_snapshot
+from .services.dashboard_service import DashboardService
+from .services.prediction_history import PredictionHistoryService
+from .services.dashboard_events import current_version, event_stream, publish_dashboard_change
+from .services.quantile_sketch import BINS as SKETCH_BINS, METRICS as SKETCH_METRICS, QuantileSketchService
+from .services.rollup_service import METRIC_FIELDS as ROLLUP_METRICS, RollupService
+from .services.risk_rules import DEFAULT_RULES_FILE, RiskRuleEngine, RiskRules, risk_rules
+from .services.scoring_service import ScoringService
+from .services.student_search import StudentSearchService
+from .services.subject_alerts import SubjectAlertService
+from .services.upload_batches import DuplicateUploadInProgress, UploadBatchService
+
+COURSES = ["CS", "EE", "ME"]
+SUBJECTS = ["Data Mining", "Cloud Computing", "Compilers", "Networks", "Databases", "Ethics"]
+
+
+def seed_students(count, start=0, semesters=3, seed=0):
+    """Bulk-create ``count`` students with records, semester performance and predictions."""
+    rng = np.random.default_rng(seed)
+    Student.objects.bulk_create([
+        Student(roll_number=f"R{i:06d}", name=f"Student {i}", email=f"s{i}@example.edu",
+                course=COURSES[i % len(COURSES)], semester=semesters)
+        for i in range(start, start + count)
+    ], batch_size=2000)
+    ids = list(Student.objects.filter(
+        roll_number__gte=f"R{start:06d}", roll_number__lt=f"R{start + count:06d}",
+    ).values_list('id', flat=True))
+
+    records = [
+        AcademicRecord(student_id=sid, subject_name=subject, semester=1 + j % semesters,
+                       marks_obtained=float(rng.integers(10, 100)), total_marks=100,
+                       attendance_percentage=float(rng.integers(30, 100)), grade='B', grade_point=6)
+        for sid in ids for j, subject in enumerate(SUBJECTS)
+    ]
+    SubjectAlertService.annotate(records)
+    AcademicRecord.objects.bulk_create(records, batch_size=5000)
+    SemesterPerformance.objects.bulk_create([
+        SemesterPerformance(student_id=sid, semester=sem, sgpa=round(float(rng.uniform(3, 10)), 2),
+                            cgpa=round(float(rng.uniform(3, 10)), 2),
+                            attendance_percentage=float(rng.integers(30, 100)))
+        for sid in ids for sem in range(1, semesters + 1)
+    ], batch_size=5000)
+
+    ScoringService.rescore_students(ids)
+    RollupService.rebuild()
+    QuantileSketchService.rebuild()
+    AnomalyService.run()
+    publish_dashboard_change("seed")
+    return ids
+
+
+def master_csv(count, start=0, seed=0) -> bytes:
+    rng = np.random.default_rng(seed)
+    rows = [
+        {
+            "roll_number": f"U{i:06d}", "name": f"Upload {i}", "email": f"u{i}@example.edu",
+            "course": COURSES[i % len(COURSES)], "semester": sem, "subject_name": subject,
+            "marks_obtained": float(rng.integers(0, 100)), "total_marks": 100,
+            "attendance_percentage": float(rng.integers(20, 100)), "subject_credits": 4,
+        }
+        for i in range(start, start + count) for sem in (1, 2) for subject in SUBJECTS[:4]
+    ]
+    buffer = io.StringIO()
+    pd.DataFrame(rows).to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+@override_settings(QUERY_BUDGET_MODE="raise", ANALYTICS_SNAPSHOT_DIR=None)
+class QueryBudgetTests(TestCase):
+    """
+    Every endpoint runs under its @query_budget in "raise" mode, so a request
+    that goes over budget or repeats a per-row query fails the test.
+    """
+
+    READ_ENDPOINTS = [
+        "/api/v1/dashboard/stats",
+        "/api/v1/dashboard/alerts",
+        "/api/v1/dashboard/alerts?min_risk=0",
+        "/api/v1/dashboard/trend",
+        "/api/v1/analytics/gpa",
+        "/api/v1/analytics/rollup",
+        "/api/v1/analytics/rollup?group_by=course,semester,subject",
+        "/api/v1/analytics/risk-trajectory",
+        "/api/v1/analytics/risk-trajectory?roll=R000001",
+        "/api/v1/analytics/anomalies",
+        "/api/v1/analytics/percentile?metric=sgpa&value=6",
+        "/api/v1/analytics/quantile?metric=marks&p=50&subject=Compilers",
+        "/api/v1/students/records",
+        "/api/v1/students/records?semester=2&alert=Critical",
+        "/api/v1/students/?q=R0001",
+        "/api/v1/students/?q=student%2012",
+        "/api/v1/students/?q=Studnet",
+        "/api/v1/archive/cohorts",
+        "/api/v1/archive/students?q=R0",
+    ]
+
+    def get_counted(self, url):
+        with record_queries() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return recorder.count
+
+    def setUp(self):
+        patcher = mock.patch.object(StudentSearchService, "_schedule_build")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, StudentSearchService, "_builder", None)
+
+    def read_query_counts(self):
+        StudentSearchService.build_index()
+        first = Student.objects.order_by('id').first()
+        urls = self.READ_ENDPOINTS + [f"/api/v1/students/{first.id}/percentiles"]
+        return {url: self.get_counted(url) for url in urls}
+
+    def test_read_endpoints_query_count_does_not_grow_with_data(self):
+        seed_students(1000)
+        small = self.read_query_counts()
+        seed_students(2000, start=1000, seed=1)
+        large = self.read_query_counts()
+        self.assertEqual(small, large)
+
+    def test_master_upload_within_budget(self):
+        seed_students(2000)
+        response = self.client.post("/api/v1/upload/master", {
+            "file": SimpleUploadedFile("cohort.csv", master_csv(1000)),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Student.objects.count(), 3000)
+        self.assertEqual(AcademicRecord.objects.filter(student__roll_number__startswith="U").count(), 8000)
+
+        # Re-uploading changed rows updates in place through the same bulk path
+        response = self.client.post("/api/v1/upload/master", {
+            "file": SimpleUploadedFile("cohort-2.csv", master_csv(1000, seed=1)),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AcademicRecord.objects.filter(student__roll_number__startswith="U").count(), 8000)
+
+    def test_write_endpoints_within_budget(self):
+        ids = seed_students(2000)
+        response = self.client.post("/api/v1/analytics/process", json.dumps({"course": "CS"}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(f"/api/v1/analytics/process/{ids[0]}")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.delete("/api/v1/reset")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Student.objects.exists())
+
+    def test_n_plus_one_is_flagged(self):
+        ids = seed_students(50)
+
+        @query_budget(1000)
+        def per_row_lookups():
+            return [Student.objects.get(id=i).roll_number for i in ids]
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, "possible N+1"):
+            per_row_lookups()
+
+    def test_budget_overrun_is_flagged(self):
+        seed_students(50)
+
+        @query_budget(2)
+        def three_queries():
+            return Student.objects.count(), AcademicRecord.objects.count(), SemesterPerformance.objects.count()
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, "ran 3 queries (budget 2)"):
+            three_queries()
+
+    @override_settings(QUERY_BUDGET_MODE="off")
+    def test_off_mode_does_not_record(self):
+        @query_budget(0)
+        def one_query():
+            return Student.objects.count()
+
+        self.assertEqual(one_query(), 0)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class MasterUploadTests(TestCase):
+    def upload(self, frame, name="cohort.csv"):
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False)
+        response = self.client.post("/api/v1/upload/master", {
+            "file": SimpleUploadedFile(name, buffer.getvalue().encode()),
+        })
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_marks_only_reupload_keeps_student_details(self):
+        self.upload(pd.DataFrame([
+            {"roll_number": "R1", "name": "Alice", "email": "alice@example.edu", "course": "CS",
+             "semester": 3, "subject_name": "Compilers", "marks_obtained": 70, "total_marks": 100,
+             "attendance_percentage": 90},
+        ]))
+        self.upload(pd.DataFrame([
+            {"roll_number": "R1", "semester": 3, "subject_name": "Networks", "marks_obtained": 55,
+             "total_marks": 100, "attendance_percentage": 80},
+        ]), name="marks.csv")
+
+        student = Student.objects.get(roll_number="R1")
+        self.assertEqual((student.name, student.semester, student.course), ("Alice", 3, "CS"))
+        self.assertEqual(AcademicRecord.objects.filter(student=student).count(), 2)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class ParquetRoundTripTests(TestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        pd.read_csv(io.BytesIO(master_csv(50))).to_parquet(buffer, index=False)
+        response = self.client.post("/api/v1/upload/master", {
+            "file": SimpleUploadedFile("cohort.parquet", buffer.getvalue()),
+        })
+        self.assertEqual(response.status_code, 200)
+
+    def expected(self):
+        return sorted(AcademicRecord.objects.values_list('student__roll_number', 'semester', 'subject_name',
+                                                         'marks_obtained', 'attendance_percentage'))
+
+    def exported(self, content: bytes):
+        records = pd.read_parquet(io.BytesIO(content))
+        rolls = dict(Student.objects.values_list('id', 'roll_number'))
+        return sorted(zip(records['student_id'].map(rolls), records['semester'], records['subject_name'],
+                          records['marks_obtained'], records['attendance_percentage']))
+
+    def test_upload_and_wsgi_export_round_trip(self):
+        self.assertEqual(AcademicRecord.objects.count(), 50 * 2 * 4)
+        self.assertEqual(self.expected(), sorted(
+            (r.roll_number, r.semester, r.subject_name, r.marks_obtained, r.attendance_percentage)
+            for r in pd.read_csv(io.BytesIO(master_csv(50))).itertuples()))
+
+        response = self.client.get("/api/v1/export/academic_records.parquet")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.exported(b"".join(response.streaming_content)), self.expected())
+
+    async def test_asgi_export_streams_row_groups(self):
+        with mock.patch("analytics.views.stream_parquet", lambda dataset: stream_parquet(dataset, batch_size=100)):
+            response = await AsyncClient().get("/api/v1/export/academic_records.parquet")
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertGreater(len(chunks), 4)  # one per row group, not one buffered body
+        expected = await sync_to_async(self.expected)()
+        self.assertEqual(await sync_to_async(self.exported)(b"".join(chunks)), expected)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class UploadIdempotencyTests(TestCase):
+    def post(self, content, key=None, name="cohort.csv"):
+        headers = {"Idempotency-Key": key} if key else {}
+        return self.client.post("/api/v1/upload/master", {"file": SimpleUploadedFile(name, content)},
+                                headers=headers)
+
+    def test_same_key_replays_and_different_file_is_rejected(self):
+        first = self.post(master_csv(20), key="k1")
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", first)
+        records = AcademicRecord.objects.count()
+
+        replay = self.post(master_csv(20), key="k1")
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(UploadBatch.objects.count(), 1)
+
+        self.assertEqual(self.post(master_csv(20, seed=1), key="k1").status_code, 422)
+        self.assertEqual(AcademicRecord.objects.count(), records)
+
+        # Without a key, an identical re-send of the latest upload replays too
+        self.assertEqual(self.post(master_csv(20))["Idempotent-Replayed"], "true")
+
+    def test_identical_file_runs_again_after_the_data_changed(self):
+        content = master_csv(20)
+        self.assertEqual(self.post(content).status_code, 200)
+        self.assertEqual(self.post(content)["Idempotent-Replayed"], "true")
+
+        ArchiveService.archive("uploaded", ArchiveService.select_students(roll_prefix="U"))
+        self.assertFalse(Student.objects.exists())
+        response = self.post(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Student.objects.count(), 20)
+
+    def test_keys_are_scoped_to_the_requesting_user(self):
+        self.assertEqual(self.post(master_csv(20), key="shared").status_code, 200)
+        User.objects.create_user("registrar", password="pw")
+        self.client.login(username="registrar", password="pw")
+        response = self.post(master_csv(30), key="shared")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Student.objects.count(), 30)
+        self.assertEqual(self.post(master_csv(30), key="shared")["Idempotent-Replayed"], "true")
+
+    def test_duplicate_of_running_upload_conflicts(self):
+        content = master_csv(20)
+        content_hash = UploadBatchService.read_with_hash(SimpleUploadedFile("a.csv", content))[1]
+        UploadBatch.objects.create(idempotency_key="k2", content_hash=content_hash, file_name="a.csv")
+
+        self.assertEqual(self.post(content, key="k2").status_code, 409)
+        self.assertEqual(self.post(content).status_code, 409)
+        self.assertFalse(Student.objects.exists())
+
+        # A racing request that got past the replay check still can't start a second run
+        with self.assertRaises(DuplicateUploadInProgress):
+            UploadBatchService.start(None, content_hash, SimpleUploadedFile("a.csv", content), "current")
+
+        # A crashed run stops blocking once it is stale
+        UploadBatch.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        response = self.post(content, key="k2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(UploadBatch.objects.values_list("status", flat=True)), [UploadBatch.COMPLETE])
+
+
+class RiskRuleTests(TestCase):
+    """The shipped rules file must reproduce the original hard-coded heuristics."""
+
+    @staticmethod
+    def baseline_score(att, marks, marks_list):
+        ar = 0.0 if att >= 75 else min(100.0, (75 - att) / 75 * 250)
+        pr = 0.0 if marks >= 60 else min(100.0, (60 - marks) / 60 * 200)
+        tr = 0
+        if len(marks_list) >= 2:
+            previous = sum(marks_list[:-1]) / (len(marks_list) - 1)
+            if marks_list[-1] < previous:
+                tr = min(100, (previous - marks_list[-1]) * 5)
+        score = 0.4 * ar + 0.5 * pr + 0.1 * tr
+        if max(ar, pr) > 70:
+            score = max(score, max(ar, pr) * 0.9)
+        level = "Low" if score <= 20 else "Medium" if score <= 40 else "High" if score <= 70 else "Critical"
+        return score, level
+
+    @staticmethod
+    def baseline_subject(marks, att):
+        if marks < 40 and att < 60:
+            return "Critical"
+        if marks < 40 or att < 75:
+            return "Warning"
+        return "Normal"
+
+    def test_default_rules_match_baseline_heuristics(self):
+        rules = RiskRules.from_file(DEFAULT_RULES_FILE)
+        rng = np.random.default_rng(7)
+        lists = [list(rng.integers(0, 101, size=rng.integers(1, 8)).astype(float)) for _ in range(2000)]
+        att = np.concatenate([rng.uniform(0, 100, 1990), [0, 59.99, 60, 74.99, 75, 100, 30, 40, 50, 70]])
+        pct = np.array([sum(m) / len(m) for m in lists])
+        last = np.array([m[-1] for m in lists])
+        n = np.array([len(m) for m in lists])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prev = np.where(n > 1, (pct * n - last) / (n - 1), np.nan)
+
+        score = rules.overall_risk(rules.attendance_risk(att), rules.performance_risk(pct),
+                                   rules.trend_risk(last, prev, n))
+        levels = rules.risk_levels(score)
+        for i, marks_list in enumerate(lists):
+            expected_score, expected_level = self.baseline_score(att[i], pct[i], marks_list)
+            self.assertAlmostEqual(score[i], expected_score, places=6)
+            self.assertEqual(levels[i], expected_level)
+        for s, level in [(0, "Low"), (20, "Low"), (20.01, "Medium"), (40, "Medium"), (70, "High"), (70.5, "Critical")]:
+            self.assertEqual(rules.risk_level(s), level)
+            self.assertEqual(rules.risk_bands([s / 100.0])[0], level)
+
+        marks = rng.uniform(0, 100, 500)
+        self.assertEqual(rules.subject_alerts(marks, att[:500]).tolist(),
+                         [self.baseline_subject(m, a) for m, a in zip(marks, att[:500])])
+        self.assertEqual(rules.alert_status(0.71), ("Critical", ["Schedule Parent Meeting", "Remedial Class"]))
+        self.assertEqual(rules.alert_status(0.7), ("Warning", ["Peer Tutoring", "Counseling Session"]))
+        self.assertEqual(rules.alert_status(0.4), ("Monitor", []))
+        self.assertEqual(rules.alert_cause(55, 30), ("Critical Attendance Failure", "Attendance Warning Letter", False))
+        self.assertEqual(rules.alert_cause(70, 30)[0], "Low Attendance")
+        self.assertEqual(rules.alert_cause(80, 30), ("Academic Failure", "Subject Retake Plan", True))
+        self.assertEqual(rules.alert_cause(80, 45)[0], "Low Academic Performance")
+        self.assertEqual(rules.alert_cause(80, 90)[0], "General Academic Risk")
+
+    def test_hot_reload_keeps_last_good_rules_and_never_rescores(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / "rules.json"
+        config = json.loads(DEFAULT_RULES_FILE.read_text())
+        path.write_text(json.dumps(config))
+        engine = RiskRuleEngine(path)
+        self.assertEqual(engine.current.version, 1)
+
+        def rewrite(text, tick):
+            path.write_text(text)
+            os.utime(path, (tick, tick))
+
+        with mock.patch("analytics.services.risk_rules.RELOAD_CHECK_INTERVAL", 0), \
+                mock.patch.object(ScoringService, "apply_rule_change") as apply:
+            rewrite('{"version": 2, "scoring": ', 1_000_000)
+            with self.assertLogs("analytics.services.risk_rules", "ERROR"):
+                self.assertEqual(engine.current.version, 1)
+            with self.assertRaises(ValueError):
+                engine.reload()
+
+            config["version"] = 2
+            rewrite(json.dumps(config), 2_000_000)
+            self.assertEqual(engine.current.version, 2)
+            apply.assert_not_called()
+
+            self.assertEqual(engine.reload(apply=False), 0)
+            engine.reload()
+            apply.assert_called_once()
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class SubjectAlertTests(TestCase):
+    def assert_alerts_match(self, rules):
+        for r in AcademicRecord.objects.all():
+            self.assertEqual(r.subject_alert, rules.subject_alert(r.marks_obtained, r.attendance_percentage))
+            self.assertAlmostEqual(r.percentage, r.marks_obtained * 100.0 / r.total_marks)
+
+    def test_ingest_stores_alert_and_percentage(self):
+        self.client.post("/api/v1/upload/master", {"file": SimpleUploadedFile("cohort.csv", master_csv(100))})
+        self.assert_alerts_match(risk_rules.current)
+
+        rows = self.client.get("/api/v1/students/records?semester=2&alert=Critical").json()
+        self.assertEqual(len(rows), AcademicRecord.objects.filter(semester=2, subject_alert="Critical").count())
+        self.assertTrue(rows)
+        self.assertEqual({(r["semester"], r["subject_alert"]) for r in rows}, {(2, "Critical")})
+
+    def test_sql_refresh_matches_ingest(self):
+        seed_students(100)
+        AcademicRecord.objects.update(subject_alert=None, percentage=None)
+        self.assertEqual(SubjectAlertService.refresh(batch_size=64), AcademicRecord.objects.count())
+        self.assert_alerts_match(risk_rules.current)
+
+    def test_rule_change_refreshes_stored_alerts(self):
+        seed_students(100)
+        current = risk_rules.current
+        ScoringService.apply_rule_change(current)
+        config = json.loads(json.dumps(current.config))
+        config["version"] = current.version + 1
+        config["subject_alerts"][0]["attendance_below"] = 70.0
+        changed = RiskRules(config)
+        ScoringService.apply_rule_change(changed)
+        self.assert_alerts_match(changed)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class RollupRefreshTests(TestCase):
+    @staticmethod
+    def cells():
+        return {
+            (c.course, c.semester, c.subject_name): tuple(round(getattr(c, f), 6) for f in ROLLUP_METRICS)
+            for c in AnalyticsRollup.objects.all()
+        }
+
+    def test_refresh_matches_full_rebuild(self):
+        ids = seed_students(90)
+        moved, extra, rescored, emptied = ids[0], ids[1], ids[2:40], ids[40]
+
+        # A course change (the student leaves every CS cell), a new subject, new marks, new risk scores
+        Student.objects.filter(id=moved).update(course="ME")
+        AcademicRecord.objects.create(student_id=extra, subject_name="Robotics", semester=2, marks_obtained=0,
+                                      total_marks=100, attendance_percentage=None, grade='F', grade_point=0)
+        AcademicRecord.objects.filter(student_id__in=rescored[:10]).update(marks_obtained=F('marks_obtained') / 2)
+        ScoringService.rescore_students(rescored)
+        AcademicRecord.objects.filter(student_id=emptied).delete()
+
+        changed = RollupService.refresh_for_students([moved, extra, emptied, *rescored])
+        self.assertGreater(changed, 0)
+        refreshed = self.cells()
+        self.assertIn(("EE", 2, "Robotics"), refreshed)
+        self.assertEqual(refreshed[("CS", 0, "*")][1], 29)  # student_count without the moved student
+        RollupService.rebuild()
+        self.assertEqual(refreshed, self.cells())
+
+        # Nothing changed: nothing written
+        self.assertEqual(RollupService.refresh_for_students(ids[50:60]), 0)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class StudentSearchTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(StudentSearchService, "_schedule_build")
+        self.schedule_build = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, StudentSearchService, "_index", None)
+        self.addCleanup(setattr, StudentSearchService, "_builder", None)
+        seed_students(30)
+
+    def search(self, q):
+        response = self.client.get("/api/v1/students/", {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return [(r["roll_number"], r["match"]) for r in response.json()["results"]]
+
+    def test_stale_index_is_rebuilt_off_the_request_path(self):
+        StudentSearchService._index = None
+        # No index yet: the request schedules a build and answers from the database
+        self.assertEqual(self.search("R00001")[:2], [("R000010", "roll"), ("R000011", "roll")])
+        self.assertEqual(self.search("Studnet 12"), [])
+        self.assertEqual(self.schedule_build.call_count, 1)  # the pending build isn't scheduled twice
+
+        StudentSearchService.build_index()
+        self.assertEqual(self.search("R00001")[:2], [("R000010", "roll"), ("R000011", "roll")])
+        self.assertEqual(self.search("Studnet 12")[0], ("R000012", "fuzzy"))
+
+        StudentSearchService._builder = None
+        Student.objects.create(roll_number="R000100", name="Late Joiner", course="CS", semester=1)
+        publish_dashboard_change("test")
+        self.assertEqual(self.search("Late"), [("R000100", "name")])
+        self.assertEqual(self.schedule_build.call_count, 2)
+
+    def test_each_student_is_listed_once(self):
+        # Matches "mech" fuzzily (not as a prefix) and again as a course
+        Student.objects.create(roll_number="Z1", name="Amech", course="MECH", semester=1)
+        StudentSearchService.build_index()
+        self.assertEqual(self.search("MECH"), [("Z1", "fuzzy")])
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class ArchiveTests(TestCase):
+    def cube(self):
+        return [RollupService.query(group_by=group_by)
+                for group_by in ((), ('course',), ('course', 'semester', 'subject_name'))]
+
+    def test_archive_keeps_rollups_and_restores(self):
+        seed_students(300)
+        cube = self.cube()
+        records = sorted(AcademicRecord.objects.values_list('id', 'student_id', 'subject_name', 'marks_obtained'))
+
+        cohort = ArchiveService.archive("CS-done", ArchiveService.select_students(course="CS"), {"course": "CS"})
+        self.assertEqual(cohort.student_count, 100)
+        self.assertFalse(Student.objects.filter(course="CS").exists())
+        self.assertEqual(AcademicRecord.objects.count(), 200 * len(SUBJECTS))
+        self.assertEqual(self.cube(), cube)
+        RollupService.rebuild()
+        self.assertEqual(self.cube(), cube)
+
+        roll = ArchivedStudent.objects.order_by('roll_number').first().roll_number
+        archived = self.client.get(f"/api/v1/archive/students/{roll}").json()
+        self.assertEqual(archived[0]["student"]["roll_number"], roll)
+        self.assertEqual(len(archived[0]["academic_records"]), len(SUBJECTS))
+        self.assertEqual(len(self.client.get("/api/v1/archive/students?cohort=CS-done&limit=200").json()), 100)
+
+        with self.assertRaises(ArchiveError):
+            ArchiveService.archive("CS-done", ArchiveService.select_students(course="EE"))
+
+        self.assertEqual(ArchiveService.restore("CS-done"), 100)
+        self.assertEqual(sorted(AcademicRecord.objects.values_list('id', 'student_id', 'subject_name', 'marks_obtained')),
+                         records)
+        self.assertEqual(self.cube(), cube)
+        self.assertFalse(ArchivedStudent.objects.exists())
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class ReplicaRoutingTests(TestCase):
+    """A second SQLite file stands in for a replica that has not caught up with the primary."""
+
+    @classmethod
+    def setUpClass(cls):
+        # The alias only exists while this class runs, so it can't be declared in ``databases``
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+        settings.DATABASES[REPLICA_ALIAS] = connections.configure_settings({
+            "default": settings.DATABASES["default"],
+            REPLICA_ALIAS: {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(tmp.name, "replica.sqlite3")},
+        })[REPLICA_ALIAS]
+        cls.addClassCleanup(settings.DATABASES.pop, REPLICA_ALIAS)
+        cls.addClassCleanup(connections.__delitem__, REPLICA_ALIAS)
+        cls.addClassCleanup(lambda: connections[REPLICA_ALIAS].close())
+        with connections[REPLICA_ALIAS].schema_editor() as editor:
+            editor.create_model(ArchivedCohort)
+        cls.databases = {"default", REPLICA_ALIAS}
+        super().setUpClass()
+
+    def setUp(self):
+        ArchivedCohort.objects.using(REPLICA_ALIAS).create(name="replica-copy")
+        ArchivedCohort.objects.create(name="primary-copy")
+        DashboardState.objects.update_or_create(pk=1, defaults={"last_write_at": None})
+
+    def cohorts(self):
+        response = self.client.get("/api/v1/archive/cohorts")
+        return response["X-DB-Read"], [c["name"] for c in response.json()]
+
+    def test_reads_use_replica_until_a_write_pins_the_primary(self):
+        self.assertEqual(self.cohorts(), (REPLICA_ALIAS, ["replica-copy"]))
+
+        self.client.post("/api/v1/analytics/process", {"course": "CS"}, content_type="application/json")
+        self.assertIsNotNone(DashboardState.objects.get(pk=1).last_write_at)
+        self.assertEqual(self.cohorts(), ("default", ["primary-copy"]))
+
+        # The pin is in the primary database, so every worker process sees it until it expires
+        DashboardState.objects.filter(pk=1).update(last_write_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.cohorts(), (REPLICA_ALIAS, ["replica-copy"]))
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None, PROFILING_INTERVAL_MS=1)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(PROFILING_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        seed_students(200)
+
+    def test_unflagged_requests_are_not_profiled(self):
+        response = self.client.get("/api/v1/students/records?_profile=1",
+                                   HTTP_X_PROFILE_TOKEN=make_profile_token() + "x")
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(self.client.get("/api/v1/admin/profiles").status_code, 403)
+
+    def test_signed_token_profile_is_browsable(self):
+        response = self.client.get("/api/v1/students/records", HTTP_X_PROFILE_TOKEN=make_profile_token("ops"))
+        profile_id = response["X-Profile-Id"]
+
+        User.objects.create_user("admin", password="pw", is_staff=True)
+        self.client.login(username="admin", password="pw")
+        self.assertEqual([p["id"] for p in self.client.get("/api/v1/admin/profiles").json()], [profile_id])
+
+        summary = self.client.get(f"/api/v1/admin/profiles/{profile_id}").json()
+        self.assertEqual((summary["trigger"], summary["requested_by"], summary["status"]), ("token", "ops", 200))
+        self.assertGreater(summary["sql"]["count"], 0)
+
+        speedscope = json.loads(self.client.get(f"/api/v1/admin/profiles/{profile_id}.speedscope.json").content)
+        sampled, sql = speedscope["profiles"]
+        self.assertEqual(len(sampled["samples"]), summary["sample_count"])
+        self.assertEqual(len(sql["events"]), 2 * summary["sql"]["count"])
+        self.assertEqual(self.client.get(f"/api/v1/admin/profiles/{profile_id}.folded").status_code, 200)
+
+        # Staff can also flag a request from the browser
+        response = self.client.get("/api/v1/dashboard/stats?_profile=1")
+        self.assertEqual(self.client.get(f"/api/v1/admin/profiles/{response['X-Profile-Id']}").json()["trigger"],
+                         "staff")
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_profiled(self):
+        self.assertIn("X-Profile-Id", self.client.get("/api/v1/dashboard/stats"))
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class DashboardEventsTests(TestCase):
+    @staticmethod
+    def parse(frame: str) -> dict:
+        fields = dict(line.split(": ", 1) for line in frame.strip().splitlines() if not line.startswith(":"))
+        return {"event": fields.get("event"), "id": fields.get("id"),
+                "data": json.loads(fields["data"]) if "data" in fields else None}
+
+    def test_wsgi_stream_replays_deltas_and_ends(self):
+        seed_students(20)
+        version = current_version()
+        publish_dashboard_change("test")
+        frames = [self.parse(f) for f in event_stream(version, max_seconds=0.05, poll_interval=0.01)]
+        self.assertEqual(frames[0]["event"], "hello")
+        deltas = [f for f in frames if f["event"] == "delta"]
+        self.assertEqual([d["data"]["version"] for d in deltas], [version + 1])
+        self.assertEqual(deltas[0]["data"]["reason"], "test")
+
+    async def test_asgi_stream_sends_deltas(self):
+        from asgiref.sync import sync_to_async
+
+        await sync_to_async(seed_students)(20)
+        version = await sync_to_async(current_version)()
+        await sync_to_async(publish_dashboard_change)("test")
+
+        response = await AsyncClient().get("/api/v1/dashboard/events", headers={"Last-Event-ID": str(version)})
+        self.assertTrue(response.is_async)
+        stream = aiter(response.streaming_content)
+        frames = []
+        while not any(f["event"] == "delta" for f in frames):
+            frames.append(self.parse((await anext(stream)).decode()))
+        await stream.aclose()
+        self.assertEqual(frames[-1]["data"]["version"], version + 1)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class BatchProcessTests(TestCase):
+    def post(self, body):
+        return self.client.post("/api/v1/analytics/process", json.dumps(body), content_type="application/json")
+
+    def test_long_id_list_is_chunked(self):
+        ids = seed_students(60)
+        # More ids than SQLite allows variables in one statement
+        response = self.post({"student_ids": ids[::2] + list(range(10**6, 10**6 + 40000))})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["processed"], 30)
+        self.assertEqual({r["student_id"] for r in body["results"]}, set(ids[::2]))
+        self.assertTrue(all(r["roll"] for r in body["results"]))
+
+        response = self.post({"student_ids": ids, "course": "CS"})
+        self.assertEqual(response.json()["processed"], 20)
+
+    def test_rejects_bad_input(self):
+        for body in [{"student_ids": ["x"]}, {"student_ids": [1, None]}, {"student_ids": [True]},
+                     {"student_ids": "1,2"}, {"student_ids": list(range(50001))},
+                     {"semester": "five"}, {"semester": [3]}, {}]:
+            self.assertEqual(self.post(body).status_code, 400, str(body)[:40])
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class RescoreCohortTests(TestCase):
+    def plan(self, **options):
+        from .management.commands.rescore_cohort import Command
+        return Command()._plan_run({"run_id": None, "restart": False, "shard_size": 20, **options})
+
+    def test_killed_run_resumes_without_duplicate_history(self):
+        from .management.commands.rescore_cohort import _rescore_shard
+
+        ids = seed_students(60)
+        AcademicRecord.objects.filter(student_id__in=ids[::3]).update(marks_obtained=F('marks_obtained') / 3)
+        history = PredictionHistory.objects.count()
+
+        run_id = self.plan(restart=True)
+        shards = list(RescoreShard.objects.filter(run_id=run_id).order_by('start_id').values_list('id', flat=True))
+        self.assertEqual(len(shards), 3)
+        _rescore_shard(shards[0], batch_size=5)
+
+        # Killed after the first batch of the second shard
+        upsert = ScoringService.upsert_predictions
+        calls = []
+
+        def dies_on_second_batch(scored):
+            if calls:
+                raise KeyboardInterrupt
+            calls.append(1)
+            return upsert(scored)
+
+        with mock.patch.object(ScoringService, "upsert_predictions", side_effect=dies_on_second_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                _rescore_shard(shards[1], batch_size=5)
+
+        # The rerun picks up the same run and redoes only the unfinished shards
+        self.assertEqual(self.plan(), run_id)
+        pending = RescoreShard.objects.filter(run_id=run_id, done=False).values_list('id', flat=True)
+        self.assertEqual(sorted(pending), shards[1:])
+        for shard_id in pending:
+            _rescore_shard(shard_id, batch_size=5)
+
+        # One new history row per student whose score changed, however often they were scored
+        changed = PredictionHistory.objects.count() - history
+        self.assertEqual(changed, PredictionHistory.objects.values('student').annotate(
+            n=Count('id')).filter(n__gt=1).count())
+        self.assertGreater(changed, 0)
+        self.assertLessEqual(changed, len(ids[::3]))
+
+        # A second full run with nothing changed appends nothing
+        for shard_id in RescoreShard.objects.filter(run_id=self.plan(restart=True)).values_list('id', flat=True):
+            _rescore_shard(shard_id, batch_size=5)
+        self.assertEqual(PredictionHistory.objects.count(), history + changed)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class QuantileSketchTests(TestCase):
+    PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+
+    def assert_within_stated_error(self, metric, values, **slice_):
+        sketch = QuantileSketchService.get(metric, **slice_)
+        self.assertEqual(sketch.total, len(values))
+        lo, hi, _ = SKETCH_METRICS[metric]
+        width = (hi - lo) / SKETCH_BINS
+        for p in self.PERCENTILES:
+            estimate = sketch.value_at(p)
+            lower = np.percentile(values, p, method='lower')
+            higher = np.percentile(values, p, method='higher')
+            self.assertGreaterEqual(estimate, lower - width - 1e-6, (metric, slice_, p))
+            self.assertLessEqual(estimate, higher + width + 1e-6, (metric, slice_, p))
+            self.assertLessEqual(abs(estimate - np.percentile(values, p)), width + (higher - lower) + 1e-6)
+
+    def test_sketch_quantiles_match_numpy(self):
+        seed_students(600)
+        # New students, then overwritten marks for half of them, through the incremental path
+        for content in (master_csv(400), master_csv(200, seed=1)):
+            response = self.client.post("/api/v1/upload/master", {"file": SimpleUploadedFile("cohort.csv", content)})
+            self.assertEqual(response.status_code, 200)
+
+        sgpa = list(SemesterPerformance.objects.values_list('sgpa', flat=True))
+        self.assert_within_stated_error('sgpa', sgpa)
+        cs2 = list(SemesterPerformance.objects.filter(student__course="CS", semester=2)
+                   .values_list('attendance_percentage', flat=True))
+        self.assert_within_stated_error('attendance', cs2, course="CS", semester=2)
+        marks = [m * 100.0 / t for m, t in AcademicRecord.objects.filter(subject_name="Compilers")
+                 .values_list('marks_obtained', 'total_marks')]
+        self.assert_within_stated_error('marks', marks, subject="Compilers")
+
+    def test_capture_chunks_long_roll_lists(self):
+        seed_students(50)
+        rolls = [f"R{i:06d}" for i in range(50)] + [f"X{i}" for i in range(40000)]
+        captured = QuantileSketchService.capture(rolls)
+        self.assertEqual(len(captured['sgpa']), 150)
+        self.assertEqual(len(captured['marks']), 50 * len(SUBJECTS))
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class PredictionHistoryTests(TestCase):
+    def setUp(self):
+        self.a = Student.objects.create(roll_number="H1", name="A", course="CS", semester=2)
+        self.b = Student.objects.create(roll_number="H2", name="B", course="EE", semester=4)
+
+    def append(self, day, **scores):
+        rows = [{'student_id': getattr(self, key).id, 'risk_score': score, 'average_marks': score * 100}
+                for key, score in scores.items()]
+        return PredictionHistoryService.append(rows, generated_at=datetime(*day, 12, tzinfo=dt_timezone.utc))
+
+    def test_append_adds_one_raw_row_per_student(self):
+        self.assertEqual(self.append((2026, 1, 10), a=0.2, b=0.5), 2)
+        self.append((2026, 1, 20), a=0.4)
+        rows = PredictionHistory.objects.filter(student=self.a).order_by('generated_at')
+        self.assertEqual([(r.period, r.risk_score, r.sample_count, r.is_compacted) for r in rows],
+                         [(date(2026, 1, 1), 0.2, 1, False), (date(2026, 1, 1), 0.4, 1, False)])
+
+    def test_compaction_keeps_trajectories(self):
+        self.append((2023, 3, 10), a=0.9)  # past retention
+        for day, score in [(5, 0.2), (15, 0.4), (25, 0.6)]:
+            self.append((2026, 1, day), a=score, b=1 - score)
+        self.append((2026, 5, 10), a=0.3)  # inside the raw window
+        history = PredictionHistory.objects.filter(period__gte=date(2024, 1, 1))
+        before = PredictionHistoryService.trajectory(history, 'month')
+
+        result = PredictionHistoryService.compact(keep_raw_months=3, retention_months=24, today=date(2026, 6, 15))
+        self.assertEqual((result["deleted"], result["compacted_rows"]), (1, 2))
+        january = PredictionHistory.objects.get(student=self.a, period=date(2026, 1, 1))
+        self.assertEqual((january.risk_score, january.risk_min, january.risk_max, january.sample_count),
+                         (0.4, 0.2, 0.6, 3))
+        self.assertAlmostEqual(january.average_marks, 40)
+        self.assertFalse(PredictionHistory.objects.get(period=date(2026, 5, 1)).is_compacted)
+        self.assertEqual(PredictionHistoryService.trajectory(PredictionHistory.objects.all(), 'month'), before)
+
+        # Compacting again is a no-op
+        self.assertEqual(PredictionHistoryService.compact(3, 24, today=date(2026, 6, 15))["compacted_rows"], 0)
+
+    def test_compaction_averages_marks_over_known_samples(self):
+        self.append((2026, 1, 5), a=0.2)
+        self.append((2026, 1, 15), a=0.4)
+        PredictionHistoryService.append([{'student_id': self.a.id, 'risk_score': 0.6},
+                                         {'student_id': self.b.id, 'risk_score': 0.5}],
+                                        generated_at=datetime(2026, 1, 25, 12, tzinfo=dt_timezone.utc))
+
+        PredictionHistoryService.compact(keep_raw_months=3, retention_months=24, today=date(2026, 6, 15))
+        january = PredictionHistory.objects.get(student=self.a, period=date(2026, 1, 1))
+        self.assertEqual(january.sample_count, 3)
+        self.assertAlmostEqual(january.average_marks, 30)
+        self.assertIsNone(PredictionHistory.objects.get(student=self.b).average_marks)
+
+    def test_reprocessing_an_unchanged_student_keeps_history(self):
+        AcademicRecord.objects.bulk_create([
+            AcademicRecord(student=self.a, subject_name=subject, semester=1, marks_obtained=marks, total_marks=100,
+                           attendance_percentage=80, grade='B', grade_point=6)
+            for subject, marks in [("Compilers", 70), ("Networks", 40)]
+        ])
+        responses = [self.client.post(f"/api/v1/analytics/process/{self.a.id}") for _ in range(3)]
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(PredictionHistory.objects.filter(student=self.a).count(), 1)
+
+        # Same result as the batch scorer, predicted grade included
+        prediction = Prediction.objects.get(student=self.a)
+        self.assertEqual(responses[-1].json()["risk_score"], prediction.risk_score)
+        self.assertIsNotNone(prediction.predicted_grade)
+        self.client.post("/api/v1/analytics/process", {"student_ids": [self.a.id]}, content_type="application/json")
+        self.assertEqual(PredictionHistory.objects.filter(student=self.a).count(), 1)
+
+        AcademicRecord.objects.filter(student=self.a, subject_name="Networks").update(marks_obtained=10)
+        self.client.post(f"/api/v1/analytics/process/{self.a.id}")
+        self.assertEqual(PredictionHistory.objects.filter(student=self.a).count(), 2)
+
+    def test_trajectory_endpoint(self):
+        for day, score in [(5, 0.2), (12, 0.4), (26, 0.6)]:
+            self.append((2026, 1, day), a=score, b=score / 2)
+
+        student = self.client.get("/api/v1/analytics/risk-trajectory",
+                                  {"student_id": self.a.id, "bucket": "month"}).json()
+        self.assertEqual(student["student"]["roll"], "H1")
+        self.assertEqual([(p["period"], p["avg_risk"], p["samples"]) for p in student["points"]],
+                         [("2026-01-01", 0.4, 3)])
+        weekly = self.client.get("/api/v1/analytics/risk-trajectory", {"roll": "H1", "bucket": "week"}).json()
+        self.assertEqual([p["avg_risk"] for p in weekly["points"]], [0.2, 0.4, 0.6])
+
+        cohort = self.client.get("/api/v1/analytics/risk-trajectory", {"semester": 4}).json()
+        self.assertEqual(cohort["cohort"]["semester"], 4)
+        self.assertEqual([(p["avg_risk"], p["students"]) for p in cohort["points"]], [(0.2, 1)])
+
+    def test_trajectory_rejects_bad_params(self):
+        for params in [{"months": "x"}, {"months": "0"}, {"semester": "five"}, {"student_id": "abc"},
+                       {"bucket": "year"}]:
+            response = self.client.get("/api/v1/analytics/risk-trajectory", params)
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(self.client.get("/api/v1/analytics/risk-trajectory", {"student_id": 999999}).status_code,
+                         404)
+
+
+@override_settings(ANALYTICS_SNAPSHOT_DIR=None)
+class AnomalyTests(TestCase):
+    def setUp(self):
+        marks = [50, 52, 54, 56, 58, 60, 62, 64, 66, 68, 5]  # the last one is injected
+        for i, m in enumerate(marks):
+            student = Student.objects.create(roll_number=f"A{i:02d}", name=f"A {i}", course="CS", semester=1)
+            AcademicRecord.objects.create(student=student, subject_name="Databases", semester=1,
+                                          marks_obtained=m, total_marks=100, attendance_percentage=90)
+        # median 58, MAD = median(|x - 58|) = 6
+        self.expected_z = MAD_SCALE * (5 - 58) / 6
+        AnomalyService.run()
+
+    def test_injected_outlier_is_flagged_with_robust_z(self):
+        body = self.client.get("/api/v1/analytics/anomalies", {"kind": "record_outlier"}).json()
+        self.assertEqual(len(body["anomalies"]), 1)
+        outlier = body["anomalies"][0]
+        self.assertEqual((outlier["roll"], outlier["metric"], outlier["value"], outlier["baseline"]),
+                         ("A10", "marks", 5.0, 58.0))
+        self.assertEqual(outlier["score"], round(self.expected_z, 2))
+        self.assertGreater(abs(self.expected_z), 3.5)
+
+    def test_rejects_bad_params(self):
+        for params in [{"semester": "x"}, {"student_id": "abc"}, {"limit": "ten"}, {"limit": "-1"}, {"limit": "0"}]:
+            self.assertEqual(self.client.get("/api/v1/analytics/anomalies", params).status_code, 400, params)
+        self.assertEqual(self.client.get("/api/v1/analytics/anomalies", {"limit": "5000"}).status_code, 200)
+
+
+class ColumnarSnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(ANALYTICS_SNAPSHOT_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with override_settings(ANALYTICS_SNAPSHOT_DIR=None):
+            seed_students(300)
+
+    def assertClose(self, snapshot, orm, path="result"):
+        if isinstance(orm, dict):
+            self.assertEqual(sorted(snapshot), sorted(orm), path)
+            for key in orm:
+                self.assertClose(snapshot[key], orm[key], f"{path}.{key}")
+        elif isinstance(orm, list):
+            self.assertEqual(len(snapshot), len(orm), path)
+            for i, (a, b) in enumerate(zip(snapshot, orm)):
+                self.assertClose(a, b, f"{path}[{i}]")
+        elif isinstance(orm, float):
+            self.assertAlmostEqual(snapshot, orm, places=2, msg=path)
+        else:
+            self.assertEqual(snapshot, orm, path)
+
+    def test_snapshot_matches_orm(self):
+        self.assertIsNotNone(columnar_snapshot.rebuild_if_stale())
+        computations = [DashboardService.compute_stats, DashboardService.compute_trend,
+                        DashboardService.compute_alerts, DashboardService.compute_gpa_analytics]
+        from_snapshot = {c.__name__: c() for c in computations}
+        self.assertIsNotNone(columnar_snapshot.current())
+        with override_settings(ANALYTICS_SNAPSHOT_DIR=None):
+            from_orm = {c.__name__: c() for c in computations}
+        self.assertClose(from_snapshot, from_orm)
+
+    def test_publish_marks_stale_and_rebuild_runs_after_commit(self):
+        columnar_snapshot.rebuild_if_stale()
+        self.assertIsNone(columnar_snapshot.rebuild_if_stale())  # already at the current version
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            publish_dashboard_change("test")
+        self.assertIsNone(columnar_snapshot.current())
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertIsNotNone(columnar_snapshot.rebuild_if_stale())
+        self.assertEqual(columnar_snapshot.live_version(), current_version())
+        self.assertIsNotNone(columnar_snapshot.current())
+
+
+    def test_published_delta_reflects_the_change_not_the_snapshot(self):
+        columnar_snapshot.rebuild_if_stale()
+        self.assertEqual(DashboardService.compute_stats()["total_students"], 300)
+        version = current_version()
+
+        response = self.client.post("/api/v1/upload/master", {
+            "file": SimpleUploadedFile("cohort.csv", master_csv(10)),
+        })
+        self.assertEqual(response.status_code, 200)
+        frames = [DashboardEventsTests.parse(f) for f in event_stream(version, max_seconds=0.05, poll_interval=0.01)]
+        kpis = [f["data"] for f in frames if f["event"] == "delta"][-1]["kpis"]
+        self.assertEqual(kpis["total_students"], 310)
+        stats = DashboardService.compute_stats()
+        self.assertEqual(kpis, {k: v for k, v in stats.items() if k in kpis})
+
+class SqlShapeTests(TestCase):
+    def test_literals_and_in_lists_collapse(self):
+        a, batched_a = sql_shape('SELECT * FROM "students" WHERE "id" = 1 AND "name" = \'x\'')
+        b, batched_b = sql_shape('SELECT * FROM "students" WHERE "id" = 42 AND "name" = \'it\'\'s\'')
+        self.assertEqual(a, b)
+        self.assertFalse(batched_a or batched_b)
+
+        shape, batched = sql_shape('SELECT * FROM "students" WHERE "id" IN (%s, %s, %s)')
+        self.assertEqual(shape, 'SELECT * FROM "students" WHERE "id" IN (...)')
+        self.assertTrue(batched)
+
+    def test_multi_row_insert_is_batched(self):
+        _, batched = sql_shape('INSERT INTO "students" ("a", "b") VALUES (%s, %s), (%s, %s)')
+        self.assertTrue(batched)
@@ -7,9 +7,25 @@ from .views import (
     DashboardStatsView,
     DashboardAlertsView, 
     DashboardTrendView,
+    DashboardEventsView,
     GPAAnalyticsView, 
+    RollupQueryView,
+    RiskTrajectoryView,
+    AnomaliesView,
+    PercentileView,
+    QuantileView,
+    StudentPercentileView,
     ProcessStudentView,
+    BatchProcessView,
+    StudentSearchView,
     StudentRecordsView,
+    ParquetExportView,
+    ArchivedCohortsView,
+    ArchivedStudentsView,
+    ArchivedStudentDetailView,
+    ProfileListView,
+    ProfileDetailView,
+    ProfileTokenView,
     ResetDBView
 )
 
@@ -22,10 +38,31 @@ urlpatterns = [
     path('dashboard/stats', DashboardStatsView.as_view(), name='dashboard_stats'),
     path('dashboard/alerts', DashboardAlertsView.as_view(), name='dashboard_alerts'),
     path('dashboard/trend', DashboardTrendView.as_view(), name='dashboard_trend'),
+    path('dashboard/events', DashboardEventsView.as_view(), name='dashboard_events'),
     
     path('analytics/gpa', GPAAnalyticsView.as_view(), name='gpa_analytics'),
+    path('analytics/rollup', RollupQueryView.as_view(), name='rollup_query'),
+    path('analytics/risk-trajectory', RiskTrajectoryView.as_view(), name='risk_trajectory'),
+    path('analytics/anomalies', AnomaliesView.as_view(), name='anomalies'),
+    path('analytics/percentile', PercentileView.as_view(), name='percentile'),
+    path('analytics/quantile', QuantileView.as_view(), name='quantile'),
+    path('analytics/process', BatchProcessView.as_view(), name='batch_process'),
     path('analytics/process/<int:student_id>', ProcessStudentView.as_view(), name='process_student'),
     
+    path('students/', StudentSearchView.as_view(), name='student_search'),
+    path('students/search', StudentSearchView.as_view(), name='student_search_alias'),
     path('students/records', StudentRecordsView.as_view(), name='student_records'),
+    path('students/<int:student_id>/percentiles', StudentPercentileView.as_view(), name='student_percentiles'),
+    path('export/<str:dataset>.parquet', ParquetExportView.as_view(), name='export_parquet'),
+    path('archive/cohorts', ArchivedCohortsView.as_view(), name='archived_cohorts'),
+    path('archive/students', ArchivedStudentsView.as_view(), name='archived_students'),
+    path('archive/students/<str:roll_number>', ArchivedStudentDetailView.as_view(), name='archived_student'),
+    path('admin/profiles', ProfileListView.as_view(), name='profiles'),
+    path('admin/profiles/token', ProfileTokenView.as_view(), name='profile_token'),
+    path('admin/profiles/<slug:profile_id>', ProfileDetailView.as_view(), name='profile'),
+    path('admin/profiles/<slug:profile_id>.speedscope.json', ProfileDetailView.as_view(),
+         {'fmt': 'speedscope'}, name='profile_speedscope'),
+    path('admin/profiles/<slug:profile_id>.folded', ProfileDetailView.as_view(),
+         {'fmt': 'folded'}, name='profile_folded'),
     path('reset', ResetDBView.as_view(), name='reset_db'),
 ]
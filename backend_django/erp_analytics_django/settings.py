@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "corsheaders",
     "analytics",
@@ -49,6 +53,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "analytics.profiling.RequestProfilingMiddleware",
+    "analytics.db_router.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -76,19 +82,49 @@ WSGI_APPLICATION = "erp_analytics_django.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Every key can be overridden from the environment (DB_ENGINE, DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST, DB_PORT). Setting DB_REPLICA_HOST or DB_REPLICA_NAME adds
+# a read replica; its unset keys fall back to the primary's.
+# Connections are persistent (CONN_MAX_AGE) and health-checked before reuse.
+
+def database_from_env(prefix, defaults):
+    config = {
+        key: os.environ.get(f"{prefix}_{key}", default)
+        for key, default in defaults.items()
+    }
+    config["CONN_MAX_AGE"] = int(os.environ.get("DB_CONN_MAX_AGE", "60"))
+    config["CONN_HEALTH_CHECKS"] = True
+    return config
+
+
 DATABASES = {
-    "default": {
+    "default": database_from_env("DB", {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": "erp_analytics",
         "USER": "postgres",
         "PASSWORD": "nisarg",
         "HOST": "localhost",
         "PORT": "5432",
-    }
+    }),
 }
 
+if os.environ.get("DB_REPLICA_HOST") or os.environ.get("DB_REPLICA_NAME"):
+    primary = {k: DATABASES["default"][k] for k in ("ENGINE", "NAME", "USER", "PASSWORD", "HOST", "PORT")}
+    DATABASES["replica"] = database_from_env("DB_REPLICA", primary)
+    # Tests run against the primary only
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["analytics.db_router.ReplicaRouter"]
+
+# Read-only API requests under these prefixes may be served from the replica
+REPLICA_READ_PATHS = ("/api/v1/",)
+# Seconds after a write during which reads stay on the primary (replication lag)
+REPLICA_PIN_SECONDS = float(os.environ.get("DB_REPLICA_PIN_SECONDS", "5"))
+
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key", "x-profile-token")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed", "X-Profile-Id"]
 
 
 # Password validation
@@ -127,6 +163,29 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Risk rules engine: versioned thresholds/weights/actions, hot-reloaded on change
+RISK_RULES_FILE = BASE_DIR / "analytics" / "risk_rules.json"
+
+# Memory-mapped columnar snapshot the dashboard is computed from (empty disables it)
+ANALYTICS_SNAPSHOT_DIR = os.environ.get("ANALYTICS_SNAPSHOT_DIR", BASE_DIR / "snapshots")
+# Seconds without data changes before the snapshot is rebuilt in the background
+ANALYTICS_SNAPSHOT_DEBOUNCE = float(os.environ.get("ANALYTICS_SNAPSHOT_DEBOUNCE", "2"))
+
+# Per-view SQL query budgets / N+1 detection (analytics/query_budget.py):
+# "raise", "log" or "off". The test suite runs with "raise".
+QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "log" if DEBUG else "off")
+QUERY_BUDGET_MAX_REPEATS = 10
+
+# Opt-in request profiling (analytics/profiling.py): requests with a signed
+# X-Profile-Token header, staff requests with ?_profile=1, and a random
+# PROFILING_SAMPLE_RATE fraction of requests are profiled into PROFILING_DIR
+# (empty removes the middleware).
+PROFILING_DIR = os.environ.get("PROFILING_DIR", BASE_DIR / "profiles")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "2"))
+PROFILING_MAX_FILES = int(os.environ.get("PROFILING_MAX_FILES", "200"))
+PROFILING_TOKEN_MAX_AGE = int(os.environ.get("PROFILING_TOKEN_MAX_AGE", "3600"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
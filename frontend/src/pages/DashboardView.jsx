@@ -32,6 +32,23 @@ const DashboardView = ({ onNavigate }) => {
             }
         };
         fetchData();
+
+        // Apply pushed deltas instead of re-polling every endpoint
+        const source = api.subscribeDashboard((delta) => {
+            if (delta.kpis && Object.keys(delta.kpis).length > 0) {
+                setStats(prev => ({ ...(prev || {}), ...delta.kpis }));
+            }
+            if (delta.alerts) {
+                const { new: changed = [], cleared = [] } = delta.alerts;
+                const dropped = new Set([...cleared, ...changed.map(a => a.roll)]);
+                setAlerts(prev => prev.filter(a => !dropped.has(a.roll)).concat(changed));
+            }
+            if (delta.trend) {
+                setTrendData(delta.trend);
+            }
+        }, fetchData);
+
+        return () => source.close();
     }, []);
 
     // ... (rest of code)
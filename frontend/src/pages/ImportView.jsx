@@ -10,9 +10,12 @@ const ImportView = () => {
     const [status, setStatus] = useState({ type: '', message: '' });
     const [loading, setLoading] = useState(false);
     const [masterFile, setMasterFile] = useState(null);
+    // One key per selected file: double clicks and retries replay instead of reprocessing
+    const [uploadKey, setUploadKey] = useState(null);
 
     const handleFileChange = (e) => {
         setMasterFile(e.target.files[0]);
+        setUploadKey(crypto.randomUUID());
         setStatus({ type: '', message: '' });
     };
 
@@ -24,7 +27,7 @@ const ImportView = () => {
 
         try {
             // Pass scope to API
-            const res = await api.uploadMasterData(masterFile, analysisMode);
+            const res = await api.uploadMasterData(masterFile, analysisMode, uploadKey);
             setStatus({ type: 'success', message: res.message });
         } catch (err) {
             setStatus({ type: 'error', message: err.message || "Upload failed" });
@@ -147,7 +150,7 @@ const ImportView = () => {
                 <div className="import-card">
                     <div className="card-header" style={{ display: 'flex', alignItems: 'center', gap: '1rem', marginBottom: '1rem' }}>
                         {analysisMode === 'current' ? <FileText size={24} className="icon-blue" /> : <History size={24} className="icon-purple" />}
-                        <h3 style={{ margin: 0 }}>Master Data Upload (CSV)</h3>
+                        <h3 style={{ margin: 0 }}>Master Data Upload (CSV / Parquet / Arrow)</h3>
                     </div>
 
                     <p className="card-desc" style={{ color: '#94a3b8', marginBottom: '1.5rem' }}>
@@ -170,7 +173,7 @@ const ImportView = () => {
                     <div className="file-input-wrapper">
                         <input
                             type="file"
-                            accept=".csv"
+                            accept=".csv,.parquet,.pq,.arrow,.feather,.ipc"
                             onChange={handleFileChange}
                             className="file-input"
                         />
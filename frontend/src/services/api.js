@@ -26,6 +26,14 @@ export const api = {
 
     getStudents: async () => {
         const res = await fetch(`${API_BASE}/students/`);
+        const data = await res.json();
+        return data.results;
+    },
+
+    // Autocomplete over roll number, name, email and course: { query, results: [...] }
+    searchStudents: async (query, limit = 10) => {
+        const params = new URLSearchParams({ q: query, limit });
+        const res = await fetch(`${API_BASE}/students/?${params}`);
         return res.json();
     },
 
@@ -49,12 +57,14 @@ export const api = {
         return res.json();
     },
 
-    uploadMasterData: async (file, scope = 'current') => {
+    // Reuse the same idempotencyKey when retrying so the backend replays the original result
+    uploadMasterData: async (file, scope = 'current', idempotencyKey = crypto.randomUUID()) => {
         const formData = new FormData();
         formData.append('file', file);
         formData.append('scope', scope);
         const res = await fetch(`${API_BASE}/upload/master`, {
             method: 'POST',
+            headers: { 'Idempotency-Key': idempotencyKey },
             body: formData,
         });
         return res.json();
@@ -70,6 +80,14 @@ export const api = {
         return res.json();
     },
 
+    // Live dashboard deltas over Server-Sent Events; returns the EventSource so callers can close() it
+    subscribeDashboard: (onDelta, onResync) => {
+        const source = new EventSource(`${API_BASE}/dashboard/events`);
+        source.addEventListener('delta', (e) => onDelta(JSON.parse(e.data)));
+        source.addEventListener('resync', () => onResync && onResync());
+        return source;
+    },
+
     getTrend: async () => {
         const res = await fetch(`${API_BASE}/dashboard/trend`);
         return res.json();
@@ -90,6 +108,16 @@ export const api = {
         return res.json();
     },
 
+    // Batch rescore: { student_ids: [...] } or any of { course, semester, risk_band }
+    processStudents: async (selection) => {
+        const res = await fetch(`${API_BASE}/analytics/process`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(selection),
+        });
+        return res.json();
+    },
+
     getGPAAnalytics: async () => {
         const res = await fetch(`${API_BASE}/analytics/gpa`);
         if (!res.ok) throw new Error('Failed to fetch GPA analytics');